@@ -6,7 +6,8 @@ from django.http import JsonResponse, HttpResponseRedirect
 from django.urls import reverse
 import json
 import mysql.connector
-from .models import ExternalDbConfig, GLPIConfig, AutomationRule, GLPIWebhook
+from .models import ExternalDbConfig, GLPIConfig, AutomationRule, GLPIWebhook, WebhookJob
+from .jobs import requeue_jobs
 
 # --- Formulário Customizado ---
 # (Este formulário é para o caso de usarmos criptografia, 
@@ -213,3 +214,41 @@ class GLPIWebhookAdmin(admin.ModelAdmin):
     # Adiciona as regras na parte de baixo da página do Webhook
     inlines = [AutomationRuleInline]
 
+
+
+@admin.register(WebhookJob)
+class WebhookJobAdmin(admin.ModelAdmin):
+    list_display = (
+        'id', 'ticket_id', 'action', 'status', 'attempts', 'created_at',
+        'queue_latency_display', 'total_latency_display', 'webhook',
+    )
+    list_filter = ('status', 'action', 'webhook')
+    search_fields = ('ticket_id',)
+    date_hierarchy = 'created_at'
+    actions = ['requeue_selected']
+    readonly_fields = [f.name for f in WebhookJob._meta.fields] + ['queue_latency_display', 'total_latency_display']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description="Espera na fila")
+    def queue_latency_display(self, obj):
+        return _format_latency(obj.queue_latency)
+
+    @admin.display(description="Latência total")
+    def total_latency_display(self, obj):
+        return _format_latency(obj.total_latency)
+
+    @admin.action(description="Reexecutar jobs selecionados")
+    def requeue_selected(self, request, queryset):
+        count = requeue_jobs(queryset)
+        self.message_user(request, f"{count} job(s) reenfileirado(s).")
+
+
+def _format_latency(delta):
+    if delta is None:
+        return "-"
+    return f"{delta.total_seconds():.1f}s"
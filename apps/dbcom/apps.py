@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class DbcomConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.dbcom'
+
+    def ready(self):
+        # Recuperação dos jobs de webhook órfãos (ver core.workers.JobSweeper)
+        from core.workers import job_sweeper
+        from .models import WebhookJob
+        job_sweeper.register('webhooks', WebhookJob, 'apps.dbcom.jobs.recover_pending_jobs')
@@ -1,24 +1,307 @@
 import mysql.connector
 from mysql.connector import errorcode
 from contextlib import contextmanager
+from collections import deque
+import threading
+import logging
+import time
 import os
 
+logger = logging.getLogger(__name__)
+
 # Tenta importar o modelo Django.
 # Isso permite que o arquivo seja importado em outros contextos
 # sem quebrar, embora só vá funcionar de dentro do Django.
 try:
     from apps.dbcom.models import ExternalDbConfig
 except ImportError:
-    print("AVISO: Não foi possível importar o modelo ExternalDbConfig.")
-    print("A classe Database só funcionará de dentro de um ambiente Django.")
+    logger.warning("Não foi possível importar o modelo ExternalDbConfig. "
+                   "A classe Database só funcionará de dentro de um ambiente Django.")
     ExternalDbConfig = None
 
+try:
+    from django.conf import settings as django_settings
+except ImportError:
+    django_settings = None
+
+
+# Valores padrão do pool (podem ser sobrescritos em settings.EXTERNAL_DB_POOL)
+POOL_DEFAULTS = {
+    'max_size': 5,               # Máximo de conexões abertas por nome de conexão
+    'checkout_timeout': 10,      # Segundos esperando uma conexão livre antes de desistir
+    'max_idle_seconds': 300,     # Conexões ociosas há mais tempo que isso são recicladas
+    'max_lifetime_seconds': 3600,  # Idade máxima de uma conexão, mesmo em uso constante
+}
+
+
+def get_pool_settings():
+    """
+    Retorna a configuração efetiva do pool, mesclando os padrões
+    com o dicionário settings.EXTERNAL_DB_POOL (se existir).
+    """
+    pool_settings = dict(POOL_DEFAULTS)
+    if django_settings is not None:
+        try:
+            pool_settings.update(getattr(django_settings, 'EXTERNAL_DB_POOL', {}) or {})
+        except Exception:
+            # settings ainda não configurado (ex: import fora do Django)
+            pass
+    return pool_settings
+
+
+class PoolTimeoutError(Exception):
+    """
+    Levantada quando nenhuma conexão fica livre dentro do 'checkout_timeout'.
+    """
+    pass
+
+
+class _PooledConnection:
+    """
+    Envelope simples que guarda a conexão e os instantes de criação
+    e de último uso, usados para a reciclagem.
+    """
+    __slots__ = ('connection', 'created_at', 'last_used_at')
+
+    def __init__(self, connection):
+        now = time.monotonic()
+        self.connection = connection
+        self.created_at = now
+        self.last_used_at = now
+
+
+class ConnectionPool:
+    """
+    Pool de conexões MySQL limitado, com verificação de saúde no checkout,
+    reciclagem de conexões ociosas e tempo de vida máximo.
+
+    Existe um pool por nome de conexão (ExternalDbConfig.nome_conexao),
+    obtido através de get_pool().
+    """
+    def __init__(self, name, config, max_size=5, checkout_timeout=10,
+                 max_idle_seconds=300, max_lifetime_seconds=3600):
+        self.name = name
+        self.config = config
+        self.max_size = max(1, int(max_size))
+        self.checkout_timeout = checkout_timeout
+        self.max_idle_seconds = max_idle_seconds
+        self.max_lifetime_seconds = max_lifetime_seconds
+
+        self._idle = deque()
+        self._in_use = 0
+        self._closed = False  # Pool descartado (close_all): conexões que voltam são fechadas
+        self._cond = threading.Condition()
+
+        # Estatísticas para monitoramento
+        self._stats = {
+            'created': 0,
+            'closed': 0,
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'failed_health_checks': 0,
+            'recycled_idle': 0,
+            'recycled_lifetime': 0,
+            'checkout_time_total_ms': 0.0,
+            'checkout_time_max_ms': 0.0,
+        }
+
+    # --- Ciclo de vida das conexões ---
+
+    def _open(self):
+        connection = mysql.connector.connect(**self.config)
+        with self._cond:
+            self._stats['created'] += 1
+        return _PooledConnection(connection)
+
+    def _close(self, pooled):
+        try:
+            pooled.connection.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._stats['closed'] += 1
+
+    def _is_expired(self, pooled, now):
+        """ Retorna o motivo da expiração ('idle'/'lifetime') ou None. """
+        if self.max_lifetime_seconds and now - pooled.created_at > self.max_lifetime_seconds:
+            return 'lifetime'
+        if self.max_idle_seconds and now - pooled.last_used_at > self.max_idle_seconds:
+            return 'idle'
+        return None
+
+    def acquire(self):
+        """
+        Retira uma conexão do pool. Reaproveita conexões ociosas saudáveis,
+        abre uma nova se o limite permitir, ou espera até 'checkout_timeout'.
+        """
+        started = time.monotonic()
+        waited = False
+
+        while True:
+            pooled = None
+            open_new = False
+
+            with self._cond:
+                while True:
+                    if self._idle:
+                        pooled = self._idle.pop()  # LIFO: a conexão mais "quente"
+                        self._in_use += 1
+                        break
+                    if self._in_use + len(self._idle) < self.max_size:
+                        self._in_use += 1
+                        open_new = True
+                        break
+
+                    remaining = self.checkout_timeout - (time.monotonic() - started)
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeoutError(
+                            f"Nenhuma conexão livre no pool '{self.name}' "
+                            f"após {self.checkout_timeout}s ({self.max_size} em uso)."
+                        )
+                    if not waited:
+                        waited = True
+                        self._stats['waits'] += 1
+                    self._cond.wait(remaining)
+
+            # A partir daqui o "slot" já está reservado (_in_use incrementado)
+            if open_new:
+                try:
+                    pooled = self._open()
+                except Exception:
+                    self._release_slot()
+                    raise
+            else:
+                expired = self._is_expired(pooled, time.monotonic())
+                if expired:
+                    with self._cond:
+                        self._stats[f'recycled_{expired}'] += 1
+                    self._close(pooled)
+                    self._release_slot()
+                    continue
+
+                # Verificação de saúde: is_connected() faz um ping no servidor
+                try:
+                    healthy = pooled.connection.is_connected()
+                except Exception:
+                    healthy = False
+                if not healthy:
+                    with self._cond:
+                        self._stats['failed_health_checks'] += 1
+                    self._close(pooled)
+                    self._release_slot()
+                    continue
+
+            elapsed_ms = (time.monotonic() - started) * 1000
+            with self._cond:
+                self._stats['checkouts'] += 1
+                self._stats['checkout_time_total_ms'] += elapsed_ms
+                if elapsed_ms > self._stats['checkout_time_max_ms']:
+                    self._stats['checkout_time_max_ms'] = elapsed_ms
+            return pooled
+
+    def release(self, pooled, discard=False):
+        """
+        Devolve uma conexão ao pool. Se 'discard' for True (ex: erro de
+        conexão), a conexão é fechada em vez de reaproveitada.
+        """
+        if discard or self._closed:
+            self._close(pooled)
+            self._release_slot()
+            return
+
+        pooled.last_used_at = time.monotonic()
+        with self._cond:
+            if not self._closed:
+                self._in_use -= 1
+                self._idle.append(pooled)
+                self._cond.notify()
+                return
+        # close_all() rodou entre a verificação e o lock
+        self._close(pooled)
+        self._release_slot()
+
+    def _release_slot(self):
+        with self._cond:
+            self._in_use -= 1
+            self._cond.notify()
+
+    def close_all(self):
+        """ Fecha todas as conexões ociosas (as em uso são fechadas ao voltar). """
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+        for pooled in idle:
+            self._close(pooled)
+
+    def stats(self):
+        """ Retorna um dicionário com o estado e os contadores do pool. """
+        with self._cond:
+            data = dict(self._stats)
+            data['name'] = self.name
+            data['max_size'] = self.max_size
+            data['in_use'] = self._in_use
+            data['idle'] = len(self._idle)
+        checkouts = data['checkouts']
+        data['checkout_time_avg_ms'] = round(data['checkout_time_total_ms'] / checkouts, 3) if checkouts else 0.0
+        data['checkout_time_total_ms'] = round(data['checkout_time_total_ms'], 3)
+        data['checkout_time_max_ms'] = round(data['checkout_time_max_ms'], 3)
+        return data
+
+
+# --- Registro de pools por nome de conexão ---
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(connection_name, config):
+    """
+    Retorna o pool da conexão 'connection_name', criando-o na primeira chamada.
+    Se a configuração mudou (ex: senha alterada no Admin), o pool antigo
+    é descartado e um novo é criado.
+    """
+    with _pools_lock:
+        pool = _pools.get(connection_name)
+        if pool is not None and pool.config == config:
+            return pool
+        if pool is not None:
+            pool.close_all()
+
+        pool_settings = get_pool_settings()
+        pool = ConnectionPool(
+            connection_name,
+            config,
+            max_size=pool_settings['max_size'],
+            checkout_timeout=pool_settings['checkout_timeout'],
+            max_idle_seconds=pool_settings['max_idle_seconds'],
+            max_lifetime_seconds=pool_settings['max_lifetime_seconds'],
+        )
+        _pools[connection_name] = pool
+        return pool
+
+
+def get_all_pool_stats():
+    """
+    Retorna as estatísticas de todos os pools ativos, indexadas pelo nome da conexão.
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {pool.name: pool.stats() for pool in pools}
+
+
 class Database:
     """
     Classe principal para gerenciar a conexão e a execução de queries no MySQL.
     Lê as configurações de um modelo Django (ExternalDbConfig).
+
+    Por padrão cada query abre e fecha sua própria conexão. Com pooled=True,
+    as conexões são retiradas de um pool compartilhado por nome de conexão
+    e reaproveitadas entre chamadas (e entre threads).
     """
-    def __init__(self, connection_name: str):
+    def __init__(self, connection_name: str, pooled: bool = False):
         """
         Inicializa a configuração do banco de dados buscando os dados
         do modelo ExternalDbConfig com base no nome da conexão.
@@ -26,9 +309,11 @@ class Database:
         Args:
             connection_name (str): O nome (primary key) da configuração
                                    cadastrada no Django Admin.
+            pooled (bool): Se True, usa o pool de conexões compartilhado.
         """
         self.config = {}
-        self.connection = None
+        self.connection_name = connection_name
+        self.pooled = pooled
 
         if ExternalDbConfig is None:
             raise ImportError("O modelo ExternalDbConfig (apps.dbcom.models) não foi "
@@ -50,39 +335,53 @@ class Database:
                 'database': config_model.database
             }
         except ExternalDbConfig.DoesNotExist:
-            print(f"Erro Crítico: A configuração de banco de dados "
-                  f"'{connection_name}' não foi encontrada no Admin do Django.")
+            logger.error("Erro Crítico: A configuração de banco de dados "
+                         "'%s' não foi encontrada no Admin do Django.", connection_name)
             # Levanta um erro claro para debug
             raise ValueError(f"Configuração '{connection_name}' não encontrada.")
         except Exception as e:
-            print(f"Erro ao carregar a configuração do DB '{connection_name}': {e}")
+            logger.error("Erro ao carregar a configuração do DB '%s': %s", connection_name, e)
             raise
 
     def _connect(self):
         """
-        Estabelece uma conexão com o banco de dados.
+        Estabelece uma conexão com o banco de dados e a retorna.
         """
         try:
             # Tenta conectar usando a configuração
-            self.connection = mysql.connector.connect(**self.config)
+            return mysql.connector.connect(**self.config)
         except mysql.connector.Error as err:
             # Trata erros comuns de conexão
             if err.errno == errorcode.ER_ACCESS_DENIED_ERROR:
-                print("Erro: Usuário ou senha do banco de dados inválidos.")
+                logger.error("Erro: Usuário ou senha do banco de dados inválidos.")
             elif err.errno == errorcode.ER_BAD_DB_ERROR:
-                print(f"Erro: O banco de dados '{self.config['database']}' não existe.")
+                logger.error("Erro: O banco de dados '%s' não existe.", self.config['database'])
             else:
-                print(f"Erro ao conectar ao MySQL: {err}")
+                logger.error("Erro ao conectar ao MySQL: %s", err)
             # Levanta a exceção para que o aplicativo saiba que a conexão falhou
             raise
 
-    def _disconnect(self):
+    def _disconnect(self, connection):
         """
         Fecha a conexão se estiver aberta.
         """
-        if self.connection and self.connection.is_connected():
-            self.connection.close()
-            self.connection = None
+        if connection and connection.is_connected():
+            connection.close()
+
+    @property
+    def pool(self):
+        """
+        O pool compartilhado desta conexão (apenas no modo pooled).
+        """
+        return get_pool(self.connection_name, self.config)
+
+    def pool_stats(self):
+        """
+        Estatísticas do pool desta conexão, ou None se não estiver em modo pooled.
+        """
+        if not self.pooled:
+            return None
+        return self.pool.stats()
 
     @contextmanager
     def get_cursor(self, dictionary=False, commit=False):
@@ -93,28 +392,63 @@ class Database:
             dictionary (bool): Se True, o cursor retornará linhas como dicionários.
             commit (bool): Se True, a transação será commitada ao final.
         """
-        self._connect()
+        # A conexão é uma variável local (e não um atributo) para que a mesma
+        # instância de Database possa ser usada por várias threads ao mesmo tempo.
+        pool = None
+        pooled_conn = None
+        if self.pooled:
+            pool = self.pool
+            try:
+                pooled_conn = pool.acquire()
+            except mysql.connector.Error as err:
+                logger.error("Erro ao conectar ao MySQL (pool '%s'): %s", self.connection_name, err)
+                raise
+            connection = pooled_conn.connection
+        else:
+            connection = self._connect()
+
         cursor = None
+        broken = False
         try:
             # dictionary=True é muito útil para APIs, pois retorna {coluna: valor}
-            cursor = self.connection.cursor(dictionary=dictionary)
+            cursor = connection.cursor(dictionary=dictionary)
             # Fornece o cursor para o bloco 'with'
             yield cursor
-        except mysql.connector.Error as err:
-            # Em caso de erro, desfaz (rollback) a transação
-            print(f"Erro de banco de dados: {err}")
-            if self.connection:
-                self.connection.rollback()
+        except Exception as err:
+            # Em caso de erro (do banco ou do código no bloco 'with'), desfaz
+            # (rollback) a transação: a conexão não pode voltar ao pool com
+            # uma transação aberta ou um resultado não lido
+            if isinstance(err, mysql.connector.Error):
+                logger.error("Erro de banco de dados: %s", err)
+            try:
+                connection.rollback()
+            except Exception:
+                # A própria conexão está quebrada; não deve voltar ao pool
+                broken = True
             raise
         else:
-            # Se 'commit' for True e não houver erros, commita a transação
-            if commit:
-                self.connection.commit()
+            try:
+                # Se 'commit' for True e não houver erros, commita a transação
+                if commit:
+                    connection.commit()
+                elif pooled_conn and connection.in_transaction:
+                    # Encerra a transação implícita do SELECT para que a próxima
+                    # query nesta conexão não leia um snapshot antigo (REPEATABLE READ)
+                    connection.rollback()
+            except mysql.connector.Error:
+                broken = True
+                raise
         finally:
-            # Garante que o cursor e a conexão sejam fechados
+            # Garante que o cursor seja fechado e a conexão devolvida/fechada
             if cursor:
-                cursor.close()
-            self._disconnect()
+                try:
+                    cursor.close()
+                except mysql.connector.Error:
+                    broken = True
+            if pooled_conn:
+                pool.release(pooled_conn, discard=broken)
+            else:
+                self._disconnect(connection)
 
     # --- Funções Auxiliares (Opcionais, mas facilitam a vida) ---
 
@@ -138,6 +472,25 @@ class Database:
                 return cursor.fetchone()
             return cursor.fetchall()
 
+    def stream_query(self, query, params=None, batch_size=500):
+        """
+        Executa uma query SELECT e entrega as linhas (dicionários) aos poucos,
+        sem carregar o resultado inteiro na memória.
+
+        O cursor do mysql.connector não é "buffered" por padrão, então as
+        linhas são lidas do servidor em lotes de 'batch_size' conforme o
+        gerador é consumido. A conexão fica ocupada até o fim da iteração;
+        se o consumidor parar antes, ela é descartada (e não devolvida ao pool).
+        """
+        with self.get_cursor(dictionary=True) as cursor:
+            cursor.execute(query, params or ())
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row
+
     def execute_query(self, query, params=None):
         """
         Executa uma query de modificação (INSERT, UPDATE, DELETE).
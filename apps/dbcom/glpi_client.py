@@ -0,0 +1,284 @@
+import time
+import logging
+import threading
+import requests
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from .glpi_session import glpi_sessions, GLPISessionError, get_glpi_api_settings, get_glpi_timeout
+
+
+logger = logging.getLogger(__name__)
+
+
+# Itens por requisição no PUT/PATCH em lote (campo 'input' como lista)
+BULK_CHUNK_SIZE = 50
+
+
+@dataclass
+class ItemUpdate:
+    """
+    Alteração de um item do GLPI: 'url' é o href do item na API
+    (ex: .../apirest.php/Computer/12) e 'fields' os campos a gravar.
+    """
+    itemtype: str
+    item_id: int
+    url: str
+    fields: dict = field(default_factory=dict)
+
+    @property
+    def collection_url(self):
+        # .../Computer/12 -> .../Computer (endpoint do tipo, usado no lote)
+        return self.url.rstrip('/').rsplit('/', 1)[0]
+
+
+@dataclass
+class ItemUpdateResult:
+    """
+    Resultado da atualização de um item (ativo) vinculado ao chamado.
+    'method' indica como foi gravado: PATCH/PUT individual ou em lote
+    (ex: 'PUT (lote)').
+    """
+    itemtype: str
+    url: str
+    ok: bool
+    item_id: int = None
+    method: str = 'PATCH'
+    status_code: int = None
+    error: str = None
+    elapsed_ms: float = 0.0
+
+
+# Respostas 400 do GLPI que recusam o método/formato (e não os dados)
+METHOD_REJECTION_ERRORS = ('ERROR_METHOD_NOT_ALLOWED', 'ERROR_BAD_ARRAY')
+
+
+def _is_method_rejection(response):
+    """
+    O GLPI recusou o método ou o formato do pedido (405/501, ou 400 com
+    erro de método/formato), e não os dados: vale tentar outro método.
+    """
+    if response.status_code in (405, 501):
+        return True
+    return response.status_code == 400 and any(error in response.text for error in METHOD_REJECTION_ERRORS)
+
+
+def _error_text(e):
+    response = getattr(e, 'response', None)
+    return response.text if response is not None else str(e)
+
+
+class GLPIRestClient:
+    """
+    Escrita de itens na API legada do GLPI agrupando as alterações por
+    tipo de item: um PATCH/PUT /:itemtype com 'input' em lista por tipo,
+    em vez de uma requisição por item.
+
+    Lembra, por tipo, qual método funciona ('PATCH' ou 'PUT') e se o lote
+    é aceito; assim a tentativa com o método errado é paga uma vez só por
+    processo. Tipos que recusam o lote são atualizados item a item.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self.bulk_methods = {}    # itemtype -> 'PATCH' | 'PUT' | 'single'
+        self.single_methods = {}  # itemtype -> 'PATCH' | 'PUT'
+        self.counters = {'bulk_requests': 0, 'single_requests': 0, 'method_fallbacks': 0}
+
+    @property
+    def executor(self):
+        # Compartilhado por todas as automações: o limite de concorrência vale
+        # para o processo inteiro, não para cada chamado.
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=get_glpi_api_settings()['MAX_CONCURRENCY'],
+                        thread_name_prefix='glpi-item-update',
+                    )
+        return self._executor
+
+    def _count(self, counter, amount=1):
+        with self._lock:
+            self.counters[counter] += amount
+
+    def _remember(self, memory, itemtype, method):
+        with self._lock:
+            memory[itemtype] = method
+
+    # --- Lote ---
+
+    @staticmethod
+    def _parse_bulk_response(data):
+        """
+        O GLPI responde ao lote com [{"12": true, "message": ""}, ...].
+        Retorna {id: (ok, mensagem)}.
+        """
+        outcomes = {}
+        for entry in data if isinstance(data, list) else []:
+            if not isinstance(entry, dict):
+                continue
+            message = entry.get('message', '')
+            for key, value in entry.items():
+                if key != 'message' and str(key).isdigit():
+                    outcomes[int(key)] = (bool(value), message)
+        return outcomes
+
+    def _bulk_update(self, config, itemtype, updates, timeout):
+        """
+        Atualiza um grupo do mesmo tipo em uma requisição.
+        Retorna a lista de resultados ou None se o tipo não aceita lote.
+
+        Só uma recusa do método (ver _is_method_rejection) leva ao próximo
+        método ou ao modo item a item; outros 4xx (permissão, validação)
+        são falhas dos itens deste lote e não mudam o método lembrado.
+        """
+        known = self.bulk_methods.get(itemtype)
+        if known == 'single':
+            return None
+        methods = [known] if known else ['PATCH', 'PUT']
+
+        payload = {"input": [dict(update.fields, id=update.item_id) for update in updates]}
+        url = updates[0].collection_url
+        started = time.perf_counter()
+
+        for method in methods:
+            try:
+                response = glpi_sessions.request(config, method, url, json=payload, timeout=timeout)
+                self._count('bulk_requests')
+            except (requests.exceptions.RequestException, GLPISessionError) as e:
+                return self._failed_all(updates, f"{method} (lote)", None, _error_text(e), started)
+
+            if known is None and _is_method_rejection(response):
+                self._count('method_fallbacks')
+                continue
+            if response.status_code >= 300:
+                return self._failed_all(updates, f"{method} (lote)", response.status_code, response.text, started)
+
+            self._remember(self.bulk_methods, itemtype, method)
+            try:
+                outcomes = self._parse_bulk_response(response.json())
+            except ValueError:
+                outcomes = {}
+            elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+            results = []
+            for update in updates:
+                ok, message = outcomes.get(update.item_id, (False, 'Item ausente na resposta do lote.'))
+                results.append(ItemUpdateResult(
+                    itemtype=itemtype, url=update.url, item_id=update.item_id, ok=ok,
+                    method=f"{method} (lote)", status_code=response.status_code,
+                    error=None if ok else f"Erro na API! Item {itemtype} (URL: {update.url}). Resposta: {message}",
+                    elapsed_ms=elapsed_ms,
+                ))
+            return results
+
+        # Nenhum método aceito: o tipo passa a ser atualizado item a item
+        logger.warning("A API do GLPI recusou a atualização em lote de '%s'. Usando requisições individuais.", itemtype)
+        self._remember(self.bulk_methods, itemtype, 'single')
+        return None
+
+    @staticmethod
+    def _failed_all(updates, method, status_code, error_text, started):
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+        return [
+            ItemUpdateResult(
+                itemtype=update.itemtype, url=update.url, item_id=update.item_id, ok=False,
+                method=method, status_code=status_code,
+                error=f"Erro na API! Item {update.itemtype} (URL: {update.url}). Resposta: {error_text}",
+                elapsed_ms=elapsed_ms,
+            )
+            for update in updates
+        ]
+
+    # --- Item a item ---
+
+    def _single_update(self, config, update, timeout):
+        """
+        PATCH de um item, com PUT como alternativa em caso de 4xx. O método
+        que funcionou fica registrado para o tipo e é usado direto nas próximas.
+        """
+        started = time.perf_counter()
+        known = self.single_methods.get(update.itemtype)
+        method = known or 'PATCH'
+        payload = {"input": update.fields}
+        try:
+            response = glpi_sessions.request(config, method, update.url, json=payload, timeout=timeout)
+            self._count('single_requests')
+
+            if known is None and 400 <= response.status_code < 500:
+                logger.info("PATCH de %s falhou com %s. Tentando PUT...", update.itemtype, response.status_code)
+                self._count('method_fallbacks')
+                method = 'PUT'
+                response = glpi_sessions.request(config, method, update.url, json=payload, timeout=timeout)
+                self._count('single_requests')
+
+            response.raise_for_status()
+            self._remember(self.single_methods, update.itemtype, method)
+            return ItemUpdateResult(
+                itemtype=update.itemtype, url=update.url, item_id=update.item_id, ok=True,
+                method=method, status_code=response.status_code,
+                elapsed_ms=round((time.perf_counter() - started) * 1000, 2),
+            )
+
+        except (requests.exceptions.RequestException, GLPISessionError) as e:
+            response = getattr(e, 'response', None)
+            return ItemUpdateResult(
+                itemtype=update.itemtype, url=update.url, item_id=update.item_id, ok=False,
+                method=method, status_code=response.status_code if response is not None else None,
+                error=f"Erro na API! Item {update.itemtype} (URL: {update.url}). Resposta: {_error_text(e)}",
+                elapsed_ms=round((time.perf_counter() - started) * 1000, 2),
+            )
+
+    def update_items(self, config, updates):
+        """
+        Aplica as alterações (lista de ItemUpdate) e retorna um
+        ItemUpdateResult por item, na mesma ordem.
+
+        Os grupos (tipo de item, em blocos de BULK_CHUNK_SIZE) são enviados
+        em paralelo; os itens de tipos sem suporte a lote, em seguida, um
+        por requisição (também em paralelo).
+        """
+        timeout = get_glpi_timeout()
+
+        groups = {}
+        for update in updates:
+            groups.setdefault((update.itemtype, update.collection_url), []).append(update)
+
+        bulk_futures = []
+        single_updates = []
+        for (itemtype, _), group in groups.items():
+            if self.bulk_methods.get(itemtype) == 'single':
+                single_updates.extend(group)
+                continue
+            for i in range(0, len(group), BULK_CHUNK_SIZE):
+                chunk = group[i:i + BULK_CHUNK_SIZE]
+                bulk_futures.append((chunk, self.executor.submit(self._bulk_update, config, itemtype, chunk, timeout)))
+
+        results = {}
+        for chunk, future in bulk_futures:
+            chunk_results = future.result()
+            if chunk_results is None:
+                single_updates.extend(chunk)
+                continue
+            for update, result in zip(chunk, chunk_results):
+                results[id(update)] = result
+
+        single_futures = [
+            (update, self.executor.submit(self._single_update, config, update, timeout))
+            for update in single_updates
+        ]
+        for update, future in single_futures:
+            results[id(update)] = future.result()
+
+        return [results[id(update)] for update in updates]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'bulk_methods': dict(self.bulk_methods),
+                'single_methods': dict(self.single_methods),
+                **self.counters,
+            }
+
+
+# Instância única por processo
+glpi_client = GLPIRestClient()
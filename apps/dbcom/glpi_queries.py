@@ -1,223 +1,414 @@
+import time
+import logging
+import threading
+from datetime import datetime
+from django.conf import settings
 from .db_manager import Database
+from .query_cache import glpi_cached
 from apps.dbcom.models import ExternalDbConfig
 
+logger = logging.getLogger(__name__)
+
 try:
-    # Pega a instância da conexão "GLPI" que você cadastrou no admin
-    db_glpi = Database(connection_name='GLPIDB') 
+    # Pega a instância da conexão "GLPI" que você cadastrou no admin.
+    # Usa o pool para que painel, webhooks e admin reaproveitem conexões abertas.
+    db_glpi = Database(connection_name='GLPIDB', pooled=True)
 except Exception as e:
-    print(f"Erro ao iniciar a conexão com GLPI: {e}")
+    logger.error("Erro ao iniciar a conexão com GLPI: %s", e)
     db_glpi = None
 
 
+# --- Painel de chamados ---
+# A mesma consulta é usada na carga completa e na incremental. As colunas
+# com prefixo '_' são internas (ordenação, watermark e visibilidade) e são
+# removidas antes de os dados saírem deste módulo.
+
+PANEL_TICKETS_SELECT = """
+    SELECT
+    gt.id,
+    ge.name AS 'Entidade',
+    gt.name AS 'Titulo',
+    DATE_FORMAT(gt.`date`, '%d/%m/%y %H:%i') AS 'Abertura',
+    CASE
+        WHEN gt.status = 1 THEN 'Novo'
+        WHEN gt.status = 2 THEN 'Em atendimento'
+        WHEN gt.status = 3 THEN 'Em atendimento (planejado)'
+        WHEN gt.status = 4 THEN 'Pendente'
+        WHEN gt.status = 5 THEN 'Solucionado'
+        WHEN gt.status = 10 THEN 'Aprovação'
+    END AS 'Status',
+    CASE
+        WHEN gt.urgency = 1 THEN 'Muito baixa'
+        WHEN gt.urgency = 2 THEN 'Baixa'
+        WHEN gt.urgency = 3 THEN 'Média'
+        WHEN gt.urgency = 4 THEN 'Alta'
+        WHEN gt.urgency = 5 THEN 'Muito Alta'
+    END AS 'Urgencia',
+    GROUP_CONCAT(
+        DISTINCT CASE
+            WHEN gtu.`type` = 1 THEN CONCAT_WS(' ', gu.firstname, gu.realname)
+            ELSE NULL
+        END
+        SEPARATOR ', '
+    ) AS 'Solicitante',
+    GROUP_CONCAT(
+        DISTINCT CASE
+            WHEN gtu.`type` = 2 THEN gu.firstname
+            ELSE NULL
+        END
+    ) AS 'Tecnico',
+    gt.status AS 'idstatus',
+    gt.urgency AS '_urgency',
+    gt.`date` AS '_date',
+    gt.date_mod AS '_date_mod',
+    (
+        gt.status NOT IN (6)
+        AND gt.is_deleted = 0
+        AND gt.name NOT LIKE '%TECOM%'
+        AND gt.name NOT LIKE '%manutenção corretiva%'
+    ) AS '_visivel'
+    FROM glpi_tickets AS gt
+    LEFT JOIN glpi_entities AS ge ON ge.id = gt.entities_id
+    LEFT JOIN glpi_tickets_users AS gtu ON gtu.tickets_id = gt.id
+    LEFT JOIN glpi_users AS gu ON gu.id = gtu.users_id
+"""
+
+PANEL_TICKETS_GROUP_BY = """
+    GROUP BY
+        gt.id,
+        ge.name,
+        gt.`date`,
+        gt.status,
+        gt.urgency,
+        gt.date_mod
+"""
+
+PANEL_TICKETS_ORDER_BY = """
+    ORDER BY gt.urgency DESC,
+        CASE gt.status
+        WHEN 1  THEN 1  -- Primeira prioridade
+        WHEN 2  THEN 2  -- Segunda prioridade
+        WHEN 3  THEN 3  -- Terceira prioridade
+        WHEN 4 THEN 4  -- Quarta prioridade
+        WHEN 10  THEN 5  -- Quinta prioridade
+        WHEN 5  THEN 6  -- Sexta prioridade
+        ELSE 999        -- Joga qualquer outro status (como o 4) para o final
+    END ASC, gt.`date` DESC
+"""
+
+# Carga completa: todos os chamados visíveis no painel
+PANEL_TICKETS_FULL_SQL = PANEL_TICKETS_SELECT + """
+    WHERE
+        gt.status NOT IN (6)
+        AND gt.is_deleted = 0
+        AND gt.name NOT LIKE '%TECOM%'
+        AND gt.name NOT LIKE '%manutenção corretiva%'
+""" + PANEL_TICKETS_GROUP_BY + PANEL_TICKETS_ORDER_BY
+
+# Carga incremental: tudo que foi modificado desde o watermark, inclusive
+# chamados que deixaram de ser visíveis (fechados, excluídos, renomeados)
+PANEL_TICKETS_SINCE_SQL = PANEL_TICKETS_SELECT + """
+    WHERE gt.date_mod >= %s
+""" + PANEL_TICKETS_GROUP_BY
+
+# Mesma prioridade de status do ORDER BY acima
+PANEL_STATUS_PRIORITY = {1: 1, 2: 2, 3: 3, 4: 4, 10: 5, 5: 6}
+
+
+def _panel_public_row(row):
+    return {k: v for k, v in row.items() if not k.startswith('_')}
+
+
+def _sort_panel_rows(rows):
+    """
+    Reproduz em Python o ORDER BY do painel: urgência DESC, prioridade
+    do status ASC, data de abertura DESC. (Ordenações estáveis, da chave
+    menos significativa para a mais significativa.)
+    """
+    rows = sorted(rows, key=lambda r: r.get('_date') or datetime.min, reverse=True)
+    rows.sort(key=lambda r: PANEL_STATUS_PRIORITY.get(r.get('idstatus'), 999))
+    rows.sort(key=lambda r: r.get('_urgency') or 0, reverse=True)
+    return rows
+
+
 def get_panel_data():
     """Busca os dados para atualização do painel"""
     if not db_glpi:
         return []
-    
-    sql = """
-        SELECT
-        gt.id,
-        ge.name AS 'Entidade',
-        gt.name AS 'Titulo',
-        DATE_FORMAT(gt.`date`, '%d/%m/%y %H:%i') AS 'Abertura',
-        CASE
-            WHEN gt.status = 1 THEN 'Novo'
-            WHEN gt.status = 2 THEN 'Em atendimento'
-            WHEN gt.status = 3 THEN 'Em atendimento (planejado)'
-            WHEN gt.status = 4 THEN 'Pendente'
-            WHEN gt.status = 5 THEN 'Solucionado'
-            WHEN gt.status = 10 THEN 'Aprovação'
-        END AS 'Status',
-        CASE
-            WHEN gt.urgency = 1 THEN 'Muito baixa'
-            WHEN gt.urgency = 2 THEN 'Baixa'
-            WHEN gt.urgency = 3 THEN 'Média'
-            WHEN gt.urgency = 4 THEN 'Alta'
-            WHEN gt.urgency = 5 THEN 'Muito Alta'
-        END AS 'Urgencia',
-        GROUP_CONCAT(
-            DISTINCT CASE
-                WHEN gtu.`type` = 1 THEN CONCAT_WS(' ', gu.firstname, gu.realname)
-                ELSE NULL
-            END
-            SEPARATOR ', '
-        ) AS 'Solicitante',
-        GROUP_CONCAT(
-            DISTINCT CASE
-                WHEN gtu.`type` = 2 THEN gu.firstname
-                ELSE NULL
-            END
-        ) AS 'Tecnico',
-        gt.status AS 'idstatus'
-        FROM glpi_tickets AS gt
-        LEFT JOIN glpi_entities AS ge ON ge.id = gt.entities_id
-        LEFT JOIN glpi_tickets_users AS gtu ON gtu.tickets_id = gt.id
-        LEFT JOIN glpi_users AS gu ON gu.id = gtu.users_id
-        WHERE
-            gt.status NOT IN (6)
-            AND gt.is_deleted = 0
-            AND gt.name NOT LIKE '%TECOM%'
-            AND gt.name NOT LIKE '%manutenção corretiva%'
-        GROUP BY
-            gt.id,
-            ge.name,
-            gt.`date`,
-            gt.status,
-            gt.urgency
-        ORDER BY gt.urgency DESC,
-            CASE gt.status
-            WHEN 1  THEN 1  -- Primeira prioridade
-            WHEN 2  THEN 2  -- Segunda prioridade
-            WHEN 3  THEN 3  -- Terceira prioridade
-            WHEN 4 THEN 4  -- Quarta prioridade
-            WHEN 10  THEN 5  -- Quinta prioridade
-            WHEN 5  THEN 6  -- Sexta prioridade
-            ELSE 999        -- Joga qualquer outro status (como o 4) para o final
-        END ASC, gt.`date` DESC
+
+    return [_panel_public_row(row) for row in db_glpi.fetch_query(PANEL_TICKETS_FULL_SQL)]
+
+
+class PanelTicketTable:
     """
-    
-    return db_glpi.fetch_query(sql)
+    Tabela de chamados do painel mantida em memória.
+
+    Em vez de reprocessar todos os chamados abertos a cada ciclo, busca só
+    os chamados com glpi_tickets.date_mod >= último watermark e os mescla na
+    tabela. A cada 'reconcile_seconds' faz uma carga completa, que corrige
+    o que a carga incremental não enxerga (chamados apagados do banco,
+    mudanças de nome de usuário/entidade, etc).
+    """
+    def __init__(self, reconcile_seconds=300):
+        self.reconcile_seconds = reconcile_seconds
+        self.rows = {}
+        self.watermark = None
+        self.last_full_load = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """ Força uma carga completa na próxima chamada. """
+        with self._lock:
+            self.last_full_load = None
+
+    def _needs_full_load(self):
+        if self.last_full_load is None or self.watermark is None:
+            return True
+        return time.monotonic() - self.last_full_load >= self.reconcile_seconds
+
+    def _advance_watermark(self, rows):
+        for row in rows:
+            date_mod = row.get('_date_mod')
+            if date_mod is not None and (self.watermark is None or date_mod > self.watermark):
+                self.watermark = date_mod
+
+    def _full_load(self):
+        rows = db_glpi.fetch_query(PANEL_TICKETS_FULL_SQL)
+        self.rows = {row['id']: row for row in rows}
+        self.watermark = None
+        self._advance_watermark(rows)
+        self.last_full_load = time.monotonic()
+
+    def _incremental_load(self):
+        # '>=' (e não '>') para não perder alterações feitas no mesmo segundo
+        # do watermark; as linhas repetidas apenas sobrescrevem a si mesmas.
+        rows = db_glpi.fetch_query(PANEL_TICKETS_SINCE_SQL, (self.watermark,))
+        for row in rows:
+            if row.get('_visivel'):
+                self.rows[row['id']] = row
+            else:
+                self.rows.pop(row['id'], None)
+        self._advance_watermark(rows)
+
+    def fetch(self):
+        """
+        Atualiza a tabela (carga completa ou incremental) e retorna
+        os chamados ordenados como em get_panel_data().
+        """
+        if not db_glpi:
+            return []
+
+        with self._lock:
+            if self._needs_full_load():
+                self._full_load()
+            else:
+                self._incremental_load()
+            rows = _sort_panel_rows(self.rows.values())
+        return [_panel_public_row(row) for row in rows]
+
+
+panel_ticket_table = PanelTicketTable(
+    reconcile_seconds=getattr(settings, 'GLPI_PANEL_RECONCILE_SECONDS', 300)
+)
+
 
+def get_panel_data_incremental():
+    """
+    Mesmo resultado de get_panel_data(), mas usando a tabela incremental
+    (custo por ciclo proporcional ao número de chamados alterados).
+    """
+    return panel_ticket_table.fetch()
+
+
+# --- Ativos para impressão de etiquetas ---
+# Uma consulta por tipo de ativo: o filtro de tipo escolhe a tabela, em vez
+# de filtrar o resultado de um UNION ALL com todo o inventário do GLPI.
+
+GLPI_FRONT_URL = 'https://centraldeservicos.grupoapariciocarvalho.com.br/front'
+
+ASSET_PAGE_SIZE_DEFAULT = 100
+ASSET_PAGE_SIZE_MAX = 1000
+
+# tipo -> tabela, página do formulário no GLPI, se possui 'is_template'
+# e, para os ativos customizados (glpi_assets_assets), o system_name da definição.
+ASSET_TYPES = {
+    'Computer': {'table': 'glpi_computers', 'form': 'computer.form.php'},
+    'Monitor': {'table': 'glpi_monitors', 'form': 'monitor.form.php'},
+    'Printer': {'table': 'glpi_printers', 'form': 'printer.form.php'},
+    'Phone': {'table': 'glpi_phones', 'form': 'phone.form.php'},
+    'Networkequipment': {'table': 'glpi_networkequipments', 'form': 'networkequipment.form.php'},
+    'Rack': {'table': 'glpi_racks', 'form': 'rack.form.php'},
+    'Consumableitem': {'table': 'glpi_consumableitems', 'form': 'consumableitem.form.php', 'has_template': False},
+    'Projetor': {'system_name': 'projetor'},
+    'Scanner': {'system_name': 'scanner'},
+    'Nobreak': {'system_name': 'nobreak'},
+}
+
+
+def _build_asset_query(asset_type):
+    """
+    Monta (colunas, FROM/WHERE, parâmetros) da consulta de um tipo de ativo.
+    Os ativos nativos usam a entidade; os customizados, a localização.
+    """
+    spec = ASSET_TYPES[asset_type]
+
+    if 'system_name' in spec:
+        columns = f"""
+            %s AS asset_type,
+            l.name AS entity,
+            a.name AS asset_name,
+            a.id AS asset_id,
+            CONCAT('{GLPI_FRONT_URL}/asset/asset.form.php?class={spec['system_name']}&id=', a.id) AS url
+        """
+        source = """
+            FROM glpi_assets_assets a
+            INNER JOIN glpi_assets_assetdefinitions d ON d.id = a.assets_assetdefinitions_id
+            LEFT JOIN glpi_locations l ON l.id = a.locations_id
+            WHERE a.is_template = 0 AND a.is_deleted = 0 AND d.system_name = %s
+        """
+        return columns, source, 'l.name', [asset_type], [spec['system_name']]
+
+    columns = f"""
+        %s AS asset_type,
+        e.name AS entity,
+        a.name AS asset_name,
+        a.id AS asset_id,
+        CONCAT('{GLPI_FRONT_URL}/{spec['form']}?id=', a.id) AS url
+    """
+    where = "a.is_deleted = 0"
+    if spec.get('has_template', True):
+        where = "a.is_template = 0 AND " + where
+    source = f"""
+        FROM {spec['table']} a
+        LEFT JOIN glpi_entities e ON e.id = a.entities_id
+        WHERE {where}
+    """
+    return columns, source, 'e.name', [asset_type], []
+
+
+def _asset_search_clause(entity_column, search):
+    if not search:
+        return "", []
+    term = f"%{search}%"
+    return f" AND (a.name LIKE %s OR {entity_column} LIKE %s)", [term, term]
 
-def get_assets_for_printing(asset_type: str):
 
-    print("\n--- DEBUG: get_assets_for_printing ---")
-    print(f"[DEBUG] Tentando buscar ativos do tipo: {asset_type}")
+def _asset_keyset_clause(after):
+    """
+    Condição de paginação por cursor (keyset): linhas depois de
+    (asset_name, asset_id) na ordem 'a.name, a.id'. No MySQL os nomes
+    NULL vêm primeiro na ordem crescente.
+    """
+    if after is None:
+        return "", []
+    name, asset_id = after
+    if name is None:
+        return " AND ((a.name IS NULL AND a.id > %s) OR a.name IS NOT NULL)", [asset_id]
+    return " AND (a.name > %s OR (a.name = %s AND a.id > %s))", [name, name, asset_id]
+
 
+def build_assets_query(asset_type, search=None, after=None, limit=None, offset=None):
+    """
+    Monta (sql, params) da listagem de ativos de um tipo, ordenada por
+    nome e id. 'after' é o cursor (asset_name, asset_id) da última linha
+    já recebida; 'offset' é mantido para a paginação por número de página.
+    """
+    columns, source, entity_column, column_params, source_params = _build_asset_query(asset_type)
+    search_sql, search_params = _asset_search_clause(entity_column, search)
+    keyset_sql, keyset_params = _asset_keyset_clause(after)
+
+    sql = f"SELECT {columns} {source} {search_sql} {keyset_sql} ORDER BY a.name ASC, a.id ASC"
+    params = column_params + source_params + search_params + keyset_params
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(limit)
+        if offset:
+            sql += " OFFSET %s"
+            params.append(offset)
+    return sql, tuple(params)
+
+
+def get_assets_for_printing(asset_type: str, search: str = None, page: int = None, page_size: int = None,
+                            after=None, limit: int = None):
+    """
+    Retorna os ativos de um tipo para a impressão de etiquetas, ordenados
+    pelo nome. 'search' filtra por nome do ativo ou entidade/localização.
+
+    Paginação (opcional):
+        after/limit: por cursor, as 'limit' linhas seguintes a
+            after=(asset_name, asset_id).
+        page/page_size: por número de página (a partir de 1).
+    Sem nenhuma delas, retorna todos os ativos do tipo.
+    """
     if not db_glpi:
-        print("[DEBUG] FALHA: db_glpi não está inicializado.")
+        logger.error("Erro: conexão com o GLPI não inicializada (get_assets_for_printing).")
         return []
-    
-    sql="""
-        SELECT
-        all_assets.asset_type,
-        all_assets.entity,
-        all_assets.asset_name,
-        all_assets.url
-        FROM (
-            -- Computadores
-            (SELECT
-                'Computer' AS asset_type,
-                e.name AS entity,
-                c.name AS asset_name,
-                CONCAT('https://centraldeservicos.grupoapariciocarvalho.com.br/front/computer.form.php?id=', c.id) AS url
-            FROM glpi_computers c
-            LEFT JOIN glpi_entities e ON e.id = c.entities_id
-            WHERE c.is_template = 0 AND c.is_deleted = 0)
-            UNION ALL
-            -- Monitores
-            (SELECT
-                'Monitor' AS asset_type,
-                e.name AS entity,
-                m.name AS asset_name,
-                CONCAT('https://centraldeservicos.grupoapariciocarvalho.com.br/front/monitor.form.php?id=', m.id) AS url
-            FROM glpi_monitors m
-            LEFT JOIN glpi_entities e ON e.id = m.entities_id
-            WHERE m.is_template = 0 AND m.is_deleted = 0)
-            UNION ALL
-            -- Impressoras
-            (SELECT
-                'Printer' AS asset_type,
-                e.name AS entity,
-                p.name AS asset_name,
-                CONCAT('https://centraldeservicos.grupoapariciocarvalho.com.br/front/printer.form.php?id=', p.id) AS url
-            FROM glpi_printers p
-            LEFT JOIN glpi_entities e ON e.id = p.entities_id
-            WHERE p.is_template = 0 AND p.is_deleted = 0)
-            UNION ALL
-            -- Telefones
-            (SELECT
-                'Phone' AS asset_type,
-                e.name AS entity,
-                ph.name AS asset_name,
-                CONCAT('https://centraldeservicos.grupoapariciocarvalho.com.br/front/phone.form.php?id=', ph.id) AS url
-            FROM glpi_phones ph
-            LEFT JOIN glpi_entities e ON e.id = ph.entities_id
-            WHERE ph.is_template = 0 AND ph.is_deleted = 0)
-            UNION ALL
-            -- Equipamentos de Rede
-            (SELECT
-                'Networkequipment' AS asset_type,
-                e.name AS entity,
-                n.name AS asset_name,
-                CONCAT('https://centraldeservicos.grupoapariciocarvalho.com.br/front/networkequipment.form.php?id=', n.id) AS url
-            FROM glpi_networkequipments n
-            LEFT JOIN glpi_entities e ON e.id = n.entities_id
-            WHERE n.is_template = 0 AND n.is_deleted = 0)
-            UNION ALL
-            -- Racks
-            (SELECT
-                'Rack' AS asset_type,
-                e.name AS entity,
-                r.name AS asset_name,
-                CONCAT('https://centraldeservicos.grupoapariciocarvalho.com.br/front/rack.form.php?id=', r.id) AS url
-            FROM glpi_racks r
-            LEFT JOIN glpi_entities e ON e.id = r.entities_id
-            WHERE r.is_template = 0 AND r.is_deleted = 0)
-            UNION ALL
-            -- Consumíveis (Itens)
-            (SELECT
-                'Consumableitem' AS asset_type,
-                e.name AS entity,
-                ci.name AS asset_name,
-                CONCAT('https://centraldeservicos.grupoapariciocarvalho.com.br/front/consumableitem.form.php?id=', ci.id) AS url
-            FROM glpi_consumableitems ci
-            LEFT JOIN glpi_entities e ON e.id = ci.entities_id
-            WHERE ci.is_deleted = 0)
-            UNION ALL
-            -- Projetores
-            SELECT 'Projetor' AS asset_type,
-                glpi_locations.name AS entity,
-                projetor.name AS asset_name,
-                CONCAT('https://centraldeservicos.grupoapariciocarvalho.com.br/front/asset/asset.form.php?class=projetor&id=', projetor.id) AS url FROM glpi_assets_assets projetor
-            LEFT JOIN glpi_assets_assetdefinitions ON projetor.assets_assetdefinitions_id  = glpi_assets_assetdefinitions.id
-            LEFT JOIN glpi_locations ON glpi_locations.id = projetor.locations_id 
-            WHERE projetor.is_template = 0 and projetor.is_deleted = 0 AND glpi_assets_assetdefinitions.system_name = 'projetor'
-            UNION ALL
-            -- Scanners
-            SELECT 'Scanner' AS asset_type,
-                glpi_locations.name AS entity,
-                scanner.name AS asset_name,
-                CONCAT('https://centraldeservicos.grupoapariciocarvalho.com.br/front/asset/asset.form.php?class=scanner&id=', scanner.id) AS url FROM glpi_assets_assets scanner
-            LEFT JOIN glpi_assets_assetdefinitions ON scanner.assets_assetdefinitions_id  = glpi_assets_assetdefinitions.id
-            LEFT JOIN glpi_locations ON glpi_locations.id = scanner.locations_id 
-            WHERE scanner.is_template = 0 and scanner.is_deleted = 0 AND glpi_assets_assetdefinitions.system_name = 'scanner'
-            UNION ALL
-            -- Nobreak
-            SELECT 'Nobreak' AS asset_type,
-                glpi_locations.name AS entity,
-                nobreak.name AS asset_name,
-                CONCAT('https://centraldeservicos.grupoapariciocarvalho.com.br/front/asset/asset.form.php?class=nobreak&id=', nobreak.id) AS url FROM glpi_assets_assets nobreak
-            LEFT JOIN glpi_assets_assetdefinitions ON nobreak.assets_assetdefinitions_id  = glpi_assets_assetdefinitions.id
-            LEFT JOIN glpi_locations ON glpi_locations.id = nobreak.locations_id 
-            WHERE nobreak.is_template = 0 and nobreak.is_deleted = 0 AND glpi_assets_assetdefinitions.system_name = 'nobreak'
-        ) AS all_assets
-        WHERE
-            all_assets.asset_type = %s
-        ORDER BY
-            all_assets.asset_name ASC
-    """
 
-    try:
+    if asset_type not in ASSET_TYPES:
+        return []
 
-        params = (asset_type,)
-        assets = db_glpi.fetch_query(sql, params)
-    
-        print(f"[DEBUG] Query executada com sucesso. Itens encontrados: {len(assets)}")
-        
-        if len(assets) > 0:
-            print(f"[DEBUG] Exemplo de ativo: {assets[0]}")
-            
-        return assets
+    offset = None
+    if page is not None:
+        limit = min(max(int(page_size or ASSET_PAGE_SIZE_DEFAULT), 1), ASSET_PAGE_SIZE_MAX)
+        offset = (max(int(page), 1) - 1) * limit
+    elif limit is not None:
+        limit = max(int(limit), 1)
 
+    sql, params = build_assets_query(asset_type, search=search, after=after, limit=limit, offset=offset)
+    try:
+        return db_glpi.fetch_query(sql, params)
     except Exception as e:
-        # --- DEBUGGING ---
-        # Se a query falhar (ex: tabela não existe, permissão negada na tabela)
-        # o erro aparecerá aqui no console do Django.
-        print(f"[DEBUG] ERRO CRÍTICO AO EXECUTAR A QUERY: {e}")
+        logger.error("Erro ao buscar ativos do tipo '%s' para impressão: %s", asset_type, e)
         return []
 
 
+def stream_assets_for_printing(asset_type: str, search: str = None, after=None):
+    """
+    Gerador com os mesmos ativos de get_assets_for_printing(), lidos do
+    MySQL aos poucos (cursor do lado do servidor) para respostas em streaming.
+    """
+    if not db_glpi or asset_type not in ASSET_TYPES:
+        return iter(())
+    sql, params = build_assets_query(asset_type, search=search, after=after)
+    return db_glpi.stream_query(sql, params)
+
+
+def count_assets_for_printing(asset_type: str, search: str = None):
+    """
+    Total de ativos de um tipo (com o mesmo filtro de get_assets_for_printing),
+    usado para a paginação.
+    """
+    fingerprint = get_assets_fingerprint(asset_type, search=search)
+    return fingerprint['total'] if fingerprint else 0
+
+
+def get_assets_fingerprint(asset_type: str, search: str = None):
+    """
+    Resumo barato da listagem de um tipo de ativo (total, maior id e última
+    alteração), usado para montar o ETag da API de ativos: se nada disso
+    mudou, o cliente pode reaproveitar a resposta que já tem. Inclui a
+    última alteração da entidade/localização (tabela do JOIN), cujo nome
+    aparece na listagem e na busca.
+    """
+    if not db_glpi or asset_type not in ASSET_TYPES:
+        return None
+
+    _, source, entity_column, _, source_params = _build_asset_query(asset_type)
+    search_sql, search_params = _asset_search_clause(entity_column, search)
+    # 'e.name' -> 'e.date_mod' (glpi_entities) / 'l.name' -> 'l.date_mod' (glpi_locations)
+    joined_date_mod = entity_column.split('.')[0] + '.date_mod'
+    try:
+        return db_glpi.fetch_query(
+            f"SELECT COUNT(*) AS total, MAX(a.id) AS max_id, MAX(a.date_mod) AS max_date_mod, "
+            f"MAX({joined_date_mod}) AS max_joined_date_mod {source} {search_sql}",
+            tuple(source_params + search_params),
+            one=True,
+        )
+    except Exception as e:
+        logger.error("Erro ao calcular o resumo dos ativos do tipo '%s': %s", asset_type, e)
+        return None
+
+
 def tickets_resolved_today():
     
     if not db_glpi:
@@ -265,6 +456,7 @@ def get_equipamentos_para_baixa():
     return db_glpi.fetch_query(sql)
 
 
+@glpi_cached(ttl=600, stale_ttl=1800)
 def get_fornecedores_glpi():
     """
     Busca os fornecedores do GLPI
@@ -303,52 +495,133 @@ def get_chamados_reparo_pendentes_sql():
     return db_glpi.fetch_query(sql)
 
 
-def get_category_parent_id(category_id: int):
+# Tabela de cada tipo de item com o campo states_id. Tipos fora desta lista
+# seguem a convenção do GLPI (glpi_<tipo>s), desde que a tabela exista e
+# tenha states_id (ver _tables_with_state); os ativos customizados
+# (Glpi\CustomAsset\...) ficam todos em glpi_assets_assets.
+ITEM_STATE_TABLES = {
+    'Computer': 'glpi_computers',
+    'Monitor': 'glpi_monitors',
+    'Printer': 'glpi_printers',
+    'Phone': 'glpi_phones',
+    'NetworkEquipment': 'glpi_networkequipments',
+    'Peripheral': 'glpi_peripherals',
+    'Rack': 'glpi_racks',
+    'Enclosure': 'glpi_enclosures',
+    'PDU': 'glpi_pdus',
+    'PassiveDCEquipment': 'glpi_passivedcequipments',
+    'Appliance': 'glpi_appliances',
+    'Cluster': 'glpi_clusters',
+    'Certificate': 'glpi_certificates',
+    'Cable': 'glpi_cables',
+}
+
+# Tipos sem states_id (ex: Consumableitem): o estado não é lido
+ITEMTYPES_WITHOUT_STATE = {'consumableitem', 'cartridgeitem', 'software'}
+
+# Tabelas do banco do GLPI com a coluna states_id (lidas uma vez por processo)
+_state_tables = None
+_state_tables_lock = threading.Lock()
+
+
+def _tables_with_state():
+    global _state_tables
+    if _state_tables is None:
+        with _state_tables_lock:
+            if _state_tables is None:
+                rows = db_glpi.fetch_query("""
+                    SELECT c.TABLE_NAME AS table_name
+                    FROM information_schema.COLUMNS c
+                    WHERE c.TABLE_SCHEMA = DATABASE() AND c.COLUMN_NAME = 'states_id'
+                """)
+                _state_tables = {row['table_name'] for row in rows}
+    return _state_tables
+
+
+def _item_state_table(itemtype):
     """
-    Busca o ID da categoria pai (itilcategories_id) de uma determinada categoria.
-    Retorna o ID pai (int), ou 0 se for a raiz.
+    Tabela com o states_id do tipo, ou None. Tabelas deduzidas do nome do
+    tipo só valem se existirem com states_id: uma tabela inválida faria a
+    query de todos os itens falhar.
     """
-    if not db_glpi:
-        print("[DEBUG] FALHA (get_category_parent_id): db_glpi não está inicializado.")
-        return None  # Retorna None para parar o loop na view
+    if itemtype.lower() in ITEMTYPES_WITHOUT_STATE:
+        return None
+    if itemtype.startswith('Glpi\\CustomAsset\\'):
+        return 'glpi_assets_assets'
+    for known, table in ITEM_STATE_TABLES.items():
+        if known.lower() == itemtype.lower():
+            return table
+    if itemtype.isalnum():
+        table = f"glpi_{itemtype.lower()}s"
+        try:
+            if table in _tables_with_state():
+                return table
+        except Exception as e:
+            logger.warning("Não foi possível consultar as tabelas com states_id: %s", e)
+    return None
+
+
+def _states_select(itemtype, table, ids):
+    placeholders = ", ".join(["%s"] * len(ids))
+    return (
+        table,
+        f"SELECT %s AS itemtype, t.id, t.states_id FROM {table} t WHERE t.id IN ({placeholders})",
+        [itemtype] + ids,
+    )
+
+
+def get_items_states(items):
+    """
+    Lê o states_id atual de vários itens em uma única query.
 
-    sql = """
-    SELECT ic.itilcategories_id FROM glpi_itilcategories ic WHERE ic.id = %s
+    'items' é uma lista de (itemtype, id). Retorna {(itemtype, id): states_id}
+    apenas para os itens encontrados; tipos desconhecidos ou sem estado
+    ficam de fora (o chamador deve considerá-los como "estado desconhecido").
+    Se a query única falhar, cada tabela é lida separadamente, para que um
+    tipo com problema não deixe os outros sem estado.
     """
-    params = (category_id,)
+    if not db_glpi or not items:
+        return {}
 
-    try:
-        # 'results' será uma lista, ex: [{'itilcategories_id': 140}] ou [(140,)]
-        results = db_glpi.fetch_query(sql, params)
-
-        # 1. Verifica se a query retornou algo
-        if results:
-            # 2. Pega a primeira linha (deve ser a única)
-            first_row = results[0]
-            
-            # 3. Extrai o valor
-            parent_id = 0 # Padrão
-            
-            # Se sua fetch_query retorna dicionários (ex: [{'itilcategories_id': 140}])
-            if isinstance(first_row, dict):
-                parent_id = first_row.get('itilcategories_id')
-            # Se sua fetch_query retorna tuplas (ex: [(140,)])
-            else:
-                parent_id = first_row[0]
-            
-            # Se o ID pai for None (é a raiz), retorna 0
-            if parent_id is None:
-                return 0
-                
-            return int(parent_id)  # Retorna o NÚMERO (ex: 140)
-        else:
-            # Categoria não foi encontrada
-            print(f"[DEBUG] Categoria ID {category_id} não encontrada no banco.")
-            return None # Para o loop
+    by_table = {}
+    for itemtype, item_id in items:
+        table = _item_state_table(itemtype)
+        if table:
+            by_table.setdefault((itemtype, table), []).append(int(item_id))
 
+    if not by_table:
+        return {}
+
+    selects = [_states_select(itemtype, table, ids) for (itemtype, table), ids in by_table.items()]
+    try:
+        rows = db_glpi.fetch_query(
+            " UNION ALL ".join(sql for _, sql, _ in selects),
+            tuple(param for _, _, params in selects for param in params),
+        )
     except Exception as e:
-        print(f"[DEBUG] ERRO CRÍTICO AO EXECUTAR 'get_category_parent_id': {e}")
-        return None  # Retorna None para parar o loop
+        if len(selects) == 1:
+            raise
+        logger.warning("Falha ao ler o estado dos itens em uma query (%s); lendo por tabela.", e)
+        rows = []
+        for table, sql, params in selects:
+            try:
+                rows.extend(db_glpi.fetch_query(sql, tuple(params)))
+            except Exception as table_error:
+                logger.warning("Falha ao ler o estado dos itens de %s: %s", table, table_error)
+    return {(row['itemtype'], int(row['id'])): row['states_id'] for row in rows}
+
+
+def get_all_category_parents():
+    """
+    Retorna {id_categoria: id_pai} de todas as categorias ITIL em uma única
+    query (0 para as categorias raiz). Usado pela árvore em memória
+    de apps.dbcom.rules.
+    """
+    if not db_glpi:
+        return None
+
+    rows = db_glpi.fetch_query("SELECT ic.id, ic.itilcategories_id FROM glpi_itilcategories ic")
+    return {int(row['id']): int(row['itilcategories_id'] or 0) for row in rows}
 
 
 def newpanel_dashboard_ticketcounter():
@@ -370,6 +643,7 @@ def newpanel_dashboard_ticketcounter():
     return db_glpi.fetch_query(sql)
 
 
+@glpi_cached(ttl=300, stale_ttl=900)
 def newpanel_dashboard_responsetimeavg():
     if not db_glpi:
         return []
@@ -390,6 +664,7 @@ def newpanel_dashboard_responsetimeavg():
     return db_glpi.fetch_query(sql)
 
 
+@glpi_cached(ttl=300, stale_ttl=900)
 def newpanel_dashboard_clientsatisfactionpercent():
     if not db_glpi:
         return []
@@ -411,11 +686,11 @@ def newpanel_dashboard_clientsatisfactionpercent():
     return db_glpi.fetch_query(sql)
 
 
-def newpanel_dashboard_departmentteam():
-    if not db_glpi:
-        return []
-    
-    sql="""
+# Equipe do departamento com contadores por usuário.
+# Cada contador é pré-agregado uma única vez (GROUP BY por usuário) e
+# juntado à lista da equipe, em vez de subqueries correlacionadas por linha.
+# (Comparação com a versão antiga: manage.py benchmark_departmentteam)
+DEPARTMENTTEAM_SQL = """
     SELECT 
     U.firstname AS nome_completo,
     U.name AS login,
@@ -424,65 +699,73 @@ def newpanel_dashboard_departmentteam():
         WHEN G.name LIKE '%Técnicos%' THEN 'Técnicos'
         ELSE G.name 
     END AS grupo_perfil,
-    (SELECT COUNT(DISTINCT TU.tickets_id)
-     FROM glpi_tickets_users TU
-     INNER JOIN glpi_tickets T ON TU.tickets_id = T.id
-     WHERE TU.users_id = U.id 
-       AND TU.type = 2
-       AND T.is_deleted = 0
-    ) AS qtd_tickets_atribuidos,
-    (SELECT COUNT(P.id)
-     FROM glpi_projects P
-     WHERE P.is_deleted = 0
-       AND (
-           EXISTS (
-               SELECT 1 
-               FROM glpi_projectteams PT 
-               WHERE PT.projects_id = P.id 
-                 AND PT.itemtype = 'User' 
-                 AND PT.items_id = U.id
-           )
-           OR 
-           EXISTS (
-               SELECT 1 
-               FROM glpi_projecttasks PTASK
-               INNER JOIN glpi_projecttaskteams PTT ON PTASK.id = PTT.projecttasks_id
-               WHERE PTASK.projects_id = P.id 
-                 AND PTT.itemtype = 'User' 
-                 AND PTT.items_id = U.id
-           )
-       )
-    ) AS qtd_projetos_relacionados,
-    (
-        IFNULL((SELECT COUNT(id) 
-                FROM glpi_tickettasks 
-                WHERE users_id_tech = U.id 
-                  AND state = 0), 0) 
-        + 
-        IFNULL((SELECT COUNT(PTT.id) 
-                FROM glpi_projecttaskteams PTT
-                INNER JOIN glpi_projecttasks PTASK ON PTT.projecttasks_id = PTASK.id
-                INNER JOIN glpi_projects PROJ ON PTASK.projects_id = PROJ.id
-                WHERE PTT.itemtype = 'User' 
-                  AND PTT.items_id = U.id
-                  AND PROJ.projectstates_id != 3
-               ), 0)
-    ) AS qtd_total_tarefas
+    IFNULL(TICKETS.qtd, 0) AS qtd_tickets_atribuidos,
+    IFNULL(PROJETOS.qtd, 0) AS qtd_projetos_relacionados,
+    (IFNULL(TAREFAS_TICKET.qtd, 0) + IFNULL(TAREFAS_PROJETO.qtd, 0)) AS qtd_total_tarefas
     FROM 
         glpi_users U
     INNER JOIN 
         glpi_groups_users GU ON U.id = GU.users_id
     INNER JOIN 
         glpi_groups G ON GU.groups_id = G.id
+    -- Chamados atribuídos (técnico) não excluídos
+    LEFT JOIN (
+        SELECT TU.users_id, COUNT(DISTINCT TU.tickets_id) AS qtd
+        FROM glpi_tickets_users TU
+        INNER JOIN glpi_tickets T ON TU.tickets_id = T.id
+        WHERE TU.type = 2
+          AND T.is_deleted = 0
+        GROUP BY TU.users_id
+    ) TICKETS ON TICKETS.users_id = U.id
+    -- Projetos em que o usuário está na equipe do projeto OU de alguma tarefa
+    LEFT JOIN (
+        SELECT REL.users_id, COUNT(DISTINCT REL.projects_id) AS qtd
+        FROM (
+            SELECT PT.items_id AS users_id, PT.projects_id
+            FROM glpi_projectteams PT
+            WHERE PT.itemtype = 'User'
+            UNION
+            SELECT PTT.items_id AS users_id, PTASK.projects_id
+            FROM glpi_projecttaskteams PTT
+            INNER JOIN glpi_projecttasks PTASK ON PTASK.id = PTT.projecttasks_id
+            WHERE PTT.itemtype = 'User'
+        ) REL
+        INNER JOIN glpi_projects P ON P.id = REL.projects_id
+        WHERE P.is_deleted = 0
+        GROUP BY REL.users_id
+    ) PROJETOS ON PROJETOS.users_id = U.id
+    -- Tarefas de chamado abertas
+    LEFT JOIN (
+        SELECT users_id_tech AS users_id, COUNT(id) AS qtd
+        FROM glpi_tickettasks
+        WHERE state = 0
+        GROUP BY users_id_tech
+    ) TAREFAS_TICKET ON TAREFAS_TICKET.users_id = U.id
+    -- Tarefas de projeto em projetos não concluídos
+    LEFT JOIN (
+        SELECT PTT.items_id AS users_id, COUNT(PTT.id) AS qtd
+        FROM glpi_projecttaskteams PTT
+        INNER JOIN glpi_projecttasks PTASK ON PTT.projecttasks_id = PTASK.id
+        INNER JOIN glpi_projects PROJ ON PTASK.projects_id = PROJ.id
+        WHERE PTT.itemtype = 'User'
+          AND PROJ.projectstates_id != 3
+        GROUP BY PTT.items_id
+    ) TAREFAS_PROJETO ON TAREFAS_PROJETO.users_id = U.id
     WHERE 
         U.is_deleted = 0 
         AND U.is_active = 1
         AND (G.name LIKE '%Analistas%' OR G.name LIKE '%Técnicos%')
     ORDER BY 
     grupo_perfil, nome_completo;
-    """
+"""
+
+
+@glpi_cached(ttl=60, stale_ttl=120)
+def newpanel_dashboard_departmentteam():
+    if not db_glpi:
+        return []
     
-    return db_glpi.fetch_query(sql)
+    return db_glpi.fetch_query(DEPARTMENTTEAM_SQL)
 
 
 def newpanel_projects_data():
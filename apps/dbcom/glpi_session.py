@@ -0,0 +1,208 @@
+import time
+import atexit
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+# Configuração padrão (pode ser sobrescrita em settings.GLPI_API)
+GLPI_API_DEFAULTS = {
+    'MAX_CONCURRENCY': 8,    # Atualizações de itens em paralelo (no processo todo)
+    'CONNECT_TIMEOUT': 5,    # Segundos
+    'READ_TIMEOUT': 30,
+    'SESSION_MAX_IDLE': 900,  # Renova a sessão após este tempo sem uso (s)
+}
+
+
+def get_glpi_api_settings():
+    api_settings = dict(GLPI_API_DEFAULTS)
+    api_settings.update(getattr(settings, 'GLPI_API', {}) or {})
+    return api_settings
+
+
+def get_glpi_timeout():
+    api_settings = get_glpi_api_settings()
+    return (api_settings['CONNECT_TIMEOUT'], api_settings['READ_TIMEOUT'])
+
+
+class GLPISessionError(Exception):
+    """ Falha ao iniciar a sessão na API legada do GLPI. """
+
+
+class GLPISessionManager:
+    """
+    Sessão única (por processo) na API legada (v1) do GLPI.
+
+    Mantém um Session-Token vivo e o compartilha entre as threads, em vez
+    de fazer initSession/killSession a cada operação, e usa um
+    requests.Session (keep-alive, pool de conexões HTTP) para o host do GLPI.
+
+    O token é renovado quando o GLPI responde 401 (sessão expirada ou
+    invalidada) e, preventivamente, após 'SESSION_MAX_IDLE' segundos sem uso.
+    Trocar a URL ou os tokens no GLPIConfig também abre uma nova sessão.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()       # Estado do token e contadores (seções curtas, sem I/O)
+        self._init_lock = threading.Lock()  # Um initSession por vez
+        self._http_lock = threading.Lock()
+        self._http = None
+        self._token = None
+        self._config_key = None
+        self._last_used = 0.0
+        self.counters = {'init_sessions': 0, 'requests': 0, 'renewals_401': 0}
+
+    @property
+    def http(self):
+        if self._http is None:
+            with self._http_lock:
+                if self._http is None:
+                    http = requests.Session()
+                    # Conexões suficientes para as atualizações em paralelo
+                    adapter = HTTPAdapter(pool_maxsize=get_glpi_api_settings()['MAX_CONCURRENCY'] + 2)
+                    http.mount('https://', adapter)
+                    http.mount('http://', adapter)
+                    self._http = http
+        return self._http
+
+    @staticmethod
+    def _key(config):
+        return (config.glpi_api_url.rstrip('/'), config.glpi_app_token, config.glpi_user_token)
+
+    def _base_headers(self, config):
+        return {
+            "Content-Type": "application/json",
+            "App-Token": config.glpi_app_token,
+        }
+
+    def _init_session(self, config):
+        url = f"{config.glpi_api_url.rstrip('/')}/initSession"
+        headers = self._base_headers(config)
+        headers["Authorization"] = f"user_token {config.glpi_user_token}"
+        logger.info("Iniciando sessão (initSession) na API Legada...")
+        try:
+            response = self.http.get(url, headers=headers, timeout=get_glpi_timeout())
+            response.raise_for_status()
+            token = response.json().get('session_token')
+        except requests.exceptions.RequestException as e:
+            error_text = e.response.text if e.response is not None else str(e)
+            raise GLPISessionError(f"Falha no initSession: {error_text}") from e
+        if not token:
+            raise GLPISessionError("Resposta do initSession não continha 'session_token'.")
+        self._count('init_sessions')
+        logger.info("Sessão iniciada com sucesso. Token: ...%s", token[-5:])
+        return token
+
+    def _kill_session(self, config, token):
+        try:
+            self.http.get(
+                f"{config.glpi_api_url.rstrip('/')}/killSession",
+                headers=dict(self._base_headers(config), **{"Session-Token": token}),
+                timeout=get_glpi_timeout(),
+            )
+        except Exception as e:
+            logger.warning("Erro (não crítico) ao encerrar sessão: %s", e)
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _current_token(self, key, max_idle, stale_token):
+        """ Token atual, se ainda serve (chamar com self._lock). """
+        expired = time.monotonic() - self._last_used > max_idle
+        if (self._token is None or self._config_key != key or expired
+                or (stale_token is not None and stale_token == self._token)):
+            return None
+        self._last_used = time.monotonic()
+        return self._token
+
+    def get_token(self, config, stale_token=None):
+        """
+        Retorna o token da sessão atual, iniciando uma nova se necessário.
+        'stale_token' é o token que acabou de receber 401: só é renovado se
+        ainda for o atual (outra thread pode já tê-lo renovado).
+
+        O initSession (rede) roda fora de self._lock, só sob self._init_lock:
+        as threads que precisam de um token novo esperam a primeira a
+        iniciá-lo e reaproveitam o resultado.
+        """
+        key = self._key(config)
+        max_idle = get_glpi_api_settings()['SESSION_MAX_IDLE']
+        with self._lock:
+            token = self._current_token(key, max_idle, stale_token)
+        if token is not None:
+            return token
+
+        with self._init_lock:
+            with self._lock:
+                token = self._current_token(key, max_idle, stale_token)
+            if token is not None:
+                return token
+            token = self._init_session(config)
+            with self._lock:
+                previous_token, previous_key = self._token, self._config_key
+                self._token = token
+                self._config_key = key
+                self._last_used = time.monotonic()
+
+        # A sessão substituída (ociosa demais ou de outra configuração) é
+        # encerrada no GLPI, em vez de ficar aberta até expirar por lá
+        if previous_token and previous_token != token and previous_token != stale_token:
+            url, app_token, _ = previous_key
+            self._kill_session(_ConfigStub(url, app_token), previous_token)
+        return token
+
+    def request(self, config, method, url, **kwargs):
+        """
+        Requisição autenticada à API legada. Em caso de 401, renova a sessão
+        e repete a requisição uma vez. Levanta GLPISessionError se não for
+        possível obter um token.
+        """
+        kwargs.setdefault('timeout', get_glpi_timeout())
+        extra_headers = kwargs.pop('headers', None) or {}
+
+        token = self.get_token(config)
+        for attempt in range(2):
+            headers = dict(self._base_headers(config), **extra_headers)
+            headers["Session-Token"] = token
+            response = self.http.request(method, url, headers=headers, **kwargs)
+            self._count('requests')
+            if response.status_code != 401 or attempt == 1:
+                return response
+            self._count('renewals_401')
+            logger.warning("Sessão do GLPI expirada ou inválida (401). Renovando...")
+            token = self.get_token(config, stale_token=token)
+        return response
+
+    def close(self):
+        """ Encerra (killSession) a sessão atual, se houver. """
+        with self._lock:
+            token, key = self._token, self._config_key
+            self._token = None
+            self._config_key = None
+        if token and key:
+            url, app_token, _ = key
+            self._kill_session(_ConfigStub(url, app_token), token)
+
+    def stats(self):
+        with self._lock:
+            data = dict(self.counters)
+            data['active'] = self._token is not None
+            data['idle_seconds'] = round(time.monotonic() - self._last_used, 1) if self._token else None
+        return data
+
+
+class _ConfigStub:
+    """ O mínimo de GLPIConfig para o killSession no encerramento do processo. """
+    def __init__(self, glpi_api_url, glpi_app_token):
+        self.glpi_api_url = glpi_api_url
+        self.glpi_app_token = glpi_app_token
+
+
+# Instância única por processo
+glpi_sessions = GLPISessionManager()
+atexit.register(glpi_sessions.close)
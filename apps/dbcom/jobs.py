@@ -0,0 +1,213 @@
+import logging
+import threading
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from core.workers import WorkerPool, BOOT_ID, owner_alive_q, orphaned, adopt
+from .models import GLPIConfig, WebhookJob
+from .utils import change_glpi_items_status, get_state_change_stats
+from .glpi_session import glpi_sessions
+from .glpi_client import glpi_client
+
+
+logger = logging.getLogger(__name__)
+
+
+# Configuração padrão (pode ser sobrescrita em settings.WEBHOOK_JOBS)
+JOB_DEFAULTS = {
+    'WORKERS': 4,           # Jobs executando ao mesmo tempo
+    'MAX_ATTEMPTS': 5,      # Tentativas antes de marcar como 'failed'
+    'BACKOFF_BASE': 10,     # Espera (s) antes da 2ª tentativa; dobra a cada falha
+    'BACKOFF_MAX': 600,
+    'DEDUP_SECONDS': 60,    # Evento repetido dentro desta janela é ignorado
+    'STALE_RUNNING': 600,   # Job 'running' há mais tempo que isso é considerado perdido
+}
+
+
+def get_job_settings():
+    job_settings = dict(JOB_DEFAULTS)
+    job_settings.update(getattr(settings, 'WEBHOOK_JOBS', {}) or {})
+    return job_settings
+
+
+webhook_pool = WorkerPool('webhooks', max_workers=get_job_settings()['WORKERS'])
+
+# Jobs do mesmo chamado nunca rodam em paralelo (o último evento deve
+# prevalecer). Locks "listrados" por ticket_id evitam um dicionário sem fim.
+_ticket_locks = [threading.Lock() for _ in range(64)]
+
+
+def backoff_seconds(attempts):
+    job_settings = get_job_settings()
+    return min(job_settings['BACKOFF_BASE'] * 2 ** max(attempts - 1, 0), job_settings['BACKOFF_MAX'])
+
+
+def _submit(job, delay=0):
+    webhook_pool.submit(run_webhook_job, job.pk, delay=delay)
+
+
+def enqueue_webhook_job(webhook, rule, ticket_id, ticket_status_id, action, target_status_id):
+    """
+    Grava o job e o envia ao pool. Se o último job do mesmo chamado já leva
+    o ativo ao mesmo status (ainda pendente ou concluído há pouco), o evento
+    é considerado repetido e nenhum job novo é criado.
+
+    Um job pendente cujo processo morreu não conta como repetido: o evento
+    gera um job novo, que torna o órfão obsoleto.
+
+    Retorna (job, criado).
+    """
+    latest = WebhookJob.objects.filter(ticket_id=ticket_id).order_by('-pk').first()
+    if latest and latest.target_status_id == target_status_id and latest.action == action:
+        window_start = timezone.now() - timedelta(seconds=get_job_settings()['DEDUP_SECONDS'])
+        if (latest.status in WebhookJob.ACTIVE_STATUSES
+                and WebhookJob.objects.filter(owner_alive_q(), pk=latest.pk).exists()) or (
+            latest.status == WebhookJob.STATUS_SUCCESS and latest.finished_at and latest.finished_at >= window_start
+        ):
+            return latest, False
+
+    job = WebhookJob.objects.create(
+        webhook=webhook,
+        rule=rule,
+        ticket_id=ticket_id,
+        ticket_status_id=ticket_status_id,
+        action=action,
+        target_status_id=target_status_id,
+        boot_id=BOOT_ID,
+        heartbeat_at=timezone.now(),
+    )
+    _submit(job)
+    return job, True
+
+
+def _finish(job, status, error=''):
+    job.status = status
+    job.last_error = error
+    job.finished_at = timezone.now()
+    job.next_attempt_at = None
+    job.save(update_fields=['status', 'last_error', 'finished_at', 'next_attempt_at'])
+
+
+def run_webhook_job(job_id):
+    """
+    Executa um job (chamado pelo pool). Só roda se conseguir "reservar" o
+    job (status queued/retry -> running), o que impede execução dupla
+    quando mais de um processo recupera os mesmos jobs.
+    """
+    claimed = WebhookJob.objects.filter(
+        pk=job_id, status__in=(WebhookJob.STATUS_QUEUED, WebhookJob.STATUS_RETRY)
+    ).update(
+        status=WebhookJob.STATUS_RUNNING, started_at=timezone.now(), attempts=F('attempts') + 1,
+        boot_id=BOOT_ID, heartbeat_at=timezone.now(),
+    )
+    if not claimed:
+        return
+
+    job = WebhookJob.objects.get(pk=job_id)
+    with _ticket_locks[job.ticket_id % len(_ticket_locks)]:
+        # Um evento mais novo do mesmo chamado torna este obsoleto
+        if WebhookJob.objects.filter(ticket_id=job.ticket_id, pk__gt=job.pk).exists():
+            _finish(job, WebhookJob.STATUS_SUPERSEDED)
+            return
+
+        try:
+            config = GLPIConfig.objects.get(pk=1)
+            errors = change_glpi_items_status(
+                ticket_id=job.ticket_id,
+                new_status_id=job.target_status_id,
+                config=config
+            ).errors
+        except Exception as e:
+            errors = [f"Erro inesperado: {e}"]
+
+    if not errors:
+        logger.info("[Ticket %s] Job %s concluído (tentativa %s).", job.ticket_id, job.pk, job.attempts)
+        _finish(job, WebhookJob.STATUS_SUCCESS)
+        return
+
+    error = "\n".join(str(e) for e in errors)
+    if job.attempts >= get_job_settings()['MAX_ATTEMPTS']:
+        logger.error("[Ticket %s] Job %s falhou após %s tentativas: %s", job.ticket_id, job.pk, job.attempts, errors[0])
+        _finish(job, WebhookJob.STATUS_FAILED, error)
+        return
+
+    delay = backoff_seconds(job.attempts)
+    logger.warning("[Ticket %s] Job %s falhou (tentativa %s). Nova tentativa em %ss.", job.ticket_id, job.pk, job.attempts, delay)
+    job.status = WebhookJob.STATUS_RETRY
+    job.last_error = error
+    job.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+    job.save(update_fields=['status', 'last_error', 'next_attempt_at'])
+    _submit(job, delay=delay)
+
+
+def requeue_jobs(queryset):
+    """
+    Recoloca jobs na fila imediatamente (ação do admin). Jobs em execução
+    são ignorados. Retorna quantos foram reenfileirados.
+    """
+    count = 0
+    for job in queryset.exclude(status=WebhookJob.STATUS_RUNNING):
+        job.status = WebhookJob.STATUS_QUEUED
+        job.next_attempt_at = None
+        job.finished_at = None
+        job.boot_id = BOOT_ID
+        job.heartbeat_at = timezone.now()
+        job.save(update_fields=['status', 'next_attempt_at', 'finished_at', 'boot_id', 'heartbeat_at'])
+        _submit(job)
+        count += 1
+    return count
+
+
+def recover_pending_jobs():
+    """
+    Assume e reenvia ao pool os jobs órfãos: pendentes de um processo que
+    morreu ou reiniciou (sem heartbeat recente) e os presos em 'running'
+    há mais de STALE_RUNNING. Executada periodicamente pelo
+    core.workers.job_sweeper, inclusive ao iniciar o processo.
+    """
+    now = timezone.now()
+    stale_before = now - timedelta(seconds=get_job_settings()['STALE_RUNNING'])
+    WebhookJob.objects.filter(
+        status=WebhookJob.STATUS_RUNNING, started_at__lt=stale_before
+    ).update(status=WebhookJob.STATUS_RETRY, next_attempt_at=now, boot_id='', heartbeat_at=None)
+
+    count = 0
+    pending = orphaned(WebhookJob.objects.filter(status__in=WebhookJob.ACTIVE_STATUSES))
+    for job in pending.only('pk', 'status', 'next_attempt_at'):
+        if job.status == WebhookJob.STATUS_RUNNING:
+            # O processo morreu durante a execução: tenta de novo
+            changes = {'status': WebhookJob.STATUS_RETRY, 'next_attempt_at': now}
+            delay = 0
+        else:
+            changes = {}
+            delay = (job.next_attempt_at - now).total_seconds() if job.next_attempt_at else 0
+        if adopt(WebhookJob.objects.filter(status=job.status), job.pk, **changes):
+            _submit(job, delay=max(delay, 0))
+            count += 1
+    return count
+
+
+def get_job_stats():
+    """
+    Quantidade de jobs por status e latência média (recebimento -> fim)
+    dos concluídos na última hora.
+    """
+    since = timezone.now() - timedelta(hours=1)
+    finished = WebhookJob.objects.filter(status=WebhookJob.STATUS_SUCCESS, finished_at__gte=since)
+    latencies = [job.total_latency.total_seconds() for job in finished.only('created_at', 'finished_at')]
+    return {
+        'by_status': {
+            status: WebhookJob.objects.filter(status=status).count()
+            for status, _ in WebhookJob.STATUS_CHOICES
+        },
+        'last_hour': {
+            'completed': len(latencies),
+            'avg_latency_seconds': round(sum(latencies) / len(latencies), 2) if latencies else None,
+            'max_latency_seconds': round(max(latencies), 2) if latencies else None,
+        },
+        'pool': webhook_pool.stats(),
+        'glpi_session': glpi_sessions.stats(),
+        'glpi_client': glpi_client.stats(),
+        'state_changes': get_state_change_stats(),
+    }
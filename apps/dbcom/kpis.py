@@ -0,0 +1,142 @@
+import time
+import logging
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from .glpi_queries import (
+    newpanel_dashboard_ticketcounter,
+    newpanel_dashboard_responsetimeavg,
+    tickets_resolved_today,
+    newpanel_dashboard_clientsatisfactionpercent,
+    newpanel_dashboard_departmentteam,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+# Cada KPI do dashboard e a query que o alimenta.
+# As queries rodam em paralelo, cada uma em uma conexão do pool do GLPI.
+KPI_QUERIES = {
+    'ticket_counter': newpanel_dashboard_ticketcounter,
+    'response_time': newpanel_dashboard_responsetimeavg,
+    'resolved_today': tickets_resolved_today,
+    'satisfaction': newpanel_dashboard_clientsatisfactionpercent,
+    'team': newpanel_dashboard_departmentteam,
+}
+
+# Não passa do tamanho padrão do pool (settings.EXTERNAL_DB_POOL['max_size'])
+_executor = ThreadPoolExecutor(max_workers=len(KPI_QUERIES), thread_name_prefix='glpi-kpi')
+
+
+def _first_row(rows):
+    return rows[0] if rows and rows[0] else None
+
+
+def _str_or_none(row):
+    return {k: str(v) if v is not None else None for k, v in row.items()}
+
+
+@dataclass(frozen=True)
+class DashboardKpiSnapshot:
+    """
+    Resultado consolidado dos KPIs do dashboard, com o tempo (ms) gasto
+    em cada query e os erros das queries que falharam.
+    """
+    ticket_counter: dict
+    response_time: dict
+    resolved_today: int
+    satisfaction: dict
+    team_members: list
+    timings_ms: dict = field(default_factory=dict)
+    errors: dict = field(default_factory=dict)
+    total_ms: float = 0.0
+
+    @property
+    def slowest(self):
+        """ Nome do KPI mais lento desta coleta (ou None). """
+        if not self.timings_ms:
+            return None
+        return max(self.timings_ms, key=self.timings_ms.get)
+
+    def as_payload(self):
+        """
+        Dicionário no formato que o frontend espera em 'dashboard_update.kpis'.
+        """
+        kpis = dict(self.ticket_counter)
+        kpis.update(self.response_time)
+        kpis['resolved_today'] = self.resolved_today
+        kpis.update(self.satisfaction)
+        kpis['team_members'] = self.team_members
+        kpis['timings_ms'] = self.timings_ms
+        return kpis
+
+
+def _timed(name, query):
+    started = time.perf_counter()
+    try:
+        return name, query(), None, (time.perf_counter() - started) * 1000
+    except Exception as e:
+        return name, None, e, (time.perf_counter() - started) * 1000
+
+
+def collect_dashboard_kpis():
+    """
+    Executa as queries de KPI do dashboard em paralelo e retorna um
+    DashboardKpiSnapshot. Uma query com erro não derruba as demais:
+    o KPI correspondente recebe os valores padrão.
+    """
+    started = time.perf_counter()
+    futures = [_executor.submit(_timed, name, query) for name, query in KPI_QUERIES.items()]
+
+    results = {}
+    timings_ms = {}
+    errors = {}
+    for future in futures:
+        name, rows, error, elapsed_ms = future.result()
+        timings_ms[name] = round(elapsed_ms, 2)
+        if error is not None:
+            logger.error("Erro ao buscar o KPI '%s': %s", name, error)
+            errors[name] = str(error)
+        results[name] = rows
+
+    counter_row = _first_row(results['ticket_counter'])
+    ticket_counter = counter_row or {
+        'total_hoje': 0,
+        'total_ontem': 0,
+        'diferenca': 0
+    }
+
+    # Convert decimal values to string for JSON serialization
+    rt_row = _first_row(results['response_time'])
+    response_time = _str_or_none(rt_row) if rt_row else {
+        'solucao_mes_atual': None,
+        'solucao_mes_passado': None,
+        'diferenca_segundos': None
+    }
+
+    resolved_rows = results['resolved_today']
+    resolved_today = resolved_rows[0].get('Solved_today', 0) if resolved_rows else 0
+
+    satisfaction_row = _first_row(results['satisfaction'])
+    satisfaction = _str_or_none(satisfaction_row) if satisfaction_row else {
+        'porcentagem_satisfacao': '0.00',
+        'qtd_pesquisas_respondidas': 0
+    }
+
+    # Explicitly convert Decimal to string for each member in the list
+    team_members = [
+        {k: str(v) if isinstance(v, Decimal) else v for k, v in member.items()}
+        for member in (results['team'] or [])
+    ]
+
+    return DashboardKpiSnapshot(
+        ticket_counter=ticket_counter,
+        response_time=response_time,
+        resolved_today=resolved_today,
+        satisfaction=satisfaction,
+        team_members=team_members,
+        timings_ms=timings_ms,
+        errors=errors,
+        total_ms=round((time.perf_counter() - started) * 1000, 2),
+    )
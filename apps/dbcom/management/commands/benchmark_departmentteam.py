@@ -0,0 +1,247 @@
+import time
+import random
+from django.core.management.base import BaseCommand, CommandError
+from apps.dbcom.db_manager import Database
+from apps.dbcom.glpi_queries import DEPARTMENTTEAM_SQL
+
+
+# Versão anterior de newpanel_dashboard_departmentteam (subqueries
+# correlacionadas por usuário), mantida aqui apenas para comparação.
+DEPARTMENTTEAM_SQL_CORRELATED = """
+    SELECT 
+    U.firstname AS nome_completo,
+    U.name AS login,
+    CASE 
+        WHEN G.name LIKE '%Analistas%' THEN 'Analistas'
+        WHEN G.name LIKE '%Técnicos%' THEN 'Técnicos'
+        ELSE G.name 
+    END AS grupo_perfil,
+    (SELECT COUNT(DISTINCT TU.tickets_id)
+     FROM glpi_tickets_users TU
+     INNER JOIN glpi_tickets T ON TU.tickets_id = T.id
+     WHERE TU.users_id = U.id 
+       AND TU.type = 2
+       AND T.is_deleted = 0
+    ) AS qtd_tickets_atribuidos,
+    (SELECT COUNT(P.id)
+     FROM glpi_projects P
+     WHERE P.is_deleted = 0
+       AND (
+           EXISTS (
+               SELECT 1 
+               FROM glpi_projectteams PT 
+               WHERE PT.projects_id = P.id 
+                 AND PT.itemtype = 'User' 
+                 AND PT.items_id = U.id
+           )
+           OR 
+           EXISTS (
+               SELECT 1 
+               FROM glpi_projecttasks PTASK
+               INNER JOIN glpi_projecttaskteams PTT ON PTASK.id = PTT.projecttasks_id
+               WHERE PTASK.projects_id = P.id 
+                 AND PTT.itemtype = 'User' 
+                 AND PTT.items_id = U.id
+           )
+       )
+    ) AS qtd_projetos_relacionados,
+    (
+        IFNULL((SELECT COUNT(id) 
+                FROM glpi_tickettasks 
+                WHERE users_id_tech = U.id 
+                  AND state = 0), 0) 
+        + 
+        IFNULL((SELECT COUNT(PTT.id) 
+                FROM glpi_projecttaskteams PTT
+                INNER JOIN glpi_projecttasks PTASK ON PTT.projecttasks_id = PTASK.id
+                INNER JOIN glpi_projects PROJ ON PTASK.projects_id = PROJ.id
+                WHERE PTT.itemtype = 'User' 
+                  AND PTT.items_id = U.id
+                  AND PROJ.projectstates_id != 3
+               ), 0)
+    ) AS qtd_total_tarefas
+    FROM 
+        glpi_users U
+    INNER JOIN 
+        glpi_groups_users GU ON U.id = GU.users_id
+    INNER JOIN 
+        glpi_groups G ON GU.groups_id = G.id
+    WHERE 
+        U.is_deleted = 0 
+        AND U.is_active = 1
+        AND (G.name LIKE '%Analistas%' OR G.name LIKE '%Técnicos%')
+    ORDER BY 
+    grupo_perfil, nome_completo;
+"""
+
+# Esquema mínimo (apenas as colunas e índices usados pelas duas queries,
+# com os mesmos índices do GLPI)
+SCHEMA = [
+    """CREATE TABLE glpi_users (
+        id INT PRIMARY KEY, name VARCHAR(255), firstname VARCHAR(255),
+        is_deleted TINYINT NOT NULL DEFAULT 0, is_active TINYINT NOT NULL DEFAULT 1
+    )""",
+    """CREATE TABLE glpi_groups (id INT PRIMARY KEY, name VARCHAR(255))""",
+    """CREATE TABLE glpi_groups_users (
+        id INT AUTO_INCREMENT PRIMARY KEY, users_id INT, groups_id INT,
+        KEY users_id (users_id), KEY groups_id (groups_id)
+    )""",
+    """CREATE TABLE glpi_tickets (
+        id INT PRIMARY KEY, is_deleted TINYINT NOT NULL DEFAULT 0
+    )""",
+    """CREATE TABLE glpi_tickets_users (
+        id INT AUTO_INCREMENT PRIMARY KEY, tickets_id INT, users_id INT, type INT,
+        UNIQUE KEY unicity (tickets_id, type, users_id), KEY user (users_id, type)
+    )""",
+    """CREATE TABLE glpi_tickettasks (
+        id INT AUTO_INCREMENT PRIMARY KEY, tickets_id INT, users_id_tech INT, state INT,
+        KEY users_id_tech (users_id_tech), KEY state (state)
+    )""",
+    """CREATE TABLE glpi_projects (
+        id INT PRIMARY KEY, is_deleted TINYINT NOT NULL DEFAULT 0, projectstates_id INT,
+        KEY projectstates_id (projectstates_id)
+    )""",
+    """CREATE TABLE glpi_projectteams (
+        id INT AUTO_INCREMENT PRIMARY KEY, projects_id INT, itemtype VARCHAR(100), items_id INT,
+        UNIQUE KEY unicity (projects_id, itemtype, items_id), KEY item (itemtype, items_id)
+    )""",
+    """CREATE TABLE glpi_projecttasks (
+        id INT PRIMARY KEY, projects_id INT, KEY projects_id (projects_id)
+    )""",
+    """CREATE TABLE glpi_projecttaskteams (
+        id INT AUTO_INCREMENT PRIMARY KEY, projecttasks_id INT, itemtype VARCHAR(100), items_id INT,
+        UNIQUE KEY unicity (projecttasks_id, itemtype, items_id), KEY item (itemtype, items_id)
+    )""",
+]
+
+TABLES = [
+    'glpi_users', 'glpi_groups', 'glpi_groups_users', 'glpi_tickets', 'glpi_tickets_users',
+    'glpi_tickettasks', 'glpi_projects', 'glpi_projectteams', 'glpi_projecttasks', 'glpi_projecttaskteams',
+]
+
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara o tempo da query da equipe do dashboard (newpanel_dashboard_departmentteam) "
+        "na versão atual (agregações com GROUP BY) e na versão antiga (subqueries correlacionadas), "
+        "sobre uma massa de dados sintética do GLPI criada em um banco de TESTE."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('conexao', help="Nome da ExternalDbConfig de um banco de TESTE (nunca o GLPI real).")
+        parser.add_argument('--usuarios', type=int, default=300)
+        parser.add_argument('--tecnicos', type=int, default=40, help="Quantos usuários estão nos grupos de Analistas/Técnicos.")
+        parser.add_argument('--chamados', type=int, default=100000)
+        parser.add_argument('--projetos', type=int, default=500)
+        parser.add_argument('--tarefas-por-projeto', type=int, default=20)
+        parser.add_argument('--repeticoes', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--manter-dados', action='store_true', help="Não apaga as tabelas sintéticas ao final.")
+        parser.add_argument('--reusar-dados', action='store_true', help="Usa as tabelas já criadas por uma execução anterior.")
+
+    def handle(self, *args, **options):
+        db = Database(connection_name=options['conexao'])
+
+        # Proteção: um banco com glpi_configs é uma instalação real do GLPI
+        if db.fetch_query("SHOW TABLES LIKE 'glpi_configs'"):
+            raise CommandError(
+                f"O banco da conexão '{options['conexao']}' parece ser um GLPI real (glpi_configs existe). "
+                "Use um banco vazio de teste."
+            )
+
+        try:
+            # Dentro do try: se a criação falhar no meio, as tabelas também são apagadas
+            if not options['reusar_dados']:
+                self.criar_massa(db, options)
+
+            resultados = {}
+            for nome, sql in (('correlacionada (antiga)', DEPARTMENTTEAM_SQL_CORRELATED),
+                              ('agregada (atual)', DEPARTMENTTEAM_SQL)):
+                tempos = []
+                linhas = None
+                for _ in range(options['repeticoes']):
+                    inicio = time.perf_counter()
+                    linhas = db.fetch_query(sql)
+                    tempos.append((time.perf_counter() - inicio) * 1000)
+                resultados[nome] = linhas
+                self.stdout.write(
+                    f"{nome:<26} min {min(tempos):9.1f} ms | média {sum(tempos) / len(tempos):9.1f} ms "
+                    f"| {len(linhas)} linhas"
+                )
+
+            antiga, atual = resultados.values()
+            if self.normalizar(antiga) != self.normalizar(atual):
+                raise CommandError("As duas versões retornaram resultados DIFERENTES.")
+            self.stdout.write(self.style.SUCCESS("Resultados idênticos nas duas versões."))
+        finally:
+            if not options['manter_dados']:
+                self.apagar_tabelas(db)
+
+    @staticmethod
+    def normalizar(linhas):
+        return sorted(
+            (l['nome_completo'], l['login'], l['grupo_perfil'], int(l['qtd_tickets_atribuidos']),
+             int(l['qtd_projetos_relacionados']), int(l['qtd_total_tarefas']))
+            for l in linhas
+        )
+
+    def apagar_tabelas(self, db):
+        for tabela in TABLES:
+            db.execute_query(f"DROP TABLE IF EXISTS {tabela}")
+
+    def inserir(self, db, sql, linhas):
+        for i in range(0, len(linhas), BATCH_SIZE):
+            with db.get_cursor(commit=True) as cursor:
+                cursor.executemany(sql, linhas[i:i + BATCH_SIZE])
+
+    def criar_massa(self, db, options):
+        rnd = random.Random(options['seed'])
+        self.stdout.write("Criando massa de dados sintética...")
+        self.apagar_tabelas(db)
+        for ddl in SCHEMA:
+            db.execute_query(ddl)
+
+        n_usuarios = options['usuarios']
+        n_chamados = options['chamados']
+        n_projetos = options['projetos']
+        n_tarefas = n_projetos * options['tarefas_por_projeto']
+        usuarios = list(range(1, n_usuarios + 1))
+        tecnicos = usuarios[:options['tecnicos']]
+
+        self.inserir(db, "INSERT INTO glpi_users (id, name, firstname, is_deleted, is_active) VALUES (%s, %s, %s, %s, %s)",
+                     [(u, f"user{u}", f"Usuario {u}", int(rnd.random() < 0.05), int(rnd.random() > 0.05)) for u in usuarios])
+        self.inserir(db, "INSERT INTO glpi_groups (id, name) VALUES (%s, %s)",
+                     [(1, 'TI > Analistas'), (2, 'TI > Técnicos'), (3, 'Financeiro')])
+        self.inserir(db, "INSERT INTO glpi_groups_users (users_id, groups_id) VALUES (%s, %s)",
+                     [(u, 1 if u % 3 == 0 else 2) for u in tecnicos] +
+                     [(u, 3) for u in usuarios[len(tecnicos):]])
+
+        self.inserir(db, "INSERT INTO glpi_tickets (id, is_deleted) VALUES (%s, %s)",
+                     [(t, int(rnd.random() < 0.03)) for t in range(1, n_chamados + 1)])
+        atores = set()
+        for t in range(1, n_chamados + 1):
+            atores.add((t, rnd.choice(usuarios), 1))               # Requerente
+            for _ in range(rnd.choice((1, 1, 1, 2))):
+                atores.add((t, rnd.choice(tecnicos), 2))           # Técnico atribuído
+        self.inserir(db, "INSERT INTO glpi_tickets_users (tickets_id, users_id, type) VALUES (%s, %s, %s)", list(atores))
+        self.inserir(db, "INSERT INTO glpi_tickettasks (tickets_id, users_id_tech, state) VALUES (%s, %s, %s)",
+                     [(rnd.randint(1, n_chamados), rnd.choice(tecnicos), rnd.choice((0, 1, 2)))
+                      for _ in range(n_chamados // 2)])
+
+        self.inserir(db, "INSERT INTO glpi_projects (id, is_deleted, projectstates_id) VALUES (%s, %s, %s)",
+                     [(p, int(rnd.random() < 0.05), rnd.choice((1, 2, 3, 3, 4))) for p in range(1, n_projetos + 1)])
+        equipes = {(rnd.randint(1, n_projetos), 'User', rnd.choice(tecnicos)) for _ in range(n_projetos * 3)}
+        equipes |= {(rnd.randint(1, n_projetos), 'Group', 1) for _ in range(n_projetos // 2)}
+        self.inserir(db, "INSERT INTO glpi_projectteams (projects_id, itemtype, items_id) VALUES (%s, %s, %s)", list(equipes))
+        self.inserir(db, "INSERT INTO glpi_projecttasks (id, projects_id) VALUES (%s, %s)",
+                     [(t, rnd.randint(1, n_projetos)) for t in range(1, n_tarefas + 1)])
+        equipes_tarefa = {(rnd.randint(1, n_tarefas), 'User', rnd.choice(tecnicos)) for _ in range(n_tarefas * 2)}
+        self.inserir(db, "INSERT INTO glpi_projecttaskteams (projecttasks_id, itemtype, items_id) VALUES (%s, %s, %s)",
+                     list(equipes_tarefa))
+
+        # ANALYZE TABLE devolve um resultado: lido via fetch_query, senão o
+        # commit do execute_query falha com 'Unread result found'
+        for tabela in TABLES:
+            db.fetch_query(f"ANALYZE TABLE {tabela}")
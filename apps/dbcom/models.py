@@ -172,4 +172,89 @@ class AutomationRule(models.Model):
         # Garante que uma categoria só tenha uma regra por webhook
         unique_together = ('webhook', 'trigger_category_id')
         verbose_name = "Regra de Automação"
-        verbose_name_plural = "Regras de Automação"
\ No newline at end of file
+        verbose_name_plural = "Regras de Automação"
+
+class WebhookJob(models.Model):
+    """
+    Execução de uma regra de automação disparada por um webhook do GLPI.
+    O webhook apenas grava o job e responde; a alteração dos ativos é feita
+    em segundo plano (apps.dbcom.jobs), com retentativas.
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_RETRY = 'retry'
+    STATUS_SUCCESS = 'success'
+    STATUS_FAILED = 'failed'
+    STATUS_SUPERSEDED = 'superseded'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Na fila'),
+        (STATUS_RUNNING, 'Executando'),
+        (STATUS_RETRY, 'Aguardando nova tentativa'),
+        (STATUS_SUCCESS, 'Concluído'),
+        (STATUS_FAILED, 'Falhou'),
+        (STATUS_SUPERSEDED, 'Substituído por evento mais novo'),
+    ]
+    ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_RUNNING, STATUS_RETRY)
+
+    ACTION_PENDING = 'pending'
+    ACTION_SOLVE = 'solve'
+    ACTION_CHOICES = [
+        (ACTION_PENDING, 'Pendente'),
+        (ACTION_SOLVE, 'Solucionado'),
+    ]
+
+    webhook = models.ForeignKey(
+        GLPIWebhook,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="jobs",
+    )
+    rule = models.ForeignKey(
+        AutomationRule,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="jobs",
+        verbose_name="Regra",
+    )
+    ticket_id = models.PositiveIntegerField("ID do Chamado", db_index=True)
+    ticket_status_id = models.PositiveIntegerField("Status do Chamado")
+    action = models.CharField("Ação", max_length=10, choices=ACTION_CHOICES)
+    target_status_id = models.PositiveIntegerField("Status do Ativo (alvo)")
+
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES, default=STATUS_QUEUED, db_index=True)
+    attempts = models.PositiveIntegerField("Tentativas", default=0)
+    last_error = models.TextField("Último erro", blank=True)
+
+    created_at = models.DateTimeField("Recebido em", auto_now_add=True)
+    next_attempt_at = models.DateTimeField("Próxima tentativa", null=True, blank=True)
+    started_at = models.DateTimeField("Iniciado em", null=True, blank=True)
+    finished_at = models.DateTimeField("Finalizado em", null=True, blank=True)
+
+    # Processo que executa o job (core.workers.BOOT_ID) e seu último sinal de vida
+    boot_id = models.CharField(max_length=32, blank=True, editable=False)
+    heartbeat_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    @property
+    def queue_latency(self):
+        """ Tempo entre o recebimento do webhook e o início da (última) execução. """
+        if self.started_at and self.created_at:
+            return self.started_at - self.created_at
+        return None
+
+    @property
+    def total_latency(self):
+        """ Tempo entre o recebimento do webhook e o fim do job. """
+        if self.finished_at and self.created_at:
+            return self.finished_at - self.created_at
+        return None
+
+    def __str__(self):
+        return f"Chamado {self.ticket_id} ({self.get_action_display()}) - {self.get_status_display()}"
+
+    class Meta:
+        verbose_name = "Job de Webhook"
+        verbose_name_plural = "Jobs de Webhook"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['ticket_id', 'target_status_id', 'status']),
+        ]
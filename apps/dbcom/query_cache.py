@@ -0,0 +1,232 @@
+import copy
+import time
+import pickle
+import hashlib
+import logging
+import functools
+import threading
+from collections import OrderedDict
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+# Configuração padrão (pode ser sobrescrita em settings.GLPI_QUERY_CACHE)
+CACHE_DEFAULTS = {
+    'BACKEND': 'locmem',   # 'locmem' (LRU no processo) ou 'redis'
+    'MAX_ENTRIES': 256,    # Limite do LRU em memória
+    'REDIS_DB': 1,         # Banco do Redis (o 0 fica para o Channels)
+    'KEY_PREFIX': 'glpi_query',
+    'ENABLED': True,
+}
+
+
+def get_cache_settings():
+    cache_settings = dict(CACHE_DEFAULTS)
+    cache_settings.update(getattr(settings, 'GLPI_QUERY_CACHE', {}) or {})
+    return cache_settings
+
+
+class LocMemLRUBackend:
+    """
+    Cache LRU em memória, local ao processo.
+    As entradas são tuplas (valor, instante_em_que_foi_gravado).
+    """
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+            return entry
+
+    def set(self, key, entry, timeout):
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[key]
+
+
+class RedisBackend:
+    """
+    Cache no Redis (o mesmo servidor usado pelo Channels), compartilhado
+    entre processos. As entradas expiram sozinhas após 'timeout' segundos.
+    """
+    def __init__(self, host, port, db=1):
+        import redis
+        self.client = redis.Redis(host=host, port=port, db=db, socket_timeout=2)
+
+    def get(self, key):
+        raw = self.client.get(key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key, entry, timeout):
+        self.client.set(key, pickle.dumps(entry), ex=max(1, int(timeout)))
+
+    def delete_prefix(self, prefix):
+        for key in self.client.scan_iter(match=f"{prefix}*"):
+            self.client.delete(key)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                cache_settings = get_cache_settings()
+                if cache_settings['BACKEND'] == 'redis':
+                    _backend = RedisBackend(
+                        settings.REDIS_HOST,
+                        settings.REDIS_PORT,
+                        db=cache_settings['REDIS_DB'],
+                    )
+                else:
+                    _backend = LocMemLRUBackend(max_entries=cache_settings['MAX_ENTRIES'])
+    return _backend
+
+
+class CachePolicy:
+    """
+    Política de cache de uma query: tempo de vida ('ttl') e janela extra
+    em que um valor vencido ainda é servido enquanto é recarregado em
+    segundo plano ('stale_ttl', stale-while-revalidate).
+    """
+    def __init__(self, name, ttl, stale_ttl=0):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.counters = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'refreshes': 0, 'errors': 0}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    @property
+    def prefix(self):
+        return f"{get_cache_settings()['KEY_PREFIX']}:{self.name}:"
+
+    def make_key(self, args, kwargs):
+        raw = repr((args, sorted(kwargs.items())))
+        return self.prefix + hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _count(self, counter):
+        with self._lock:
+            self.counters[counter] += 1
+
+    def _store(self, key, value):
+        get_backend().set(key, (value, time.time()), self.ttl + self.stale_ttl)
+
+    def _refresh_in_background(self, key, func, args, kwargs):
+        with self._lock:
+            if key in self._refreshing:
+                return  # Já existe uma recarga em andamento para esta chave
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                self._store(key, func(*args, **kwargs))
+                self._count('refreshes')
+            except Exception as e:
+                logger.error("Erro ao recarregar o cache da query '%s': %s", self.name, e)
+                self._count('errors')
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, daemon=True, name=f"glpi-cache-{self.name}").start()
+
+    def call(self, func, args, kwargs):
+        if not get_cache_settings()['ENABLED']:
+            return func(*args, **kwargs)
+
+        key = self.make_key(args, kwargs)
+        try:
+            entry = get_backend().get(key)
+        except Exception as e:
+            # Cache indisponível (ex: Redis fora do ar): consulta direto
+            logger.error("Erro ao ler o cache da query '%s': %s", self.name, e)
+            self._count('errors')
+            return func(*args, **kwargs)
+
+        if entry is not None:
+            value, stored_at = entry
+            age = time.time() - stored_at
+            if age < self.ttl:
+                self._count('hits')
+                return copy.deepcopy(value)
+            if age < self.ttl + self.stale_ttl:
+                self._count('stale_hits')
+                self._refresh_in_background(key, func, args, kwargs)
+                return copy.deepcopy(value)
+
+        self._count('misses')
+        value = func(*args, **kwargs)
+        try:
+            self._store(key, value)
+        except Exception as e:
+            logger.error("Erro ao gravar o cache da query '%s': %s", self.name, e)
+            self._count('errors')
+        return copy.deepcopy(value)
+
+    def invalidate(self):
+        get_backend().delete_prefix(self.prefix)
+
+    def stats(self):
+        with self._lock:
+            data = dict(self.counters)
+        data['ttl'] = self.ttl
+        data['stale_ttl'] = self.stale_ttl
+        lookups = data['hits'] + data['stale_hits'] + data['misses']
+        data['hit_ratio'] = round((data['hits'] + data['stale_hits']) / lookups, 3) if lookups else 0.0
+        return data
+
+
+# Registro de todas as queries com cache (nome -> política)
+registry = {}
+
+
+def glpi_cached(ttl, stale_ttl=0, name=None):
+    """
+    Decorator que adiciona cache a uma função de query do GLPI.
+    A chave inclui o nome da query e todos os parâmetros da chamada.
+
+    Exemplo:
+        @glpi_cached(ttl=300, stale_ttl=600)
+        def newpanel_dashboard_responsetimeavg(): ...
+    """
+    def decorator(func):
+        policy = CachePolicy(name or func.__name__, ttl, stale_ttl)
+        registry[policy.name] = policy
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return policy.call(func, args, kwargs)
+
+        wrapper.cache_policy = policy
+        wrapper.invalidate = policy.invalidate
+        wrapper.uncached = func
+        return wrapper
+    return decorator
+
+
+def get_cache_stats():
+    """
+    Retorna os contadores de hit/miss de cada query com cache.
+    """
+    return {
+        'backend': get_cache_settings()['BACKEND'],
+        'queries': {name: policy.stats() for name, policy in registry.items()},
+    }
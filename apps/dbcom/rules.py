@@ -0,0 +1,135 @@
+import time
+import threading
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+from .models import GLPIWebhook, AutomationRule
+from .glpi_queries import get_all_category_parents
+
+
+class CategoryTree:
+    """
+    Índice em memória da hierarquia de categorias ITIL do GLPI
+    ({categoria: categoria_pai}), carregado com uma única query.
+
+    É recarregado quando vence o TTL, sob demanda (refresh) ou quando
+    chega uma categoria desconhecida (criada depois da última carga),
+    no máximo uma vez a cada 'min_reload_seconds'.
+    """
+    def __init__(self, ttl=600, min_reload_seconds=30):
+        self.ttl = ttl
+        self.min_reload_seconds = min_reload_seconds
+        self.parents = {}
+        self.loaded_at = None
+        self.loads = 0
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        parents = get_all_category_parents()
+        if parents is None:
+            raise RuntimeError("Conexão com o GLPI indisponível para carregar as categorias.")
+        with self._lock:
+            self.parents = parents
+            self.loaded_at = time.monotonic()
+            self.loads += 1
+
+    def _age(self):
+        return time.monotonic() - self.loaded_at if self.loaded_at is not None else None
+
+    def ensure_loaded(self, category_id=None):
+        age = self._age()
+        if age is None or age > self.ttl:
+            self.refresh()
+        elif category_id is not None and category_id not in self.parents and age > self.min_reload_seconds:
+            self.refresh()
+
+    def ancestors(self, category_id):
+        """
+        A própria categoria seguida de seus pais, até a raiz.
+        """
+        self.ensure_loaded(category_id)
+        parents = self.parents
+        seen = set()
+        current = category_id
+        while current and current > 0 and current not in seen:
+            yield current
+            seen.add(current)  # Protege contra ciclos na hierarquia
+            current = parents.get(current)
+
+    def stats(self):
+        age = self._age()
+        return {
+            'categories': len(self.parents),
+            'loads': self.loads,
+            'age_seconds': round(age, 1) if age is not None else None,
+            'ttl': self.ttl,
+        }
+
+
+class RuleIndex:
+    """
+    Regras de automação ativas indexadas por webhook e categoria:
+    {webhook_id: {trigger_category_id: AutomationRule}}.
+
+    Descartado ao salvar/excluir regras ou webhooks (sinais abaixo)
+    e recarregado a cada 'ttl' segundos para refletir alterações
+    feitas por outros processos.
+    """
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self.by_webhook = None
+        self.loaded_at = None
+        self._lock = threading.Lock()
+
+    def invalidate(self, **kwargs):
+        with self._lock:
+            self.by_webhook = None
+
+    def _load(self):
+        by_webhook = {}
+        for rule in AutomationRule.objects.filter(is_active=True, webhook__isnull=False):
+            by_webhook.setdefault(rule.webhook_id, {})[rule.trigger_category_id] = rule
+        return by_webhook
+
+    def rules_for(self, webhook_id):
+        with self._lock:
+            expired = self.loaded_at is None or time.monotonic() - self.loaded_at > self.ttl
+            if self.by_webhook is None or expired:
+                self.by_webhook = self._load()
+                self.loaded_at = time.monotonic()
+            return self.by_webhook.get(webhook_id, {})
+
+    def stats(self):
+        by_webhook = self.by_webhook or {}
+        return {
+            'webhooks': len(by_webhook),
+            'rules': sum(len(rules) for rules in by_webhook.values()),
+            'ttl': self.ttl,
+        }
+
+
+category_tree = CategoryTree(ttl=getattr(settings, 'GLPI_CATEGORY_TREE_TTL', 600))
+rule_index = RuleIndex(ttl=getattr(settings, 'AUTOMATION_RULES_TTL', 60))
+
+for _model in (AutomationRule, GLPIWebhook):
+    post_save.connect(rule_index.invalidate, sender=_model, dispatch_uid=f'rule_index_{_model.__name__}_save')
+    post_delete.connect(rule_index.invalidate, sender=_model, dispatch_uid=f'rule_index_{_model.__name__}_delete')
+
+
+def resolve_rule(webhook_id, category_id):
+    """
+    Encontra a regra do webhook para a categoria informada, subindo pela
+    hierarquia (a regra da categoria mais próxima vence).
+    Retorna (regra, id_da_categoria_onde_foi_encontrada) ou (None, None).
+    """
+    rules = rule_index.rules_for(webhook_id)
+    if not rules:
+        return None, None
+    for current in category_tree.ancestors(int(category_id)):
+        rule = rules.get(current)
+        if rule:
+            return rule, current
+    return None, None
+
+
+def get_rule_cache_stats():
+    return {'category_tree': category_tree.stats(), 'rules': rule_index.stats()}
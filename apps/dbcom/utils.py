@@ -1,169 +1,180 @@
+import time
+import logging
+import threading
 import requests
-import json
+from dataclasses import dataclass, field
+from .glpi_queries import get_items_states
+from .glpi_session import glpi_sessions, GLPISessionError, get_glpi_timeout
+from .glpi_client import glpi_client, ItemUpdate
 
 
-def get_legacy_session_token(config):
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StatusChangeResult:
     """
-    Inicia uma sessão na API Legada (v1) usando
-    App-Token e User-Token.
+    Resultado consolidado de change_glpi_items_status: um ItemUpdateResult
+    por item gravado, os itens ignorados por já estarem no status (ItemUpdate)
+    e a lista de erros (incluindo os de sessão e listagem).
     """
-    print("Iniciando sessão (initSession) na API Legada...")
-    
-    # URL do initSession (ex: .../api.php/v1/initSession)
-    url = f"{config.glpi_api_url.rstrip('/')}/initSession"
-    
-    headers = {
-        "Content-Type": "application/json",
-        "App-Token": config.glpi_app_token,
-        "Authorization": f"user_token {config.glpi_user_token}"
-    }
-
-    # --- DEBUG: IMPRIME A REQUISIÇÃO DE SESSÃO ---
-    print("\n--- DEBUG: initSession (Chamada Saindo) ---")
-    print(f"URL: GET {url}")
-    print(f"Headers: {json.dumps(headers, indent=2)}")
-    print("------------------------------------------\n")
+    ticket_id: int
+    new_status_id: int
+    items: list = field(default_factory=list)
+    skipped: list = field(default_factory=list)
+    errors: list = field(default_factory=list)
+    elapsed_ms: float = 0.0
 
-    try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        data = response.json()
-        
-        session_token = data.get('session_token')
-        
-        if not session_token:
-            print("Erro: initSession OK, mas não retornou 'session_token'.")
-            return None, "Resposta do initSession não continha 'session_token'."
-            
-        print(f"Sessão iniciada com sucesso. Token: ...{session_token[-5:]}")
-        return session_token, None 
-        
-    except requests.exceptions.RequestException as e:
-        error_text = e.response.text if e.response else str(e)
-        print(f"Falha ao iniciar sessão (initSession) em {url}: {e}")
-        print(f"Resposta da API: {error_text}")
-        return None, f"Falha no initSession: {error_text}"
+    @property
+    def ok(self):
+        return not self.errors
+
+    @property
+    def updated(self):
+        return [item for item in self.items if item.ok]
+
+    @property
+    def failed(self):
+        return [item for item in self.items if not item.ok]
+
+    def summary(self):
+        return (f"{len(self.updated)} atualizado(s), {len(self.skipped)} já no status, "
+                f"{len(self.failed)} com erro, em {self.elapsed_ms:.0f} ms")
+
+
+# Contadores (por processo) das gravações feitas e evitadas
+state_change_counters = {'applied': 0, 'skipped': 0, 'failed': 0, 'unknown_state': 0}
+_counters_lock = threading.Lock()
+
+
+def _count_state_changes(**amounts):
+    with _counters_lock:
+        for counter, amount in amounts.items():
+            state_change_counters[counter] += amount
 
-def kill_legacy_session(config, session_token):
+
+def get_state_change_stats():
+    with _counters_lock:
+        return dict(state_change_counters)
+
+
+def _filter_pending_updates(ticket_id, updates, new_status_id):
     """
-    Encerra (killSession) uma sessão da API legada.
+    Separa os itens que realmente precisam mudar dos que já estão no status
+    alvo, lendo o states_id atual de todos em uma query no banco do GLPI.
+    Se a leitura falhar, todos são gravados (como antes).
+    Retorna (a_gravar, ja_no_status, sem_estado_conhecido).
     """
-    print(f"Encerrando sessão (killSession) ...{session_token[-5:]}")
-    url = f"{config.glpi_api_url.rstrip('/')}/killSession"
-    headers = {
-        "Content-Type": "application/json",
-        "App-Token": config.glpi_app_token,
-        "Session-Token": session_token
-    }
-    
-    # --- DEBUG: IMPRIME A REQUISIÇÃO DE KILLSESSION ---
-    print("\n--- DEBUG: killSession (Chamada Saindo) ---")
-    print(f"URL: GET {url}")
-    print(f"Headers: {json.dumps(headers, indent=2)}")
-    print("-------------------------------------------\n")
-    
     try:
-        requests.get(url, headers=headers)
-        print("Sessão encerrada.")
+        states = get_items_states([(update.itemtype, update.item_id) for update in updates])
     except Exception as e:
-        print(f"Erro (não crítico) ao encerrar sessão: {e}")
-        pass
+        logger.warning("[Ticket %s] Não foi possível ler o status atual dos itens (%s). Gravando todos.", ticket_id, e)
+        return updates, [], len(updates)
+
+    pending, skipped, unknown = [], [], 0
+    for update in updates:
+        key = (update.itemtype, update.item_id)
+        if key not in states:
+            unknown += 1
+            pending.append(update)
+        elif states[key] is not None and int(states[key]) == int(new_status_id):
+            skipped.append(update)
+        else:
+            pending.append(update)
+    return pending, skipped, unknown
+
+
+def _find_item_url(item):
+    """
+    URL do ativo nos 'links' de um Item_Ticket (ignora o link do próprio chamado).
+    """
+    for link in item.get('links', []):
+        if link.get('rel') and link.get('rel') != 'Ticket' and link.get('href'):
+            return link['href']
+    return None
+
 
-# --- FUNÇÃO PRINCIPAL ATUALIZADA ---
-def change_glpi_items_status(ticket_id, new_status_id, config): # <-- REMOVIDO check_previous_status_id
+def change_glpi_items_status(ticket_id, new_status_id, config):
     """
     Atualiza itens usando 100% a API LEGADA (v1).
-    Esta versão FORÇA o status, ignorando o estado anterior.
+    Os itens que já estão no status alvo (lidos em uma query no banco do
+    GLPI) não são gravados: webhooks repetidos não geram escritas.
+
+    Usa a sessão compartilhada do processo (glpi_session.glpi_sessions),
+    sem initSession/killSession a cada chamada. Os itens do chamado são
+    gravados em lote por tipo de item (glpi_client), em paralelo (limite em
+    settings.GLPI_API['MAX_CONCURRENCY']), cada requisição com timeout.
+    Retorna um StatusChangeResult; 'result.errors' vazio indica sucesso.
     """
-    
-    errors = []
-    session_token = None 
+    started = time.perf_counter()
+    result = StatusChangeResult(ticket_id=ticket_id, new_status_id=new_status_id)
+    timeout = get_glpi_timeout()
+    unknown = 0
 
     try:
-        session_token, error = get_legacy_session_token(config)
-        if error:
-            errors.append(error)
-            return errors 
-
-        action_headers = {
-            "Content-Type": "application/json",
-            "App-Token": config.glpi_app_token,
-            "Session-Token": session_token 
-        }
-
         get_items_url = f"{config.glpi_api_url.rstrip('/')}/Ticket/{ticket_id}/Item_Ticket/"
         
-        print(f"[Ticket {ticket_id}] Buscando itens associados via API: GET {get_items_url}")
+        logger.debug("[Ticket %s] Buscando itens associados via API: GET %s", ticket_id, get_items_url)
 
         try:
-            response = requests.get(get_items_url, headers=action_headers)
+            response = glpi_sessions.request(config, 'GET', get_items_url, timeout=timeout)
             response.raise_for_status()
             items_list = response.json()
+        except GLPISessionError as e:
+            result.errors.append(str(e))
+            return result
         except requests.exceptions.RequestException as e:
-            error_text = e.response.text if e.response else str(e)
+            error_text = e.response.text if e.response is not None else str(e)
             error_msg = f"Erro ao buscar a lista de itens (Item_Ticket): {error_text}"
-            print(f"[Ticket {ticket_id}] {error_msg}")
-            errors.append(error_msg)
-            return errors 
+            logger.error("[Ticket %s] %s", ticket_id, error_msg)
+            result.errors.append(error_msg)
+            return result
         
         if not items_list:
-            print(f"[Ticket {ticket_id}] Nenhum item encontrado no chamado para atualizar.")
-            return errors 
+            logger.info("[Ticket %s] Nenhum item encontrado no chamado para atualizar.", ticket_id)
+            return result
 
-        print(f"[Ticket {ticket_id}] Encontrados {len(items_list)} itens. Iniciando atualizações...")
+        logger.debug("[Ticket %s] Encontrados %s itens. Iniciando atualizações...", ticket_id, len(items_list))
 
-        # 4. LOOP DE ATUALIZAÇÃO
+        updates = []
         for item in items_list:
-            item_url = None
             item_type_for_log = item.get('itemtype', 'UnknownItem')
-            
-            if 'links' not in item:
-                print(f"[Ticket {ticket_id}] Item {item_type_for_log} (ID: {item.get('id')}) não possui 'links'. Pulando.")
-                continue
-
-            for link in item['links']:
-                if link.get('rel') and link.get('rel') != 'Ticket' and link.get('href'):
-                    item_url = link['href']
-                    break 
+            item_url = _find_item_url(item)
 
             if not item_url:
-                print(f"[Ticket {ticket_id}] Não foi possível encontrar o 'href' do ativo no item {item.get('id')}. Pulando.")
+                logger.warning("[Ticket %s] Não foi possível encontrar o 'href' do ativo no item %s. Pulando.", ticket_id, item.get('id'))
                 continue
-            
-            # --- LÓGICA DE CHECAGEM (check_previous_status_id) REMOVIDA ---
-            # O código agora continua direto para o PATCH/PUT
-            
-            # 4c. Preparar o payload e fazer o PATCH/PUT
-            payload = {
-                "input": {
-                    "states_id": new_status_id
-                }
-            }
-            
-            print(f"\n--- DEBUG: Forçando atualização de Item (Chamada Saindo) ---")
-            print(f"URL: PATCH {item_url}")
-            print(f"Payload: {json.dumps(payload)}\n")
-            
-            try:
-                response = requests.patch(item_url, headers=action_headers, json=payload)
-                
-                if 400 <= response.status_code < 500:
-                    print(f"[Ticket {ticket_id}] PATCH falhou com {response.status_code}. Tentando PUT...")
-                    response = requests.put(item_url, headers=action_headers, json=payload)
-
-                response.raise_for_status()
-                
-                print(f"[Ticket {ticket_id}] Sucesso! Item {item_type_for_log} (URL: {item_url}) FORÇADO para status {new_status_id}.")
-
-            except requests.exceptions.RequestException as e:
-                error_text = e.response.text if e.response else str(e)
-                error_msg = f"Erro na API! Item {item_type_for_log} (URL: {item_url}). Resposta: {error_text}"
-                print(f"[Ticket {ticket_id}] {error_msg}")
-                errors.append(error_msg)
-        
-        return errors 
 
-    finally:
-        if session_token:
-            kill_legacy_session(config, session_token)
+            item_id = item.get('items_id') or item_url.rstrip('/').rsplit('/', 1)[-1]
+            updates.append(ItemUpdate(
+                itemtype=item_type_for_log,
+                item_id=int(item_id),
+                url=item_url,
+                fields={"states_id": new_status_id},
+            ))
+
+        updates, result.skipped, unknown = _filter_pending_updates(ticket_id, updates, new_status_id)
+        if result.skipped:
+            logger.info("[Ticket %s] %s item(ns) já estão no status %s. Ignorando.", ticket_id, len(result.skipped), new_status_id)
+
+        for item_result in glpi_client.update_items(config, updates) if updates else []:
+            result.items.append(item_result)
+            if item_result.ok:
+                logger.debug("[Ticket %s] Item %s (URL: %s) atualizado para status %s (%s).",
+                             ticket_id, item_result.itemtype, item_result.url, new_status_id,
+                             item_result.method, extra={'sample': True})
+            else:
+                logger.error("[Ticket %s] %s", ticket_id, item_result.error)
+                result.errors.append(item_result.error)
+
+        return result
 
+    finally:
+        _count_state_changes(
+            applied=len(result.updated),
+            skipped=len(result.skipped),
+            failed=len(result.failed),
+            unknown_state=unknown,
+        )
+        result.elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+        logger.info("[Ticket %s] Atualização de itens: %s.", ticket_id, result.summary())
@@ -1,15 +1,30 @@
 from django.shortcuts import render
 from django.contrib.admin.views.decorators import staff_member_required
-from django.http import JsonResponse, HttpResponseServerError, HttpResponseBadRequest, HttpResponseNotFound
-from django.views.decorators.http import require_GET
+from django.http import (
+    JsonResponse, StreamingHttpResponse, HttpResponseServerError, HttpResponseBadRequest,
+    HttpResponseNotFound, HttpResponseNotModified,
+)
+from django.views.decorators.http import require_GET, require_http_methods
 from django.views import View
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib import admin
-from .glpi_queries import get_assets_for_printing, get_category_parent_id
-from .models import GLPIConfig, GLPIWebhook, AutomationRule
-from .utils import change_glpi_items_status
+from .glpi_queries import (
+    ASSET_TYPES, ASSET_PAGE_SIZE_DEFAULT, ASSET_PAGE_SIZE_MAX,
+    get_assets_for_printing, stream_assets_for_printing, get_assets_fingerprint,
+)
+from .db_manager import get_all_pool_stats
+from .query_cache import get_cache_stats
+from .rules import resolve_rule, category_tree, rule_index, get_rule_cache_stats
+from .models import GLPIConfig, GLPIWebhook, AutomationRule, WebhookJob
+from .jobs import enqueue_webhook_job, get_job_stats
 import json
+import base64
+import logging
+import hashlib
+
+
+logger = logging.getLogger(__name__)
 
 
 @staff_member_required
@@ -48,20 +63,163 @@ def impressao_etiquetas_view(request):
     return render(request, 'admin/impressao_etiquetas.html', context)
 
 
+def encode_asset_cursor(asset):
+    """ Cursor opaco (base64 de [asset_name, asset_id]) da última linha de uma página. """
+    raw = json.dumps([asset['asset_name'], asset['asset_id']], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_asset_cursor(cursor):
+    name, asset_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+    return name, int(asset_id)
+
+
+def _assets_etag(request, fingerprint):
+    """
+    ETag da resposta: o resumo da listagem no GLPI (total, maior id, última
+    alteração) somado aos parâmetros da requisição.
+    """
+    raw = json.dumps([sorted(request.GET.items()), fingerprint], default=str)
+    return '"%s"' % hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _etag_matches(request, etag):
+    # Aceita a forma "fraca" (W/"...") que alguns proxies geram ao comprimir
+    candidates = [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]
+    return any(tag == etag or tag == 'W/' + etag or tag == '*' for tag in candidates)
+
+
+def _stream_assets_ndjson(assets):
+    for asset in assets:
+        yield json.dumps(asset, ensure_ascii=False, default=str) + "\n"
+
+
 @require_GET
 @staff_member_required
 def get_assets_data_api(request):
     """
     API interna que o JavaScript vai chamar para buscar os dados.
+
+    Parâmetros (GET):
+        type: tipo do ativo (obrigatório).
+        search: filtro por nome do ativo ou entidade (opcional).
+        limit / cursor: paginação por cursor. Retorna {'results', 'next_cursor'};
+            'next_cursor' é null na última página.
+        page / page_size: paginação por número de página.
+        format=ndjson: todos os ativos em streaming, um JSON por linha.
+    Sem paginação nem 'format', retorna a lista completa (formato antigo).
+
+    As respostas sem 'cursor' (a primeira página, a lista completa, o
+    ndjson) levam ETag: com If-None-Match igual, retorna 304. O resumo do
+    ETag (e o 'total') é calculado só nelas; as páginas seguintes do cursor
+    não repetem a agregação.
     """
-    # ... (seu código desta view continua o mesmo)
     asset_type = request.GET.get('type')
     if not asset_type:
         return HttpResponseBadRequest("Parâmetro 'type' é obrigatório.")
+    if asset_type not in ASSET_TYPES:
+        return HttpResponseBadRequest(f"Tipo de ativo desconhecido: '{asset_type}'.")
+
+    search = request.GET.get('search', '').strip() or None
+
+    try:
+        after = decode_asset_cursor(request.GET['cursor']) if request.GET.get('cursor') else None
+    except (ValueError, TypeError, UnicodeDecodeError):
+        return HttpResponseBadRequest("Parâmetro 'cursor' inválido.")
+
+    try:
+        page = int(request.GET['page']) if 'page' in request.GET else None
+        page_size = int(request.GET.get('page_size', 0)) or ASSET_PAGE_SIZE_DEFAULT
+        limit = int(request.GET['limit']) if 'limit' in request.GET else None
+    except ValueError:
+        return HttpResponseBadRequest("Parâmetros 'page', 'page_size' e 'limit' devem ser números inteiros.")
+
+    fingerprint = get_assets_fingerprint(asset_type, search=search) if after is None else None
+    etag = _assets_etag(request, fingerprint) if fingerprint is not None else None
+    if etag and _etag_matches(request, etag):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    if request.GET.get('format') == 'ndjson':
+        response = StreamingHttpResponse(
+            _stream_assets_ndjson(stream_assets_for_printing(asset_type, search=search, after=after)),
+            content_type='application/x-ndjson; charset=utf-8',
+        )
+    elif limit is not None or after is not None:
+        limit = min(max(limit or ASSET_PAGE_SIZE_DEFAULT, 1), ASSET_PAGE_SIZE_MAX)
+        # Busca uma linha a mais só para saber se existe próxima página
+        assets = get_assets_for_printing(asset_type, search=search, after=after, limit=limit + 1)
+        next_cursor = encode_asset_cursor(assets[limit - 1]) if len(assets) > limit else None
+        response = JsonResponse({
+            'results': assets[:limit],
+            'next_cursor': next_cursor,
+            'total': fingerprint['total'] if fingerprint else None,
+        })
+    elif page is not None:
+        page = max(page, 1)
+        page_size = min(max(page_size, 1), ASSET_PAGE_SIZE_MAX)
+        assets = get_assets_for_printing(asset_type, search=search, page=page, page_size=page_size)
+        total = fingerprint['total'] if fingerprint else 0
+        response = JsonResponse({
+            'results': assets,
+            'page': page,
+            'page_size': page_size,
+            'total': total,
+            'has_next': page * page_size < total,
+        })
+    else:
+        response = JsonResponse(get_assets_for_printing(asset_type, search=search), safe=False)
+
+    if etag:
+        response['ETag'] = etag
+        # O navegador guarda a resposta, mas sempre revalida com If-None-Match
+        response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@require_GET
+@staff_member_required
+def db_pool_stats_api(request):
+    """
+    Retorna as estatísticas dos pools de conexão (em uso, esperas,
+    latência de checkout) para monitoramento.
+    """
+    return JsonResponse({'pools': get_all_pool_stats()})
+
+
+@require_GET
+@staff_member_required
+def query_cache_stats_api(request):
+    """
+    Retorna os contadores de hit/miss do cache das queries do GLPI.
+    """
+    return JsonResponse(get_cache_stats())
 
-    assets = get_assets_for_printing(asset_type)
 
-    return JsonResponse(assets, safe=False)
+@require_http_methods(["GET", "POST"])
+@staff_member_required
+def rule_cache_api(request):
+    """
+    GET: estado da árvore de categorias e do índice de regras em memória.
+    POST: recarrega os dois imediatamente (ex: após criar categorias no GLPI).
+    """
+    if request.method == 'POST':
+        try:
+            category_tree.refresh()
+        except Exception as e:
+            return JsonResponse({'status': 'erro', 'mensagem': str(e)}, status=502)
+        rule_index.invalidate()
+    return JsonResponse(get_rule_cache_stats())
+
+
+@require_GET
+@staff_member_required
+def webhook_job_stats_api(request):
+    """
+    Jobs de webhook por status, latência da última hora e estado do pool.
+    """
+    return JsonResponse(get_job_stats())
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -70,19 +228,18 @@ class GLPIWebhookView(View):
     # O 'webhook_id' vem da URL (definida em urls.py)
     def post(self, request, webhook_id, *args, **kwargs):
         
-        print(f"Webhook recebido (Validação IGNORADA) no endpoint: {webhook_id}")
+        logger.info("Webhook recebido (Validação IGNORADA) no endpoint: %s", webhook_id)
 
-        try:
-            config = GLPIConfig.objects.get(pk=1)
-        except GLPIConfig.DoesNotExist:
-            print("Erro Crítico: Configuração da API (GLPIConfig) não encontrada.")
+        # A configuração é lida pelo job na execução; aqui só valida que existe
+        if not GLPIConfig.objects.filter(pk=1).exists():
+            logger.error("Erro Crítico: Configuração da API (GLPIConfig) não encontrada.")
             return HttpResponseServerError("Configuração do servidor incompleta.")
 
         try:
             # 1. Encontre o Webhook que recebeu a chamada
             webhook = GLPIWebhook.objects.get(id=webhook_id)
         except GLPIWebhook.DoesNotExist:
-            print(f"Erro Crítico: Webhook com ID {webhook_id} não encontrado no Django.")
+            logger.error("Erro Crítico: Webhook com ID %s não encontrado no Django.", webhook_id)
             return HttpResponseNotFound("Webhook não configurado.")
         
         # (Aqui você pode re-adicionar a validação HMAC usando webhook.secret_key se quiser)
@@ -92,7 +249,7 @@ class GLPIWebhookView(View):
         try:
             data = json.loads(body_bytes) 
         except json.JSONDecodeError:
-            print(f"Erro: Payload recebido não é um JSON válido.")
+            logger.error("Erro: Payload recebido não é um JSON válido.")
             return HttpResponseBadRequest("Payload JSON inválido.")
             
         ticket_status_id = data.get('ticket_status')
@@ -100,75 +257,57 @@ class GLPIWebhookView(View):
         category_id = data.get('itilcategories_id')
 
         if not ticket_id or ticket_status_id is None or category_id is None:
-            print("Payload incompleto. Ignorando.")
+            logger.info("Payload incompleto. Ignorando.")
             return JsonResponse({"status": "ignorado", "motivo": "payload incompleto"}, status=200)
             
-        print(f"Buscando regra para Webhook '{webhook.name}', Categoria ID: {category_id}, Status ID: {ticket_status_id}")
+        logger.debug("Buscando regra para Webhook '%s', Categoria ID: %s, Status ID: %s", webhook.name, category_id, ticket_status_id)
 
         # 3. Lógica de Decisão (Buscando a regra)
-        rule = None
-        current_category_id_to_check = category_id
-        
+        # Árvore de categorias e regras ficam em memória (apps.dbcom.rules):
+        # a subida pela hierarquia não consulta o GLPI nem o banco do Django.
         try:
-            while current_category_id_to_check is not None and current_category_id_to_check > 0:
-                print(f"...Verificando regra para Categoria ID: {current_category_id_to_check}")
-                
-                # A busca agora é filtrada pelo Webhook *E* pela Categoria
-                rule = webhook.rules.filter(
-                    trigger_category_id=current_category_id_to_check, 
-                    is_active=True
-                ).first()
-
-                if rule:
-                    print(f"Regra encontrada: '{rule.name}' (no nível {current_category_id_to_check})")
-                    break
-                
-                current_category_id_to_check = get_category_parent_id(current_category_id_to_check)
-            
+            rule, matched_category_id = resolve_rule(webhook.id, category_id)
+            if rule:
+                logger.debug("Regra encontrada: '%s' (no nível %s)", rule.name, matched_category_id)
         except Exception as e:
-            print(f"Erro ao buscar regra ou categoria pai: {e}")
+            logger.error("Erro ao buscar regra ou categoria pai: %s", e)
             return HttpResponseServerError("Erro ao processar hierarquia de regras.")
         
         if not rule:
-            print(f"Nenhuma regra de automação encontrada para Categoria ID {category_id} neste webhook. Ignorando.")
+            logger.info("Nenhuma regra de automação encontrada para Categoria ID %s neste webhook. Ignorando.", category_id)
             return JsonResponse({"status": "ignorado", "motivo": "sem regra"}, status=200)
         
-        # 4. Executar a regra (Lógica de 'check' removida)
-        all_errors = []
-        try:
-            solve_ids_list = [sid.strip() for sid in rule.trigger_solve_ids.split(',')]
-
-            if (ticket_status_id == rule.trigger_pending_id):
-                
-                print(f"[Ticket {ticket_id}] Disparando Lógica PENDENTE: '{rule.name}'")
-                all_errors = change_glpi_items_status(
-                    ticket_id=ticket_id,
-                    new_status_id=rule.target_asset_status_on_pending,
-                    config=config
-                )
-
-            elif (str(ticket_status_id) in solve_ids_list):
-                
-                print(f"[Ticket {ticket_id}] Disparando Lógica SOLUCIONADO: '{rule.name}'")
-                all_errors = change_glpi_items_status(
-                    ticket_id=ticket_id,
-                    new_status_id=rule.target_asset_status_on_solve,
-                    config=config
-                    # O 'check_previous_status_id' FOI REMOVIDO
-                )
-            else:
-                print(f"[Ticket {ticket_id}] Status ID '{ticket_status_id}' não aciona ação para a regra '{rule.name}'. Ignorando.")
-
-        except Exception as e:
-            print(f"Erro GERAL ao processar lógica para Ticket {ticket_id}: {e}")
-            return HttpResponseServerError(f"Erro interno geral: {e}")
+        # 4. Decidir a ação da regra
+        solve_ids_list = [sid.strip() for sid in rule.trigger_solve_ids.split(',')]
 
-        # 5. Resposta ao Webhook
-        if all_errors:
-            print(f"[Ticket {ticket_id}] A automação falhou. Retornando 500 para o GLPI.")
-            return HttpResponseServerError(f"Falha na automação: {all_errors[0]}")
+        if ticket_status_id == rule.trigger_pending_id:
+            action = WebhookJob.ACTION_PENDING
+            target_status_id = rule.target_asset_status_on_pending
+        elif str(ticket_status_id) in solve_ids_list:
+            action = WebhookJob.ACTION_SOLVE
+            target_status_id = rule.target_asset_status_on_solve
         else:
-            print(f"[Ticket {ticket_id}] Automação concluída com sucesso.")
-            return JsonResponse({"status": "sucesso"}, status=200)
+            logger.info("[Ticket %s] Status ID '%s' não aciona ação para a regra '%s'. Ignorando.", ticket_id, ticket_status_id, rule.name)
+            return JsonResponse({"status": "ignorado", "motivo": "status sem ação"}, status=200)
+
+        # 5. Enfileirar e responder: a alteração dos ativos roda em segundo
+        # plano (apps.dbcom.jobs), com retentativas, sem segurar o GLPI.
+        try:
+            job, created = enqueue_webhook_job(
+                webhook=webhook,
+                rule=rule,
+                ticket_id=ticket_id,
+                ticket_status_id=ticket_status_id,
+                action=action,
+                target_status_id=target_status_id,
+            )
+        except Exception as e:
+            logger.error("[Ticket %s] Erro ao enfileirar a automação: %s", ticket_id, e)
+            return HttpResponseServerError(f"Erro interno ao enfileirar: {e}")
 
+        if not created:
+            logger.info("[Ticket %s] Evento repetido (job %s já cobre esta ação). Ignorando.", ticket_id, job.pk)
+            return JsonResponse({"status": "duplicado", "job_id": job.pk}, status=200)
 
+        logger.info("[Ticket %s] Automação '%s' enfileirada (job %s).", ticket_id, rule.name, job.pk)
+        return JsonResponse({"status": "enfileirado", "job_id": job.pk}, status=202)
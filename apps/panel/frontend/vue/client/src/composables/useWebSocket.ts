@@ -5,7 +5,7 @@
  */
 
 import { ref, computed } from 'vue'
-import type { WebSocketMessage, ClientIdentification } from '@/types/dashboard'
+import type { WebSocketMessage, ClientIdentification, TicketsData, TicketsDeltaData } from '@/types/dashboard'
 
 interface UseWebSocketOptions {
   url?: string
@@ -28,6 +28,82 @@ const settings = ref({
 })
 let reconnectTimeout: ReturnType<typeof setTimeout> | null = null
 
+// Snapshot local dos chamados, mantido a partir das mensagens tickets_delta
+const ticketsState = {
+  version: -1,
+  hash: '',
+  rows: new Map<string | number, any>(),
+  order: [] as Array<string | number>
+}
+
+// Serialização canônica idêntica a apps/panel/snapshots.py (chaves ordenadas, sem espaços)
+const canonicalJson = (value: any): string => {
+  if (value === null || typeof value !== 'object') {
+    return JSON.stringify(value)
+  }
+  if (Array.isArray(value)) {
+    return '[' + value.map(canonicalJson).join(',') + ']'
+  }
+  const keys = Object.keys(value).sort()
+  return '{' + keys.map((k) => JSON.stringify(k) + ':' + canonicalJson(value[k])).join(',') + '}'
+}
+
+let crcTable: number[] | null = null
+const crc32Hex = (text: string): string => {
+  if (!crcTable) {
+    crcTable = []
+    for (let n = 0; n < 256; n++) {
+      let c = n
+      for (let k = 0; k < 8; k++) {
+        c = c & 1 ? 0xedb88320 ^ (c >>> 1) : c >>> 1
+      }
+      crcTable.push(c >>> 0)
+    }
+  }
+  const bytes = new TextEncoder().encode(text)
+  let crc = 0xffffffff
+  for (let i = 0; i < bytes.length; i++) {
+    crc = crcTable[(crc ^ bytes[i]) & 0xff] ^ (crc >>> 8)
+  }
+  return ((crc ^ 0xffffffff) >>> 0).toString(16).padStart(8, '0')
+}
+
+const resetTicketsState = (msg: TicketsData) => {
+  ticketsState.version = msg.version ?? -1
+  ticketsState.hash = msg.hash ?? ''
+  ticketsState.rows = new Map(msg.data.map((t: any) => [t.id, t]))
+  ticketsState.order = msg.data.map((t: any) => t.id)
+}
+
+/**
+ * Aplica um delta ao snapshot local. Retorna a lista completa resultante,
+ * ou null se o delta não puder ser aplicado (versão ou hash divergentes).
+ */
+const applyTicketsDelta = (msg: TicketsDeltaData): any[] | null => {
+  if (msg.base_version !== ticketsState.version) {
+    return null
+  }
+
+  const rows = new Map(ticketsState.rows)
+  for (const id of msg.removed) rows.delete(id)
+  for (const ticket of msg.added) rows.set(ticket.id, ticket)
+  for (const change of msg.changed) {
+    rows.set(change.id, { ...rows.get(change.id), ...change.fields })
+  }
+  const order = msg.order ?? ticketsState.order
+  const list = order.map((id) => rows.get(id))
+
+  if (list.some((t) => t === undefined) || crc32Hex(canonicalJson(list)) !== msg.hash) {
+    return null
+  }
+
+  ticketsState.version = msg.version
+  ticketsState.hash = msg.hash
+  ticketsState.rows = rows
+  ticketsState.order = order
+  return list
+}
+
 // Gera ID único do cliente (persistente)
 const generateClientId = (): string => {
   const storageKey = 'glpi_panel_display_id'
@@ -103,6 +179,30 @@ export function useWebSocket(options: UseWebSocketOptions = {}) {
       ws.value.onmessage = (event) => {
         try {
           const message = JSON.parse(event.data) as WebSocketMessage
+
+          if (message.type === 'tickets_delta') {
+            const list = applyTicketsDelta(message)
+            if (list === null) {
+              // Snapshot local divergente: pede a lista completa ao servidor
+              console.warn('[WebSocket] Delta de chamados fora de sincronia. Solicitando resync...')
+              send({ type: 'request_resync', version: ticketsState.version, hash: ticketsState.hash })
+              return
+            }
+            // Entrega aos componentes no mesmo formato da mensagem completa
+            lastMessage.value = {
+              type: 'tickets_update',
+              data: list,
+              version: message.version,
+              hash: message.hash,
+              timestamp: message.timestamp
+            } as TicketsData
+            return
+          }
+
+          if (message.type === 'tickets_update' && Array.isArray(message.data)) {
+            resetTicketsState(message)
+          }
+
           lastMessage.value = message
           // console.log('[WebSocket] Mensagem recebida:', message.type)
 
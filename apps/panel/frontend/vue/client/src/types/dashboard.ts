@@ -27,6 +27,21 @@ export interface TicketsData {
     low: number
     total: number
   }
+  version?: number // Versão do snapshot no servidor
+  hash?: string // CRC32 do conteúdo (ver apps/panel/snapshots.py)
+  timestamp: string
+}
+
+// Atualização incremental em relação à versão 'base_version'
+export interface TicketsDeltaData {
+  type: 'tickets_delta'
+  base_version: number
+  version: number
+  added: Ticket[]
+  removed: Array<string | number>
+  changed: Array<{ id: string | number; fields: Record<string, any> }>
+  order?: Array<string | number> // Enviado apenas quando a ordem muda
+  hash: string
   timestamp: string
 }
 
@@ -115,6 +130,7 @@ export interface ClientIdentification {
 // ============ MENSAGENS WEBSOCKET ============
 export type WebSocketMessage =
   | TicketsData
+  | TicketsDeltaData
   | ProjectsData
   | DashboardData
   | NotificationAlert
@@ -0,0 +1,225 @@
+import json
+import uuid
+import asyncio
+import logging
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from apps.dbcom.glpi_queries import get_panel_data_incremental, newpanel_projects_data
+from apps.dbcom.kpis import collect_dashboard_kpis
+from apps.panel.models import DashboardSettings
+from apps.panel.snapshots import TicketSnapshot
+from datetime import datetime, date
+from decimal import Decimal
+
+
+logger = logging.getLogger(__name__)
+
+
+def _timestamp():
+    return datetime.utcnow().isoformat() + 'Z'
+
+
+def _dumps(payload):
+    return json.dumps(payload, default=str)
+
+
+# --- Montagem das mensagens (executadas uma vez por ciclo, não por display) ---
+
+def build_settings_message(settings_obj):
+    settings_payload = {
+        'fetch_interval_seconds': settings_obj.fetch_interval_seconds,
+        'notification_sound_url': settings_obj.notification_sound_url
+    }
+    return _dumps({
+        'type': 'settings_update',
+        'settings': settings_payload,
+        'timestamp': _timestamp()
+    })
+
+
+def build_panel_message(snapshot: TicketSnapshot):
+    """Mensagem completa (resync) com o estado atual do snapshot."""
+    return _dumps({
+        'type': 'tickets_update',
+        'data': snapshot.as_list(),
+        'version': snapshot.version,
+        'hash': snapshot.hash,
+        'timestamp': _timestamp()
+    })
+
+
+def build_panel_delta_message(delta):
+    """Mensagem incremental: apenas o que mudou desde 'base_version'."""
+    return _dumps(dict(delta, type='tickets_delta', timestamp=_timestamp()))
+
+
+def build_dashboard_kpi_message():
+    # As cinco queries de KPI rodam em paralelo no pool de conexões do GLPI
+    snapshot = collect_dashboard_kpis()
+    return _dumps({
+        'type': 'dashboard_update',
+        'kpis': snapshot.as_payload(),
+        'timestamp': _timestamp()
+    })
+
+
+def build_projects_message():
+    projects_data = newpanel_projects_data()
+
+    processed_data = []
+    for project in projects_data:
+        processed_project = {k: str(v) if isinstance(v, (Decimal, date)) else v for k, v in project.items()}
+        processed_data.append(processed_project)
+
+    return _dumps({
+        'type': 'projects_update',
+        'data': processed_data,
+        'timestamp': _timestamp()
+    })
+
+
+MESSAGE_BUILDERS = {
+    'dashboard_update': build_dashboard_kpi_message,
+    'projects_update': build_projects_message,
+}
+
+MESSAGE_TYPES = ('tickets_update',) + tuple(MESSAGE_BUILDERS)
+
+
+class PanelPoller:
+    """
+    Poller único por processo ASGI. Executa as queries do GLPI uma vez por
+    ciclo e distribui o resultado (já serializado) para todos os displays
+    conectados através de um grupo do Channels.
+
+    O nome do grupo é exclusivo deste processo: com vários processos
+    (ex: várias instâncias do daphne usando o mesmo Redis), cada poller
+    atende apenas os sockets do seu processo, sem duplicar mensagens.
+    """
+    def __init__(self):
+        self.group_name = f"panel_displays_{uuid.uuid4().hex}"
+        self.subscribers = set()
+        self.latest = {}  # tipo da mensagem -> texto JSON já serializado
+        self.settings_obj = None
+        self.tickets = TicketSnapshot()
+        self._task = None
+        self._locks = {}
+
+    def _lock_for(self, message_type):
+        # Um lock por tipo de mensagem garante "single-flight": se vários
+        # displays pedem o mesmo dado ao mesmo tempo, só uma query é feita.
+        if message_type not in self._locks:
+            self._locks[message_type] = asyncio.Lock()
+        return self._locks[message_type]
+
+    async def subscribe(self, channel_name):
+        await get_channel_layer().group_add(self.group_name, channel_name)
+        self.subscribers.add(channel_name)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def unsubscribe(self, channel_name):
+        self.subscribers.discard(channel_name)
+        await get_channel_layer().group_discard(self.group_name, channel_name)
+        if not self.subscribers and self._task is not None:
+            # Nenhum display conectado: para de consultar o GLPI
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            # Sem o poller, as mensagens guardadas envelhecem: o próximo
+            # display a conectar deve receber dados novos, não os do último ciclo
+            self.latest.clear()
+
+    async def get_settings(self, refresh=False):
+        if refresh or self.settings_obj is None:
+            self.settings_obj = await sync_to_async(DashboardSettings.objects.get_settings)()
+        return self.settings_obj
+
+    def _refresh_tickets(self):
+        """
+        Atualiza o snapshot dos chamados. Guarda a mensagem completa (para
+        novos displays e resyncs) e retorna apenas o delta para broadcast,
+        ou None se nada mudou.
+        """
+        delta = self.tickets.update(get_panel_data_incremental())
+        if delta is None and 'tickets_update' in self.latest:
+            return None
+        self.latest['tickets_update'] = build_panel_message(self.tickets)
+        if delta is None:
+            return None
+        return build_panel_delta_message(delta)
+
+    def _refresh_sync(self, message_type):
+        if message_type == 'tickets_update':
+            return self._refresh_tickets()
+        text = MESSAGE_BUILDERS[message_type]()
+        self.latest[message_type] = text
+        return text
+
+    async def refresh(self, message_type):
+        """
+        Executa a query do tipo informado (uma única vez, mesmo com chamadas
+        concorrentes) e retorna a mensagem a ser distribuída (None se não
+        houver mudanças a enviar).
+        """
+        lock = self._lock_for(message_type)
+        if lock.locked():
+            # Já existe uma busca em andamento: apenas espera o resultado dela
+            async with lock:
+                return None
+        async with lock:
+            return await sync_to_async(self._refresh_sync)(message_type)
+
+    async def get_latest(self, message_type):
+        """
+        Retorna a última mensagem do tipo informado, buscando-a se ainda não
+        existir. Retorna None se a busca falhar (o display recebe os dados no
+        próximo ciclo do poller).
+        """
+        if message_type not in self.latest:
+            try:
+                await self.refresh(message_type)
+            except Exception as e:
+                logger.exception("Error fetching '%s' for the panel: %s", message_type, e)
+        return self.latest.get(message_type)
+
+    async def broadcast(self, text):
+        await get_channel_layer().group_send(self.group_name, {
+            'type': 'panel.broadcast',
+            'text': text,
+        })
+
+    async def _run(self):
+        settings_data = await self.get_settings()
+        interval = settings_data.fetch_interval_seconds
+
+        while True:
+            try:
+                await asyncio.sleep(interval)
+
+                # Periodically re-fetch settings to check for changes
+                new_settings_data = await self.get_settings(refresh=True)
+                if new_settings_data.fetch_interval_seconds != interval or \
+                   new_settings_data.notification_sound_url != settings_data.notification_sound_url:
+
+                    settings_data = new_settings_data
+                    interval = new_settings_data.fetch_interval_seconds
+                    await self.broadcast(build_settings_message(settings_data))
+
+                for message_type in MESSAGE_TYPES:
+                    text = await self.refresh(message_type)
+                    if text is not None:
+                        await self.broadcast(text)
+
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.exception("Error in panel poller: %s", e)
+                await asyncio.sleep(interval or 30)  # Wait before retrying
+
+
+# Instância única por processo
+panel_poller = PanelPoller()
@@ -0,0 +1,80 @@
+import json
+import zlib
+
+
+def canonical_json(rows):
+    """
+    Serialização canônica (chaves ordenadas, sem espaços) usada no cálculo
+    do hash. O cliente (useWebSocket.ts) reproduz exatamente este formato.
+    """
+    return json.dumps(rows, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+
+
+def content_hash(rows):
+    """
+    Hash (CRC32 em hexadecimal) do conteúdo e da ordem das linhas.
+    """
+    return format(zlib.crc32(canonical_json(rows).encode('utf-8')) & 0xffffffff, '08x')
+
+
+class TicketSnapshot:
+    """
+    Último estado conhecido da lista de chamados do painel, versionado.
+
+    A cada atualização calcula a diferença em relação ao estado anterior,
+    indexada pelo 'id' do chamado: chamados adicionados, removidos e apenas
+    os campos alterados dos demais, além da nova ordem (se mudou).
+    """
+    key = 'id'
+
+    def __init__(self):
+        self.version = 0
+        self.rows = {}
+        self.order = []
+        self.hash = content_hash([])
+
+    def as_list(self):
+        return [self.rows[row_id] for row_id in self.order]
+
+    def update(self, rows):
+        """
+        Substitui o estado pelas linhas informadas.
+        Retorna o delta (dict) ou None se nada mudou.
+        """
+        # Normaliza os tipos (datetime, Decimal...) como o cliente vai recebê-los
+        rows = json.loads(json.dumps(rows, default=str))
+        new_rows = {row[self.key]: row for row in rows}
+        new_order = [row[self.key] for row in rows]
+
+        added = [new_rows[row_id] for row_id in new_order if row_id not in self.rows]
+        removed = [row_id for row_id in self.order if row_id not in new_rows]
+        changed = []
+        for row_id in new_order:
+            old = self.rows.get(row_id)
+            if old is None:
+                continue
+            new = new_rows[row_id]
+            if old != new:
+                fields = {k: v for k, v in new.items() if old.get(k) != v or k not in old}
+                changed.append({'id': row_id, 'fields': fields})
+
+        if not added and not removed and not changed and new_order == self.order:
+            return None
+
+        delta = {
+            'base_version': self.version,
+            'added': added,
+            'removed': removed,
+            'changed': changed,
+        }
+        if new_order != self.order:
+            delta['order'] = new_order
+
+        self.version += 1
+        self.rows = new_rows
+        self.order = new_order
+        self.hash = content_hash(rows)
+
+        delta['version'] = self.version
+        delta['hash'] = self.hash
+        return delta
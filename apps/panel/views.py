@@ -1,3 +1,4 @@
+import logging
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
@@ -7,6 +8,9 @@ from django.http import JsonResponse
 from apps.dbcom.glpi_queries import get_panel_data, tickets_resolved_today, tickets_open_today
 
 
+logger = logging.getLogger(__name__)
+
+
 def dashboard_page(request):
     """
     Renderiza a página HTML principal do painel.
@@ -53,7 +57,7 @@ def api_get_panel_data(request):
         return JsonResponse(response_data)
 
     except Exception as e:
-        print(f"Erro na API ao buscar dados do GLPI: {e}")
+        logger.error("Erro na API ao buscar dados do GLPI: %s", e)
         # Retorna um payload de erro consistente
         error_response = {
             'data': [],
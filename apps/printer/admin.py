@@ -1,6 +1,7 @@
 from django.contrib import admin
-from .models import EtiquetaLayout, PrintServer
+from .models import EtiquetaLayout, PrintServer, PrintJob
 from .forms import PrintServerAdminForm
+from .jobs import requeue_jobs
 
 
 @admin.register(PrintServer)
@@ -8,8 +9,9 @@ class PrintServerAdmin(admin.ModelAdmin):
     """
     Admin para o novo modelo de Servidor de Impressão.
     """
-    list_display = ('nome', 'endereco_servico', 'nome_impressora_padrao', 'ativo', 'atualizado_em')
-    list_filter = ('ativo',)
+    list_display = ('nome', 'endereco_servico', 'nome_impressora_padrao', 'ativo', 'em_pool', 'atualizado_em')
+    list_filter = ('ativo', 'em_pool')
+    filter_horizontal = ('layouts_suportados',)
     search_fields = ('nome', 'endereco_servico', 'nome_impressora_padrao')
     
     form = PrintServerAdminForm
@@ -17,14 +19,14 @@ class PrintServerAdmin(admin.ModelAdmin):
     # Organiza os campos no admin
     fieldsets = (
         (None, {
-            'fields': ('nome', 'ativo')
+            'fields': ('nome', 'ativo', 'em_pool')
         }),
         ('Detalhes da Conexão', {
             'fields': ('endereco_servico', 'api_key_input'),
             'description': 'Informações para conectar ao serviço de impressão do Windows.'
         }),
         ('Configuração da Impressora', {
-            'fields': ('nome_impressora_padrao',),
+            'fields': ('nome_impressora_padrao', 'layouts_suportados'),
             'description': 'Clique nos botões (que aparecerão abaixo após salvar) para buscar e definir a impressora.'
         }),
     )
@@ -59,4 +61,35 @@ class EtiquetaLayoutAdmin(admin.ModelAdmin):
         )
         css = {
             'all': ('printer/css/layout_editor.css',),
-        }
\ No newline at end of file
+        }
+
+
+@admin.register(PrintJob)
+class PrintJobAdmin(admin.ModelAdmin):
+    list_display = (
+        'id', 'status', 'total_etiquetas', 'etiquetas_enviadas', 'printer_name',
+        'layout', 'attempts', 'criado_por', 'created_at', 'total_latency_display',
+    )
+    list_filter = ('status', 'print_server', 'layout')
+    search_fields = ('printer_name', 'last_error')
+    date_hierarchy = 'created_at'
+    actions = ['requeue_selected']
+    exclude = ('etiquetas',)
+    readonly_fields = [f.name for f in PrintJob._meta.fields if f.name != 'etiquetas'] + ['total_latency_display']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description="Latência total")
+    def total_latency_display(self, obj):
+        if obj.total_latency is None:
+            return "-"
+        return f"{obj.total_latency.total_seconds():.1f}s"
+
+    @admin.action(description="Reenviar jobs selecionados (continua das etiquetas pendentes)")
+    def requeue_selected(self, request, queryset):
+        count = requeue_jobs(queryset)
+        self.message_user(request, f"{count} job(s) reenfileirado(s).")
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class PrinterConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.printer'
+
+    def ready(self):
+        # Recuperação dos jobs de impressão órfãos (ver core.workers.JobSweeper)
+        from core.workers import job_sweeper
+        from .models import PrintJob
+        job_sweeper.register('printing', PrintJob, 'apps.printer.jobs.recover_pending_jobs')
@@ -0,0 +1,305 @@
+import time
+import atexit
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+from .models import PrintServer
+
+
+logger = logging.getLogger(__name__)
+
+
+# Configuração padrão (pode ser sobrescrita em settings.PRINT_SERVERS)
+PRINT_SERVER_DEFAULTS = {
+    'CONNECT_TIMEOUT': 3,     # Segundos
+    'READ_TIMEOUT': 10,       # Teste de conexão e lista de impressoras
+    'PRINT_TIMEOUT': 30,      # Envio de um PDF (o serviço só responde após spoolar)
+    'PRINTERS_TTL': 300,      # Cache da lista de impressoras remotas (s)
+    'HEALTH_INTERVAL': 60,    # Intervalo da verificação em segundo plano (0 = desativada)
+}
+
+
+def get_print_server_settings():
+    server_settings = dict(PRINT_SERVER_DEFAULTS)
+    server_settings.update(getattr(settings, 'PRINT_SERVERS', {}) or {})
+    return server_settings
+
+
+class PrintServerError(Exception):
+    """
+    Falha na comunicação com o serviço de impressão. 'status_code' é o
+    status HTTP retornado (None se não houve resposta) e 'transient' indica
+    se vale tentar de novo (timeout, conexão, erro 5xx) ou não (4xx: chave
+    inválida, impressora inexistente...). 'not_connected' indica que a
+    falha foi ao abrir a conexão, antes de qualquer byte do pedido ser
+    enviado.
+    """
+    def __init__(self, message, status_code=None, transient=True, timeout=False, not_connected=False):
+        super().__init__(message)
+        self.status_code = status_code
+        self.transient = transient
+        self.timeout = timeout
+        self.not_connected = not_connected
+
+    @property
+    def is_connection_error(self):
+        """
+        O serviço não foi alcançado: o PDF certamente não foi entregue e pode
+        ir para outro servidor. Uma conexão que caiu depois do envio (reset,
+        RemoteDisconnected) não conta: o PDF pode já estar imprimindo.
+        """
+        return self.not_connected
+
+
+def _connection_not_established(exc):
+    """ ConnectionError do requests ocorrida ao abrir a conexão (recusada, DNS...). """
+    reason = exc.args[0] if exc.args else None
+    if isinstance(reason, MaxRetryError):
+        reason = reason.reason
+    return isinstance(reason, NewConnectionError)
+
+
+class PrintServerClient:
+    """
+    Cliente HTTP de um PrintServer: requests.Session com keep-alive, chave
+    de API descriptografada uma única vez e lista de impressoras em cache.
+    Criado e descartado pelo PrintServerClientRegistry (um por servidor).
+    """
+    def __init__(self, server: PrintServer):
+        self.pk = server.pk
+        self.nome = server.nome
+        self.base_url = server.endereco_servico.rstrip('/')
+        self.key = PrintServerClientRegistry.key(server)
+        self._server = server
+        self._api_key = None
+        self._printers = None
+        self._printers_at = 0.0
+        self._lock = threading.Lock()
+        self.health = {'ok': None, 'checked_at': None, 'latency_ms': None, 'error': None}
+        self.counters = {
+            'requests': 0, 'errors': 0, 'printers_hits': 0, 'printers_fetches': 0,
+            'pdfs_sent': 0, 'bytes_sent': 0,
+        }
+
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=4)
+        self.http.mount('https://', adapter)
+        self.http.mount('http://', adapter)
+
+    @property
+    def api_key(self):
+        # Fernet só é usado uma vez por versão do servidor (o registro troca o cliente ao salvar)
+        if self._api_key is None:
+            self._api_key = self._server.get_decrypted_api_key()
+        return self._api_key
+
+    def _count(self, counter):
+        with self._lock:
+            self.counters[counter] += 1
+
+    def _set_health(self, ok, latency_ms=None, error=None):
+        self.health = {
+            'ok': ok,
+            'checked_at': time.time(),
+            'latency_ms': round(latency_ms, 1) if latency_ms is not None else None,
+            'error': error,
+        }
+
+    @property
+    def healthy(self):
+        """ False apenas se a última comunicação/verificação falhou. """
+        return self.health['ok'] is not False
+
+    def request(self, method, path, read_timeout=None, **kwargs):
+        """
+        Faz a requisição ao serviço e retorna a resposta (status 200).
+        Levanta PrintServerError nas falhas; a saúde do servidor é
+        atualizada com o resultado.
+        """
+        server_settings = get_print_server_settings()
+        timeout = (server_settings['CONNECT_TIMEOUT'], read_timeout or server_settings['READ_TIMEOUT'])
+        try:
+            headers = {'X-API-Key': self.api_key}
+        except ValueError as e:
+            raise PrintServerError(f"Erro ao ler a chave de API do servidor '{self.nome}': {e}", transient=False)
+        started = time.perf_counter()
+        self._count('requests')
+        try:
+            response = self.http.request(method, f"{self.base_url}{path}", headers=headers, timeout=timeout, **kwargs)
+        except requests.exceptions.ConnectTimeout:
+            error = PrintServerError(
+                f"Timeout: Não foi possível conectar ao serviço de impressão em {self.base_url}.",
+                timeout=True, not_connected=True,
+            )
+        except requests.exceptions.Timeout:
+            error = PrintServerError("Timeout: O serviço de impressão demorou muito para responder.", timeout=True)
+        except requests.exceptions.ConnectionError as e:
+            if _connection_not_established(e):
+                error = PrintServerError(
+                    f"Erro de Conexão: Não foi possível conectar ao serviço de impressão em {self.base_url}.",
+                    not_connected=True,
+                )
+            else:
+                error = PrintServerError(f"Erro de Conexão: A conexão com o serviço de impressão em {self.base_url} foi interrompida: {e}")
+        except requests.exceptions.RequestException as e:
+            error = PrintServerError(f"Erro desconhecido ao enviar para o serviço: {e}")
+        else:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if response.status_code == 200:
+                self._set_health(True, elapsed_ms)
+                return response
+            error = PrintServerError(
+                f"Serviço de impressão retornou erro {response.status_code}. Resposta: {response.text}",
+                status_code=response.status_code,
+                transient=response.status_code >= 500,
+            )
+            # Um 4xx significa que o serviço está no ar (o problema é o pedido)
+            self._set_health(response.status_code < 500, elapsed_ms, None if response.status_code < 500 else str(error))
+            self._count('errors')
+            raise error
+
+        self._set_health(False, error=str(error))
+        self._count('errors')
+        raise error
+
+    def test(self):
+        """ Testa a conexão (GET /api/test) e retorna o JSON do serviço. """
+        return self.request('GET', '/api/test').json()
+
+    def printers(self, refresh=False):
+        """
+        Lista de impressoras do servidor (JSON de GET /api/printers), em
+        cache por PRINTERS_TTL segundos.
+        """
+        ttl = get_print_server_settings()['PRINTERS_TTL']
+        with self._lock:
+            if not refresh and self._printers is not None and time.monotonic() - self._printers_at < ttl:
+                self.counters['printers_hits'] += 1
+                return self._printers
+
+        printers = self.request('GET', '/api/printers').json()
+        with self._lock:
+            self._printers = printers
+            self._printers_at = time.monotonic()
+            self.counters['printers_fetches'] += 1
+        return printers
+
+    def print_pdf(self, pdf_bytes, printer_name):
+        """ Envia um PDF à impressora informada (POST /api/print). """
+        files = {'pdf_file': ('etiqueta.pdf', pdf_bytes, 'application/pdf')}
+        self.request(
+            'POST', '/api/print',
+            read_timeout=get_print_server_settings()['PRINT_TIMEOUT'],
+            data={'printer_name': printer_name},
+            files=files,
+        )
+        with self._lock:
+            self.counters['pdfs_sent'] += 1
+            self.counters['bytes_sent'] += len(pdf_bytes)
+
+    def probe(self):
+        try:
+            self.test()
+        except PrintServerError:
+            pass  # O resultado já fica registrado em self.health
+
+    def close(self):
+        self.http.close()
+
+    def stats(self):
+        with self._lock:
+            data = dict(self.counters)
+            data['printers_cached'] = self._printers is not None
+        data['nome'] = self.nome
+        data['endereco'] = self.base_url
+        data['health'] = dict(self.health)
+        return data
+
+
+class PrintServerClientRegistry:
+    """
+    Um PrintServerClient por servidor (por processo). O cliente é trocado
+    quando o PrintServer é salvo ('atualizado_em', endereço ou chave
+    mudaram) e descartado quando o servidor é excluído.
+
+    Uma thread em segundo plano verifica a saúde dos servidores já usados
+    a cada HEALTH_INTERVAL segundos.
+    """
+    def __init__(self):
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._probe_thread = None
+        self._stop = threading.Event()
+        atexit.register(self.close)
+
+    @staticmethod
+    def key(server):
+        return (server.pk, server.atualizado_em, server.endereco_servico, server.api_key)
+
+    def get(self, server: PrintServer):
+        key = self.key(server)
+        with self._lock:
+            client = self._clients.get(server.pk)
+            if client is not None and client.key == key:
+                return client
+            old, client = client, PrintServerClient(server)
+            self._clients[server.pk] = client
+        if old is not None:
+            old.close()
+        self._ensure_probe()
+        return client
+
+    def is_healthy(self, server_pk):
+        """ Servidores ainda sem cliente neste processo são considerados saudáveis. """
+        with self._lock:
+            client = self._clients.get(server_pk)
+        return client is None or client.healthy
+
+    def invalidate(self, sender=None, instance=None, **kwargs):
+        with self._lock:
+            client = self._clients.pop(instance.pk, None) if instance is not None else None
+        if client is not None:
+            client.close()
+
+    def _ensure_probe(self):
+        interval = get_print_server_settings()['HEALTH_INTERVAL']
+        if interval <= 0 or (self._probe_thread is not None and self._probe_thread.is_alive()):
+            return
+        with self._lock:
+            if self._probe_thread is None or not self._probe_thread.is_alive():
+                self._probe_thread = threading.Thread(
+                    target=self._probe_loop, args=(interval,), daemon=True, name='print-server-health'
+                )
+                self._probe_thread.start()
+
+    def _probe_loop(self, interval):
+        while not self._stop.wait(interval):
+            with self._lock:
+                clients = list(self._clients.values())
+            for client in clients:
+                client.probe()
+                if client.health['ok'] is False:
+                    logger.warning("Servidor de impressão '%s' indisponível: %s", client.nome, client.health['error'])
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            client.close()
+
+    def stats(self):
+        with self._lock:
+            clients = list(self._clients.values())
+        return {str(client.pk): client.stats() for client in clients}
+
+
+# Instância única por processo
+print_clients = PrintServerClientRegistry()
+
+post_save.connect(print_clients.invalidate, sender=PrintServer, dispatch_uid='print_clients_save')
+post_delete.connect(print_clients.invalidate, sender=PrintServer, dispatch_uid='print_clients_delete')
@@ -0,0 +1,148 @@
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Q, F, Sum, Count, Avg
+from django.utils import timezone
+from .models import PrintServer, PrintJob
+from .client import print_clients
+
+
+logger = logging.getLogger(__name__)
+
+
+DISPATCH_SINGLE = 'single'  # Tudo vai para o servidor 'ativo' (comportamento original)
+DISPATCH_POOL = 'pool'      # Servidor ativo + servidores 'em_pool', por menor fila
+
+
+class NoPrintServerAvailable(Exception):
+    """ Nenhum servidor de impressão pode receber o job. """
+
+
+def get_dispatch_mode():
+    return getattr(settings, 'PRINT_DISPATCH_MODE', DISPATCH_SINGLE) or DISPATCH_SINGLE
+
+
+def pool_servers(layout=None):
+    """
+    Servidores que podem receber jobs: o ativo e os marcados 'em_pool',
+    com impressora padrão definida e que suportam o layout (servidores sem
+    layouts_suportados aceitam todos).
+    """
+    servers = PrintServer.objects.filter(Q(ativo=True) | Q(em_pool=True)).exclude(nome_impressora_padrao='')
+    if layout is not None:
+        servers = servers.filter(Q(layouts_suportados=None) | Q(layouts_suportados=layout))
+    return list(servers.distinct())
+
+
+def outstanding_labels(server_pks):
+    """
+    Etiquetas ainda não enviadas dos jobs pendentes de cada servidor
+    (consulta no banco: vale para todos os processos).
+    """
+    rows = (
+        PrintJob.objects
+        .filter(status__in=PrintJob.ACTIVE_STATUSES, print_server__in=server_pks)
+        .values('print_server')
+        .annotate(pending=Sum(F('total_etiquetas') - F('etiquetas_enviadas')))
+    )
+    return {row['print_server']: row['pending'] or 0 for row in rows}
+
+
+def choose_server(layout, exclude=(), healthy_only=False):
+    """
+    Escolhe o servidor para um job com o layout informado.
+
+    Modo 'single': o servidor ativo. Modo 'pool': entre os servidores do
+    pool que suportam o layout, o com menos etiquetas pendentes; servidores
+    com a última comunicação falha só são usados se não houver outro. Em
+    empate, o servidor ativo tem preferência. Com 'healthy_only', os
+    servidores com a última comunicação falha ficam de fora.
+
+    Levanta NoPrintServerAvailable se nenhum servidor servir.
+    """
+    if get_dispatch_mode() != DISPATCH_POOL:
+        try:
+            server = PrintServer.objects.get(ativo=True)
+        except PrintServer.DoesNotExist:
+            raise NoPrintServerAvailable("Nenhum servidor de impressão está marcado como 'ativo' no admin.")
+        if not server.nome_impressora_padrao:
+            raise NoPrintServerAvailable(f"O servidor de impressão '{server.nome}' não tem uma impressora padrão selecionada.")
+        if server.pk in exclude or (healthy_only and not print_clients.is_healthy(server.pk)):
+            raise NoPrintServerAvailable("O servidor de impressão ativo está indisponível.")
+        return server
+
+    candidates = [server for server in pool_servers(layout) if server.pk not in exclude]
+    if healthy_only:
+        candidates = [server for server in candidates if print_clients.is_healthy(server.pk)]
+    if not candidates:
+        raise NoPrintServerAvailable(
+            "Nenhum servidor de impressão do pool (ativo ou 'em pool', com impressora padrão) suporta este layout."
+        )
+
+    pending = outstanding_labels([server.pk for server in candidates])
+    return min(candidates, key=lambda server: (
+        not print_clients.is_healthy(server.pk),
+        pending.get(server.pk, 0),
+        not server.ativo,
+        server.pk,
+    ))
+
+
+def failover_server(job):
+    """
+    Servidor alternativo e saudável para um job cujo servidor não respondeu
+    (apenas no modo 'pool'). Retorna None se não houver outro: com todos os
+    servidores fora do ar, o job segue o backoff em vez de alternar entre
+    eles.
+    """
+    if get_dispatch_mode() != DISPATCH_POOL:
+        return None
+    try:
+        return choose_server(job.layout, exclude={job.print_server_id}, healthy_only=True)
+    except NoPrintServerAvailable:
+        return None
+
+
+def get_dispatch_stats():
+    """
+    Vazão de cada servidor na última hora (jobs e etiquetas concluídos,
+    latência média), fila pendente e estado do cliente HTTP.
+    """
+    since = timezone.now() - timedelta(hours=1)
+    finished = (
+        PrintJob.objects
+        .filter(finished_at__gte=since)
+        .values('print_server')
+        .annotate(
+            jobs=Count('pk'),
+            succeeded=Count('pk', filter=Q(status=PrintJob.STATUS_SUCCESS)),
+            failed=Count('pk', filter=Q(status=PrintJob.STATUS_FAILED)),
+            labels=Sum('etiquetas_enviadas'),
+            avg_latency=Avg(F('finished_at') - F('created_at')),
+        )
+    )
+    last_hour = {row['print_server']: row for row in finished}
+    servers = pool_servers() if get_dispatch_mode() == DISPATCH_POOL else list(PrintServer.objects.filter(ativo=True))
+    pending = outstanding_labels([server.pk for server in servers])
+    client_stats = print_clients.stats()
+
+    data = {}
+    for server in servers:
+        row = last_hour.get(server.pk, {})
+        avg_latency = row.get('avg_latency')
+        data[str(server.pk)] = {
+            'nome': server.nome,
+            'impressora': server.nome_impressora_padrao,
+            'ativo': server.ativo,
+            'pending_labels': pending.get(server.pk, 0),
+            'last_hour': {
+                'jobs': row.get('jobs', 0),
+                'succeeded': row.get('succeeded', 0),
+                'failed': row.get('failed', 0),
+                'labels': row.get('labels') or 0,
+                'labels_per_minute': round((row.get('labels') or 0) / 60, 2),
+                'avg_latency_seconds': round(avg_latency.total_seconds(), 2) if avg_latency else None,
+            },
+            'client': client_stats.get(str(server.pk)),
+        }
+    return {'mode': get_dispatch_mode(), 'servers': data}
@@ -0,0 +1,235 @@
+import logging
+import threading
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from core.workers import WorkerPool, BOOT_ID, orphaned, adopt
+from .models import PrintJob
+from .layouts import LayoutError, layout_spec
+from .client import PrintServerError
+from .services import imprimir_em_lotes
+from .dispatch import failover_server, get_dispatch_stats
+
+
+logger = logging.getLogger(__name__)
+
+
+# Configuração padrão (pode ser sobrescrita em settings.PRINT_JOBS)
+JOB_DEFAULTS = {
+    'WORKERS': 2,           # Jobs imprimindo ao mesmo tempo (impressoras diferentes)
+    'MAX_ATTEMPTS': 5,      # Tentativas antes de marcar como 'failed'
+    'BACKOFF_BASE': 15,     # Espera (s) antes da 2ª tentativa; dobra a cada falha
+    'BACKOFF_MAX': 600,
+    'STALE_RUNNING': 1800,  # Job 'running' há mais tempo que isso é considerado perdido
+}
+
+
+def get_job_settings():
+    job_settings = dict(JOB_DEFAULTS)
+    job_settings.update(getattr(settings, 'PRINT_JOBS', {}) or {})
+    return job_settings
+
+
+print_pool = WorkerPool('printing', max_workers=get_job_settings()['WORKERS'])
+
+# Jobs da mesma impressora nunca rodam em paralelo, para que as etiquetas
+# não se misturem. Locks "listrados" por (servidor, impressora).
+_printer_locks = [threading.Lock() for _ in range(32)]
+
+
+def backoff_seconds(attempts):
+    job_settings = get_job_settings()
+    return min(job_settings['BACKOFF_BASE'] * 2 ** max(attempts - 1, 0), job_settings['BACKOFF_MAX'])
+
+
+def _printer_lock(job):
+    return _printer_locks[hash((job.print_server_id, job.printer_name)) % len(_printer_locks)]
+
+
+def _submit(job, delay=0):
+    print_pool.submit(run_print_job, job.pk, delay=delay)
+
+
+def enqueue_print_job(etiquetas, print_server, printer_name, layout, user=None):
+    """
+    Grava o job com os dados das etiquetas e o envia ao pool.
+    Retorna o PrintJob criado.
+    """
+    job = PrintJob.objects.create(
+        layout=layout,
+        print_server=print_server,
+        printer_name=printer_name,
+        etiquetas=[dict(etiqueta) for etiqueta in etiquetas],
+        total_etiquetas=len(etiquetas),
+        criado_por=user if user is not None and user.is_authenticated else None,
+        boot_id=BOOT_ID,
+        heartbeat_at=timezone.now(),
+    )
+    _submit(job)
+    return job
+
+
+def _finish(job, status, error=''):
+    job.status = status
+    job.last_error = error
+    job.finished_at = timezone.now()
+    job.next_attempt_at = None
+    job.save(update_fields=['status', 'last_error', 'finished_at', 'next_attempt_at'])
+
+
+def run_print_job(job_id):
+    """
+    Executa um job (chamado pelo pool). Só roda se conseguir "reservar" o
+    job (status queued/retry -> running). Em uma nova tentativa, as
+    etiquetas já enviadas ('etiquetas_enviadas') são puladas.
+    """
+    claimed = PrintJob.objects.filter(
+        pk=job_id, status__in=(PrintJob.STATUS_QUEUED, PrintJob.STATUS_RETRY)
+    ).update(
+        status=PrintJob.STATUS_RUNNING, started_at=timezone.now(), attempts=F('attempts') + 1,
+        boot_id=BOOT_ID, heartbeat_at=timezone.now(),
+    )
+    if not claimed:
+        return
+
+    job = PrintJob.objects.select_related('layout', 'print_server').get(pk=job_id)
+    if job.layout is None or job.print_server is None:
+        _finish(job, PrintJob.STATUS_FAILED, "O layout ou o servidor de impressão do job foi excluído.")
+        return
+
+    ja_enviadas = job.etiquetas_enviadas
+    restantes = job.etiquetas[ja_enviadas:]
+
+    def registrar_progresso(enviadas):
+        PrintJob.objects.filter(pk=job.pk).update(etiquetas_enviadas=ja_enviadas + enviadas)
+
+    with _printer_lock(job):
+        try:
+            if restantes:
+                imprimir_em_lotes(
+                    layout_spec(job.layout), restantes, job.print_server, job.printer_name,
+                    on_progress=registrar_progresso,
+                )
+        except LayoutError as e:
+            _finish(job, PrintJob.STATUS_FAILED, str(e))
+            return
+        except PrintServerError as e:
+            error, transient, connection_error = str(e), e.transient, e.is_connection_error
+        except Exception as e:
+            logger.exception("Erro inesperado no job de impressão %s: %s", job.pk, e)
+            error, transient, connection_error = f"Erro inesperado: {e}", True, False
+        else:
+            logger.info("Job de impressão %s concluído (%s etiquetas, tentativa %s).",
+                        job.pk, job.total_etiquetas, job.attempts)
+            _finish(job, PrintJob.STATUS_SUCCESS)
+            return
+
+    job.refresh_from_db(fields=['etiquetas_enviadas'])
+
+    if not transient or job.attempts >= get_job_settings()['MAX_ATTEMPTS']:
+        logger.error("Job de impressão %s falhou após %s tentativa(s): %s", job.pk, job.attempts, error)
+        _finish(job, PrintJob.STATUS_FAILED, error)
+        return
+
+    # Servidor fora do ar: no modo 'pool', o restante vai para outro servidor
+    # saudável; sem alternativa, segue o backoff normal
+    if connection_error:
+        alternativo = failover_server(job)
+        if alternativo is not None:
+            logger.warning("Job de impressão %s: servidor '%s' não respondeu; continuando em '%s'.",
+                           job.pk, job.print_server.nome, alternativo.nome)
+            job.print_server = alternativo
+            job.printer_name = alternativo.nome_impressora_padrao
+            job.status = PrintJob.STATUS_RETRY
+            job.last_error = error
+            job.save(update_fields=['print_server', 'printer_name', 'status', 'last_error'])
+            _submit(job)
+            return
+
+    delay = backoff_seconds(job.attempts)
+    logger.warning("Job de impressão %s falhou (tentativa %s, %s/%s etiquetas enviadas). Nova tentativa em %ss.",
+                   job.pk, job.attempts, job.etiquetas_enviadas, job.total_etiquetas, delay)
+    job.status = PrintJob.STATUS_RETRY
+    job.last_error = error
+    job.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+    job.save(update_fields=['status', 'last_error', 'next_attempt_at'])
+    _submit(job, delay=delay)
+
+
+def requeue_jobs(queryset):
+    """
+    Recoloca jobs na fila imediatamente (ação do admin), continuando das
+    etiquetas ainda não enviadas. Jobs em execução ou concluídos são
+    ignorados. Retorna quantos foram reenfileirados.
+    """
+    count = 0
+    for job in queryset.exclude(status__in=(PrintJob.STATUS_RUNNING, PrintJob.STATUS_SUCCESS)):
+        job.status = PrintJob.STATUS_QUEUED
+        job.next_attempt_at = None
+        job.finished_at = None
+        job.boot_id = BOOT_ID
+        job.heartbeat_at = timezone.now()
+        job.save(update_fields=['status', 'next_attempt_at', 'finished_at', 'boot_id', 'heartbeat_at'])
+        _submit(job)
+        count += 1
+    return count
+
+
+def recover_pending_jobs():
+    """
+    Assume e reenvia ao pool os jobs órfãos: pendentes de um processo que
+    morreu ou reiniciou (sem heartbeat recente) e os presos em 'running'
+    há mais de STALE_RUNNING. Executada periodicamente pelo
+    core.workers.job_sweeper, inclusive ao iniciar o processo. Um job
+    interrompido continua das etiquetas ainda não enviadas.
+    """
+    now = timezone.now()
+    stale_before = now - timedelta(seconds=get_job_settings()['STALE_RUNNING'])
+    PrintJob.objects.filter(
+        status=PrintJob.STATUS_RUNNING, started_at__lt=stale_before
+    ).update(status=PrintJob.STATUS_RETRY, next_attempt_at=now, boot_id='', heartbeat_at=None)
+
+    count = 0
+    pending = orphaned(PrintJob.objects.filter(status__in=PrintJob.ACTIVE_STATUSES))
+    for job in pending.only('pk', 'status', 'next_attempt_at'):
+        if job.status == PrintJob.STATUS_RUNNING:
+            # O processo morreu durante a impressão: continua de onde parou
+            changes = {'status': PrintJob.STATUS_RETRY, 'next_attempt_at': now}
+            delay = 0
+        else:
+            changes = {}
+            delay = (job.next_attempt_at - now).total_seconds() if job.next_attempt_at else 0
+        if adopt(PrintJob.objects.filter(status=job.status), job.pk, **changes):
+            _submit(job, delay=max(delay, 0))
+            count += 1
+    return count
+
+
+def serialize_job(job):
+    """ Estado do job no formato da API de status. """
+    return {
+        'id': job.pk,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'total_etiquetas': job.total_etiquetas,
+        'etiquetas_enviadas': job.etiquetas_enviadas,
+        'progress': job.progress,
+        'attempts': job.attempts,
+        'last_error': job.last_error,
+        'next_attempt_at': job.next_attempt_at,
+        'created_at': job.created_at,
+        'finished_at': job.finished_at,
+    }
+
+
+def get_job_stats():
+    """ Quantidade de jobs por status, contadores do pool e vazão por servidor. """
+    return {
+        'by_status': {
+            status: PrintJob.objects.filter(status=status).count()
+            for status, _ in PrintJob.STATUS_CHOICES
+        },
+        'pool': print_pool.stats(),
+        'dispatch': get_dispatch_stats(),
+    }
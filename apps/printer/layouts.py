@@ -0,0 +1,449 @@
+import logging
+import functools
+import threading
+from dataclasses import dataclass
+import qrcode
+from reportlab.lib.units import mm
+from reportlab.lib import colors
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen.pathobject import PDFPathObject
+from reportlab.platypus import Paragraph
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.enums import TA_LEFT, TA_CENTER, TA_RIGHT
+
+
+logger = logging.getLogger(__name__)
+
+
+ALIGNMENTS = {'center': TA_CENTER, 'right': TA_RIGHT}
+
+
+class LayoutError(ValueError):
+    """ Layout que não pode ser compilado (fonte inválida, layout vazio...). """
+
+
+# --- Fontes (registradas uma vez por processo) ---
+
+_fonts = {}  # nome no ReportLab -> caminho do .ttf registrado
+_fonts_lock = threading.Lock()
+
+
+def ensure_font(font_name, font_path):
+    """
+    Registra a fonte no ReportLab apenas se ainda não foi registrada com
+    este arquivo (um novo upload com o mesmo nome é registrado de novo).
+    """
+    with _fonts_lock:
+        if _fonts.get(font_name) == font_path:
+            return
+        pdfmetrics.registerFont(TTFont(font_name, font_path))
+        _fonts[font_name] = font_path
+
+
+def truncate_text(texto, font_name, font_size, width):
+    """ Corta o texto com '...' quando ele não cabe em uma única linha. """
+    text_width = pdfmetrics.stringWidth(texto, font_name, font_size)
+    if text_width <= width:
+        return texto
+    try:
+        avg_char_width = text_width / len(texto)
+        max_chars = max(int(width / avg_char_width) - 3, 1)
+        return texto[:max_chars] + "..."
+    except ZeroDivisionError:
+        return "..."
+
+
+# --- QR Codes (vetoriais, com cache das matrizes) ---
+
+QR_ERROR_LEVELS = {
+    'L': qrcode.constants.ERROR_CORRECT_L,
+    'M': qrcode.constants.ERROR_CORRECT_M,
+    'Q': qrcode.constants.ERROR_CORRECT_Q,
+    'H': qrcode.constants.ERROR_CORRECT_H,
+}
+
+QR_CACHE_SIZE = 4096
+
+
+@functools.lru_cache(maxsize=QR_CACHE_SIZE)
+def qr_path(payload, error_level='L'):
+    """
+    Codifica o payload e retorna (módulos, path): o QR Code como um único
+    path do ReportLab em coordenadas de módulo (0..módulos, y para cima),
+    com os módulos escuros de cada linha agrupados em retângulos.
+    O desenho só precisa de translate/scale, então reimprimir o mesmo
+    ativo não recodifica nada. O path não deve ser alterado por quem o usa.
+    """
+    qr = qrcode.QRCode(version=None, error_correction=QR_ERROR_LEVELS[error_level], border=0)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    matrix = qr.get_matrix()
+    modules = len(matrix)
+
+    path = PDFPathObject()
+    for r, row in enumerate(matrix):
+        y = modules - r - 1
+        col = 0
+        while col < modules:
+            if not row[col]:
+                col += 1
+                continue
+            start = col
+            while col < modules and row[col]:
+                col += 1
+            path.rect(start, y, col - start, 1)
+    return modules, path
+
+
+# --- Elementos compilados ---
+
+@dataclass(frozen=True)
+class TextElement:
+    x: float
+    y: float
+    width: float
+    height: float
+    data_key: str
+    custom_text: str
+    font_name: str
+    font_size: float
+    allow_wrap: bool
+    valign: str
+    has_background: bool
+    style: ParagraphStyle
+
+    @property
+    def is_static(self):
+        return self.data_key == 'custom'
+
+    def value(self, dados_etiqueta):
+        if self.is_static:
+            return self.custom_text
+        return dados_etiqueta.get(self.data_key, f'[{self.data_key}?]')
+
+    def draw(self, c, dados_etiqueta):
+        texto = self.value(dados_etiqueta)
+        if not self.is_static:
+            logger.debug("Texto da etiqueta (%s): %r", self.data_key, texto, extra={'sample': True})
+
+        if self.has_background:
+            c.setFillColor(colors.black)
+            c.rect(self.x, self.y, self.width, self.height, stroke=0, fill=1)
+
+        if not self.allow_wrap:
+            texto = truncate_text(texto, self.font_name, self.font_size, self.width)
+
+        p = Paragraph(texto, self.style)
+        actual_w, actual_h = p.wrapOn(c, self.width, self.height)
+
+        y_offset = 0  # 'bottom'
+        if self.valign == 'middle':
+            y_offset = (self.height - actual_h) / 2
+        elif self.valign == 'top':
+            y_offset = self.height - actual_h
+
+        c.saveState()
+        path = c.beginPath()
+        path.rect(self.x, self.y, self.width, self.height)
+        c.clipPath(path, stroke=0, fill=0)
+        p.drawOn(c, self.x, self.y + y_offset)
+        c.restoreState()
+
+
+@dataclass(frozen=True)
+class QrElement:
+    x: float
+    y: float
+    size: float
+    data_key: str
+    custom_text: str
+    has_background: bool
+    error_level: str = 'L'
+
+    @property
+    def is_static(self):
+        return self.data_key == 'custom'
+
+    def value(self, dados_etiqueta):
+        raw = self.custom_text if self.is_static else dados_etiqueta.get(self.data_key, '')
+        return str(raw).strip()
+
+    def draw(self, c, dados_etiqueta):
+        data_to_encode = self.value(dados_etiqueta)
+        logger.debug("QR Code da etiqueta: %r", data_to_encode, extra={'sample': True})
+
+        try:
+            modules, path = qr_path(data_to_encode, self.error_level)
+        except Exception as qr_error:
+            # Se falhar, desenha um placeholder de ERRO no PDF
+            logger.error("Erro ao gerar QR Code para %r: %s", data_to_encode, qr_error)
+            c.setFillColor(colors.red)
+            c.rect(self.x, self.y, self.size, self.size, stroke=1, fill=1)
+            c.setFillColor(colors.white)
+            c.setFont("Helvetica", 6)
+            c.drawCentredString(self.x + self.size / 2, self.y + self.size / 2 - 3, "QR-ERROR")
+            return
+
+        c.saveState()
+        if self.has_background:
+            # QR invertido: fundo preto e módulos brancos
+            c.setFillColor(colors.black)
+            c.rect(self.x, self.y, self.size, self.size, stroke=0, fill=1)
+            c.setFillColor(colors.white)
+        else:
+            c.setFillColor(colors.black)
+        c.translate(self.x, self.y)
+        c.scale(self.size / modules, self.size / modules)
+        c.drawPath(path, stroke=0, fill=1)
+        c.restoreState()
+
+
+def compile_element(elemento, font_name, altura):
+    """
+    Converte um elemento do 'layout_json' (medidas em mm, y a partir do
+    topo, como no editor) em um elemento compilado (pontos, y a partir da base).
+    """
+    el_x = elemento.get('x', 0) * mm
+    el_y_editor = elemento.get('y', 0) * mm
+    data_key = elemento.get('data_source', 'titulo')
+    has_background = elemento.get('has_background', False)
+
+    if elemento.get('type') == 'text':
+        el_w = elemento.get('width', 40) * mm
+        el_h = elemento.get('height', 8) * mm
+        font_size = elemento.get('font_size', 12)
+        allow_wrap = elemento.get('allow_wrap', False)
+        style = ParagraphStyle(
+            'label_text_unified',
+            fontName=font_name,
+            fontSize=font_size,
+            textColor=colors.white if has_background else colors.black,
+            wordWrap='break' if allow_wrap else 'clip',  # 'clip' para linha única
+            alignment=ALIGNMENTS.get(elemento.get('text_align', 'left'), TA_LEFT),
+            leading=font_size * 1.2  # Espaço entre linhas (para quebra)
+        )
+        return TextElement(
+            x=el_x,
+            y=altura - el_y_editor - el_h,
+            width=el_w,
+            height=el_h,
+            data_key=data_key,
+            custom_text=elemento.get('custom_text', ''),
+            font_name=font_name,
+            font_size=font_size,
+            allow_wrap=allow_wrap,
+            valign=elemento.get('text_valign', 'top'),
+            has_background=has_background,
+            style=style,
+        )
+
+    if elemento.get('type') == 'qrcode':
+        el_size = elemento.get('size', 25) * mm
+        error_level = str(elemento.get('error_correction', 'L')).upper()
+        return QrElement(
+            x=el_x,
+            y=altura - el_y_editor - el_size,
+            size=el_size,
+            data_key=elemento.get('data_source', 'url'),
+            custom_text=elemento.get('custom_text', ''),
+            has_background=has_background,
+            error_level=error_level if error_level in QR_ERROR_LEVELS else 'L',
+        )
+
+    return None  # Tipo desconhecido: ignorado, como antes
+
+
+# --- Plano de renderização ---
+
+@dataclass(frozen=True)
+class StaticForm:
+    """
+    Sequência de elementos fixos (texto/QR 'custom') desenhada uma única vez
+    por PDF como form XObject e apenas referenciada em cada etiqueta.
+    """
+    name: str
+    elements: tuple
+
+
+@dataclass(frozen=True)
+class LayoutPlan:
+    """
+    Layout compilado e imutável. As camadas mantêm a ordem do 'layout_json':
+    elementos fixos consecutivos viram um StaticForm; os variáveis são
+    desenhados a cada etiqueta.
+    """
+    key: tuple
+    nome: str
+    width: float
+    height: float
+    font_name: str
+    layers: tuple
+
+    @property
+    def forms(self):
+        return [layer for layer in self.layers if isinstance(layer, StaticForm)]
+
+    def new_canvas(self, buffer):
+        from reportlab.pdfgen import canvas
+        return canvas.Canvas(buffer, pagesize=(self.width, self.height))
+
+    def prepare_canvas(self, c):
+        """ Grava os form XObjects dos elementos fixos neste canvas. """
+        for form in self.forms:
+            c.beginForm(form.name)
+            for element in form.elements:
+                element.draw(c, {})
+            c.endForm()
+
+    def draw_label(self, c, dados_etiqueta):
+        for layer in self.layers:
+            if isinstance(layer, StaticForm):
+                c.doForm(layer.name)
+            else:
+                layer.draw(c, dados_etiqueta)
+        c.showPage()
+
+    def render(self, c, lista_de_etiquetas):
+        self.prepare_canvas(c)
+        for dados_etiqueta in lista_de_etiquetas:
+            self.draw_label(c, dados_etiqueta)
+
+
+@dataclass(frozen=True)
+class LayoutSpec:
+    """
+    Dados do EtiquetaLayout necessários para compilar o plano, apenas com
+    tipos simples: pode ser enviado a outros processos (ver rendering.py)
+    sem depender do ORM.
+    """
+    pk: int
+    nome: str
+    largura_mm: float
+    altura_mm: float
+    font_name: str
+    font_path: str
+    elements: tuple
+    updated: str = ''
+
+    @classmethod
+    def from_layout(cls, layout):
+        return cls(
+            pk=layout.pk,
+            nome=layout.nome,
+            largura_mm=layout.largura_mm,
+            altura_mm=layout.altura_mm,
+            font_name=layout.nome_fonte_reportlab,
+            font_path=layout.arquivo_fonte.path,
+            elements=tuple(layout.layout_json or ()),
+            updated=layout.atualizado_em.isoformat() if layout.atualizado_em else '',
+        )
+
+    @property
+    def key(self):
+        return (self.pk, self.updated, self.font_path)
+
+
+def layout_spec(layout):
+    """ LayoutSpec do model, com o erro de fonte sem arquivo como LayoutError. """
+    try:
+        return LayoutSpec.from_layout(layout)
+    except ValueError as e:
+        raise LayoutError(f"Erro ao carregar a fonte '{layout.nome_fonte_reportlab}': {e}.") from e
+
+
+def compile_layout(spec):
+    """
+    Compila um LayoutSpec em um LayoutPlan (registrando a fonte).
+    Levanta LayoutError se a fonte não puder ser carregada ou se o layout
+    estiver vazio.
+    """
+    try:
+        ensure_font(spec.font_name, spec.font_path)
+    except Exception as e:
+        raise LayoutError(f"Erro ao carregar a fonte '{spec.font_name}': {e}.") from e
+
+    if not spec.elements:
+        raise LayoutError(f"O layout '{spec.nome}' está vazio. Adicione elementos no editor do admin.")
+
+    altura = spec.altura_mm * mm
+    layers = []
+    static_run = []
+
+    def flush_static():
+        if static_run:
+            name = f"layout{spec.pk or 0}_{len(layers)}"
+            layers.append(StaticForm(name=name, elements=tuple(static_run)))
+            static_run.clear()
+
+    for elemento in spec.elements:
+        element = compile_element(elemento, spec.font_name, altura)
+        if element is None:
+            continue
+        if element.is_static:
+            static_run.append(element)
+        else:
+            flush_static()
+            layers.append(element)
+    flush_static()
+
+    return LayoutPlan(
+        key=spec.key,
+        nome=spec.nome,
+        width=spec.largura_mm * mm,
+        height=altura,
+        font_name=spec.font_name,
+        layers=tuple(layers),
+    )
+
+
+class LayoutPlanCache:
+    """
+    Cache (por processo) dos layouts compilados, indexado pelo pk.
+    Um plano é recompilado quando o layout é salvo de novo ('atualizado_em')
+    ou quando o arquivo da fonte muda.
+    """
+    def __init__(self):
+        self._plans = {}
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'compilations': 0}
+
+    def get(self, layout):
+        """ Plano do EtiquetaLayout (instância do model). """
+        return self.get_for_spec(layout_spec(layout))
+
+    def get_for_spec(self, spec):
+        if spec.pk is None:
+            return compile_layout(spec)
+
+        with self._lock:
+            plan = self._plans.get(spec.pk)
+            if plan is not None and plan.key == spec.key:
+                self.counters['hits'] += 1
+                return plan
+
+        plan = compile_layout(spec)
+        with self._lock:
+            self._plans[spec.pk] = plan
+            self.counters['compilations'] += 1
+        logger.info("Layout '%s' compilado (%d camadas, %d form(s) estático(s)).",
+                    plan.nome, len(plan.layers), len(plan.forms))
+        return plan
+
+    def invalidate(self, pk=None):
+        with self._lock:
+            if pk is None:
+                self._plans.clear()
+            else:
+                self._plans.pop(pk, None)
+
+    def stats(self):
+        with self._lock:
+            data = dict(self.counters, cached=len(self._plans))
+        qr_info = qr_path.cache_info()
+        data['qr_cache'] = {'hits': qr_info.hits, 'misses': qr_info.misses, 'size': qr_info.currsize}
+        return data
+
+
+# Instância única por processo
+layout_plans = LayoutPlanCache()
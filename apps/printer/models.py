@@ -1,4 +1,5 @@
 import os
+from django.conf import settings
 from django.db import models
 from django.db.models import JSONField
 from dotenv import load_dotenv
@@ -43,6 +44,18 @@ class PrintServer(models.Model):
         default=False,
         help_text="Define este como o servidor de impressão ativo para todas as impressões do sistema."
     )
+    em_pool = models.BooleanField(
+        default=False,
+        verbose_name="No pool de impressão",
+        help_text="No modo de distribuição 'pool' (PRINT_DISPATCH_MODE), este servidor também recebe jobs, junto com o ativo."
+    )
+    layouts_suportados = models.ManyToManyField(
+        'EtiquetaLayout',
+        blank=True,
+        related_name="print_servers",
+        verbose_name="Layouts suportados",
+        help_text="Layouts que a impressora deste servidor consegue imprimir (mídia/tamanho). Vazio = todos."
+    )
     
     criado_em = models.DateTimeField(auto_now_add=True)
     atualizado_em = models.DateTimeField(auto_now=True)
@@ -51,7 +64,10 @@ class PrintServer(models.Model):
         return self.nome
     
     def save(self, *args, **kwargs):
-        """ Garante que apenas um servidor de impressão possa ser 'ativo'. """
+        """
+        Garante que apenas um servidor de impressão possa ser 'ativo'.
+        Os demais podem participar da distribuição pelo campo 'em_pool'.
+        """
         if self.ativo:
             PrintServer.objects.filter(ativo=True).exclude(pk=self.pk).update(ativo=False)
         
@@ -153,4 +169,89 @@ class EtiquetaLayout(models.Model):
 
     class Meta:
         verbose_name = "Layout de Etiqueta"
-        verbose_name_plural = "Layouts de Etiqueta"
\ No newline at end of file
+        verbose_name_plural = "Layouts de Etiqueta"
+
+
+class PrintJob(models.Model):
+    """
+    Job de impressão de etiquetas. A API apenas grava o job e responde; a
+    renderização e o envio ao PrintServer são feitos em segundo plano
+    (apps.printer.jobs), com retentativas em falhas temporárias.
+
+    Guarda os dados das etiquetas (não o PDF): uma nova tentativa
+    renderiza de novo apenas as etiquetas que ainda não foram enviadas.
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_RETRY = 'retry'
+    STATUS_SUCCESS = 'success'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Na fila'),
+        (STATUS_RUNNING, 'Imprimindo'),
+        (STATUS_RETRY, 'Aguardando nova tentativa'),
+        (STATUS_SUCCESS, 'Concluído'),
+        (STATUS_FAILED, 'Falhou'),
+    ]
+    ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_RUNNING, STATUS_RETRY)
+
+    layout = models.ForeignKey(
+        EtiquetaLayout,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="jobs",
+        verbose_name="Layout",
+    )
+    print_server = models.ForeignKey(
+        PrintServer,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="jobs",
+        verbose_name="Servidor de Impressão",
+    )
+    printer_name = models.CharField("Impressora", max_length=255)
+    etiquetas = JSONField(default=list, help_text="Dados das etiquetas (titulo, url...) na ordem de impressão.")
+    total_etiquetas = models.PositiveIntegerField("Etiquetas", default=0)
+    etiquetas_enviadas = models.PositiveIntegerField("Enviadas", default=0)
+    criado_por = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="print_jobs",
+    )
+
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES, default=STATUS_QUEUED, db_index=True)
+    attempts = models.PositiveIntegerField("Tentativas", default=0)
+    last_error = models.TextField("Último erro", blank=True)
+
+    created_at = models.DateTimeField("Criado em", auto_now_add=True)
+    next_attempt_at = models.DateTimeField("Próxima tentativa", null=True, blank=True)
+    started_at = models.DateTimeField("Iniciado em", null=True, blank=True)
+    finished_at = models.DateTimeField("Finalizado em", null=True, blank=True)
+
+    # Processo que executa o job (core.workers.BOOT_ID) e seu último sinal de vida
+    boot_id = models.CharField(max_length=32, blank=True, editable=False)
+    heartbeat_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    @property
+    def progress(self):
+        """ Fração (0 a 1) das etiquetas já enviadas à impressora. """
+        if not self.total_etiquetas:
+            return 0.0
+        return round(self.etiquetas_enviadas / self.total_etiquetas, 3)
+
+    @property
+    def total_latency(self):
+        """ Tempo entre a criação do job e o fim da impressão. """
+        if self.finished_at and self.created_at:
+            return self.finished_at - self.created_at
+        return None
+
+    def __str__(self):
+        return f"Impressão #{self.pk} ({self.total_etiquetas} etiquetas) - {self.get_status_display()}"
+
+    class Meta:
+        verbose_name = "Job de Impressão"
+        verbose_name_plural = "Jobs de Impressão"
+        ordering = ['-created_at']
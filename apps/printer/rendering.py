@@ -0,0 +1,146 @@
+import io
+import atexit
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from .layouts import layout_plans
+
+
+logger = logging.getLogger(__name__)
+
+
+# Configuração padrão (pode ser sobrescrita em settings.LABEL_RENDERING)
+RENDER_DEFAULTS = {
+    'CHUNK_SIZE': 100,          # Etiquetas por PDF parcial
+    'PARALLEL_THRESHOLD': 200,  # A partir de quantas etiquetas o job é dividido
+    'PROCESSES': 2,             # Processos de renderização (0 = no próprio processo)
+    'MAX_IN_FLIGHT': 4,         # Lotes renderizados/aguardando envio ao mesmo tempo
+}
+
+
+# Pools quebrados recriados no máximo N vezes: processos que morrem ao
+# iniciar (ex: executável sem freeze_support) não devem ser recriados a cada job
+MAX_POOL_RESTARTS = 3
+
+
+def get_render_settings():
+    render_settings = dict(RENDER_DEFAULTS)
+    render_settings.update(getattr(settings, 'LABEL_RENDERING', {}) or {})
+    return render_settings
+
+
+def render_pdf(spec, lista_de_etiquetas):
+    """
+    Renderiza as etiquetas em um PDF (bytes) com o plano compilado do layout.
+    Também é a função executada nos processos do pool: recebe apenas dados
+    simples (LayoutSpec e dicts) e usa o cache de planos do próprio processo.
+    """
+    plan = layout_plans.get_for_spec(spec)
+    buffer = io.BytesIO()
+    c = plan.new_canvas(buffer)
+    plan.render(c, lista_de_etiquetas)
+    c.save()
+    return buffer.getvalue()
+
+
+class RenderPool:
+    """
+    Pool de processos (criado sob demanda) para renderizar os lotes de
+    etiquetas fora do processo web: ReportLab é Python puro e, em threads,
+    disputaria o GIL com as requisições.
+    """
+    def __init__(self):
+        self._executor = None
+        self._lock = threading.Lock()
+        self._restarts = 0
+        atexit.register(self.shutdown)
+
+    def get_executor(self):
+        processes = get_render_settings()['PROCESSES']
+        if processes <= 0 or self._restarts >= MAX_POOL_RESTARTS:
+            return None
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=processes)
+            return self._executor
+
+    def reset(self):
+        """ Descarta um pool quebrado (ex: processo morto); o próximo uso cria outro. """
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._restarts += 1
+            if self._restarts == MAX_POOL_RESTARTS:
+                logger.error("Pool de renderização de etiquetas quebrou %s vezes; desativado até reiniciar o servidor.",
+                             self._restarts)
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+# Instância única por processo
+render_pool = RenderPool()
+
+
+def split_chunks(lista_de_etiquetas, chunk_size):
+    return [lista_de_etiquetas[i:i + chunk_size] for i in range(0, len(lista_de_etiquetas), chunk_size)]
+
+
+def render_chunks(spec, lista_de_etiquetas):
+    """
+    Gera os PDFs parciais do job, na ordem das etiquetas, como tuplas
+    (quantidade de etiquetas, bytes do PDF).
+
+    Abaixo de PARALLEL_THRESHOLD gera um único PDF. Acima, divide em lotes
+    de CHUNK_SIZE renderizados no pool de processos, com no máximo
+    MAX_IN_FLIGHT lotes em memória: o próximo lote é submetido antes de
+    entregar o atual, então a renderização continua enquanto o lote
+    anterior é enviado à impressora.
+    """
+    render_settings = get_render_settings()
+    if len(lista_de_etiquetas) < render_settings['PARALLEL_THRESHOLD']:
+        yield len(lista_de_etiquetas), render_pdf(spec, lista_de_etiquetas)
+        return
+
+    chunks = split_chunks(lista_de_etiquetas, max(render_settings['CHUNK_SIZE'], 1))
+    executor = render_pool.get_executor()
+    if executor is None:
+        for chunk in chunks:
+            yield len(chunk), render_pdf(spec, chunk)
+        return
+
+    max_in_flight = max(render_settings['MAX_IN_FLIGHT'], 1)
+    pending = deque()
+    submitted = 0
+    delivered = 0
+    try:
+        while submitted < len(chunks) and len(pending) < max_in_flight:
+            pending.append(executor.submit(render_pdf, spec, chunks[submitted]))
+            submitted += 1
+        while pending:
+            try:
+                pdf_bytes = pending.popleft().result()
+            except BrokenProcessPool:
+                # O pool morreu: renderiza o restante neste processo
+                logger.error("Pool de renderização de etiquetas quebrado; continuando sem processos.")
+                render_pool.reset()
+                pending.clear()
+                for chunk in chunks[delivered:]:
+                    yield len(chunk), render_pdf(spec, chunk)
+                return
+            if submitted < len(chunks):
+                pending.append(executor.submit(render_pdf, spec, chunks[submitted]))
+                submitted += 1
+            delivered += 1
+            yield len(chunks[delivered - 1]), pdf_bytes
+    finally:
+        # Envio interrompido (erro na impressora): descarta os lotes pendentes
+        for future in pending:
+            future.cancel()
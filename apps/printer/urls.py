@@ -9,6 +9,8 @@ urlpatterns = [
 
     # Endpoint de Impressão
     path('imprimir/', views.imprimir_etiquetas_api, name='api_imprimir'),
+    path('imprimir/jobs/<int:pk>/', views.status_impressao_api, name='api_status_impressao'),
+    path('imprimir/jobs/stats/', views.print_job_stats_api, name='api_print_job_stats'),
     path('api/print_server/<int:pk>/test/', views.test_print_server_connection, name='api_test_print_server'),
     path('api/print_server/<int:pk>/fetch/', views.fetch_remote_printers, name='api_fetch_remote_printers'),
 ]
\ No newline at end of file
@@ -3,47 +3,38 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 
-from .models import EtiquetaLayout, PrintServer
+from .models import EtiquetaLayout, PrintServer, PrintJob
 from .serializers import EtiquetaLayoutListSerializer, EtiquetaLayoutUpdateSerializer, EtiquetaParaImprimirSerializer
-from .services import gerar_e_imprimir_etiquetas
+from .jobs import enqueue_print_job, serialize_job, get_job_stats
+from .client import PrintServerError, print_clients
+from .dispatch import NoPrintServerAvailable, choose_server
 
 from django.core.management import call_command
 from django.contrib import messages
 from django.shortcuts import redirect
+from django.urls import reverse
 from django.contrib.admin.views.decorators import staff_member_required
 import io
 from contextlib import redirect_stdout
 
-import requests
-
 
 @staff_member_required # Garante que apenas usuários do admin possam chamar
 @api_view(['GET'])
 def test_print_server_connection(request, pk):
     """
     View que o admin chama para testar a conexão com um PrintServer.
+    Usa o cliente persistente do servidor (ver client.py), que também
+    registra o resultado como estado de saúde.
     """
     try:
         server = PrintServer.objects.get(pk=pk)
     except PrintServer.DoesNotExist:
         return Response({"mensagem": "Servidor de impressão não encontrado."}, status=status.HTTP_404_NOT_FOUND)
 
-    url = f"{server.endereco_servico}/api/test"
-    headers = {'X-API-Key': server.get_decrypted_api_key()}
-
     try:
-        response = requests.get(url, headers=headers, timeout=5) # Timeout de 5s
-        
-        if response.status_code == 200:
-            return Response(response.json())
-        else:
-            msg = f"Serviço retornou erro {response.status_code}. Resposta: {response.text}"
-            return Response({"mensagem": msg}, status=response.status_code)
-            
-    except requests.exceptions.Timeout:
-        return Response({"mensagem": "Timeout: O serviço de impressão demorou muito para responder."}, status=status.HTTP_408_REQUEST_TIMEOUT)
-    except requests.exceptions.ConnectionError:
-        return Response({"mensagem": f"Erro de Conexão: Não foi possível conectar a {server.endereco_servico}."}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response(print_clients.get(server).test())
+    except PrintServerError as e:
+        return _print_server_error_response(e, status.HTTP_503_SERVICE_UNAVAILABLE)
     except Exception as e:
         return Response({"mensagem": f"Erro inesperado: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -53,28 +44,27 @@ def test_print_server_connection(request, pk):
 def fetch_remote_printers(request, pk):
     """
     View que o admin chama para buscar a lista de impressoras
-    de um PrintServer remoto.
+    de um PrintServer remoto. A lista fica em cache por alguns minutos;
+    '?refresh=1' força uma nova consulta ao servidor.
     """
     try:
         server = PrintServer.objects.get(pk=pk)
     except PrintServer.DoesNotExist:
         return Response({"mensagem": "Servidor de impressão não encontrado."}, status=status.HTTP_404_NOT_FOUND)
 
-    url = f"{server.endereco_servico}/api/printers"
-    headers = {'X-API-Key': server.get_decrypted_api_key()}
-
     try:
-        response = requests.get(url, headers=headers, timeout=10) # 10s para impressoras de rede
-        
-        if response.status_code == 200:
-            # Re-envia a resposta JSON do serviço de impressão
-            return Response(response.json())
-        else:
-            msg = f"Serviço retornou erro {response.status_code}. Resposta: {response.text}"
-            return Response({"mensagem": msg}, status=response.status_code)
-            
-    except requests.exceptions.RequestException as e:
-        return Response({"mensagem": f"Erro de conexão com o serviço: {str(e)}"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        # Re-envia a resposta JSON do serviço de impressão
+        return Response(print_clients.get(server).printers(refresh=request.GET.get('refresh') == '1'))
+    except PrintServerError as e:
+        return _print_server_error_response(e, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+def _print_server_error_response(error, default_status):
+    if error.status_code is not None:
+        return Response({"mensagem": str(error)}, status=error.status_code)
+    if error.timeout:
+        return Response({"mensagem": str(error)}, status=status.HTTP_408_REQUEST_TIMEOUT)
+    return Response({"mensagem": str(error)}, status=default_status)
 
 # --- Views para Layouts ---
 
@@ -159,31 +149,56 @@ def imprimir_etiquetas_api(request):
     except EtiquetaLayout.MultipleObjectsReturned:
          return Response({"status": "erro", "mensagem": "ERRO CRÍTICO: Mais de um layout de etiqueta está marcado como 'padrão'. Verifique o admin."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    # --- LÓGICA DE IMPRESSÃO (semelhante à anterior) ---
+    # --- LÓGICA DE IMPRESSÃO ---
     try:
-        # 1. Encontra o servidor de impressão ATIVO
-        server = PrintServer.objects.get(ativo=True)
-    except PrintServer.DoesNotExist:
-        return Response({"status": "erro", "mensagem": "Nenhum servidor de impressão está marcado como 'ativo' no admin."}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        # 1. Escolhe o servidor: o ATIVO ou, no modo 'pool', o com menos
+        # etiquetas pendentes entre os que suportam o layout
+        server = choose_server(layout)
+    except NoPrintServerAvailable as e:
+        return Response({"status": "erro", "mensagem": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
     except PrintServer.MultipleObjectsReturned:
         return Response({"status": "erro", "mensagem": "ERRO CRÍTICO: Mais de um servidor de impressão está 'ativo'. Verifique o admin."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    if not server.nome_impressora_padrao:
-        return Response({"status": "erro", "mensagem": f"O servidor de impressão '{server.nome}' não tem uma impressora padrão selecionada."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-    # 2. Chama o serviço
+    # 2. Coloca o job na fila de impressão e responde imediatamente;
+    # o progresso é consultado em 'status_url'
     dados_validados = serializer.validated_data
-    sucesso, mensagem = gerar_e_imprimir_etiquetas(
-        lista_de_etiquetas=dados_validados,
+    job = enqueue_print_job(
+        etiquetas=dados_validados,
         print_server=server,
         printer_name=server.nome_impressora_padrao,
-        layout=layout # Passando o layout para o serviço
+        layout=layout,
+        user=request.user,
     )
-    
-    if sucesso:
-        return Response({'status': 'sucesso', 'mensagem': mensagem})
-    else:
-        return Response({'status': 'erro', 'mensagem': mensagem}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    return Response({
+        'status': 'na_fila',
+        'mensagem': f"{job.total_etiquetas} etiqueta(s) na fila de impressão (job #{job.pk}).",
+        'job_id': job.pk,
+        'servidor': server.nome,
+        'status_url': reverse('api_status_impressao', args=[job.pk]),
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def status_impressao_api(request, pk):
+    """
+    Retorna o estado e o progresso de um job de impressão.
+    """
+    try:
+        job = PrintJob.objects.get(pk=pk)
+    except PrintJob.DoesNotExist:
+        return Response({'erro': 'Job de impressão não encontrado.'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(serialize_job(job))
+
+
+@staff_member_required
+@api_view(['GET'])
+def print_job_stats_api(request):
+    """
+    Jobs de impressão por status e estado do pool.
+    """
+    return Response(get_job_stats())
 
 
 @staff_member_required
@@ -6,7 +6,8 @@ from django.contrib import admin, messages
 from django.db.models import Count, Q
 from .models import (
     MotivoBaixa, LaudoBaixa, ItemLaudo, LaudoTecnico,
-    ProtocoloReparo, ItemReparo, ProtocoloReparoProxy, ConfiguracaoCabecalho
+    ProtocoloReparo, ItemReparo, ProtocoloReparoProxy, ConfiguracaoCabecalho,
+    ReportRenderJob
 )
 from .forms import LaudoBaixaForm, ProtocoloReparoForm
 
@@ -46,12 +47,9 @@ try:
 except ImportError:
     GLPI_REPORTS_UTILS_DISPONIVEL = False
 
-# --- Funções de SESSÃO (de dbcom.utils) (NOVO) ---
+# --- Sessão compartilhada da API legada (de dbcom.glpi_session) ---
 try:
-    from apps.dbcom.utils import (
-        get_legacy_session_token,
-        kill_legacy_session
-    )
+    from apps.dbcom.glpi_session import glpi_sessions
     GLPI_SESSION_UTILS_DISPONIVEL = True
 except ImportError:
     GLPI_SESSION_UTILS_DISPONIVEL = False
@@ -403,7 +401,6 @@ class ProtocoloReparoAdmin(admin.ModelAdmin):
         BATCH_SIZE = 10
         count_sucesso = 0
         count_falha_api = 0
-        session_token = None # Importante para o 'finally'
         
         try:
             # 1. Pega a Configuração da API do banco
@@ -411,11 +408,8 @@ class ProtocoloReparoAdmin(admin.ModelAdmin):
             if not config:
                 raise Exception("Configuração 'GLPIConfig' não encontrada no banco de dados.")
 
-            # 2. Inicia a Sessão da API
-            self.message_user(request, "Iniciando sessão na API do GLPI...", messages.INFO)
-            session_token, error = get_legacy_session_token(config)
-            if error:
-                raise Exception(f"Falha ao iniciar sessão: {error}")
+            # 2. Garante a sessão da API (reaproveitada entre execuções)
+            glpi_sessions.get_token(config)
             
             # 3. Busca TODOS os tickets pendentes (SQL)
             todos_chamados_sql = get_chamados_reparo_pendentes_sql()
@@ -429,7 +423,7 @@ class ProtocoloReparoAdmin(admin.ModelAdmin):
             
             if total_pendentes == 0:
                 self.message_user(request, "Nenhum chamado novo encontrado para importar.", messages.SUCCESS)
-                return # Não precisa do 'finally' porque a sessão será encerrada
+                return
 
             # 5. Pega o Lote
             lote_atual = chamados_novos[:BATCH_SIZE]
@@ -438,8 +432,8 @@ class ProtocoloReparoAdmin(admin.ModelAdmin):
             for ticket_data in lote_atual:
                 ticket_id = ticket_data['id']
                 try:
-                    # 7. API Calls (agora com config e session_token)
-                    item_details = get_glpi_item_details_api(config, session_token, ticket_id)
+                    # 7. API Calls (na sessão compartilhada)
+                    item_details = get_glpi_item_details_api(config, ticket_id)
                     
                     if not item_details:
                         count_falha_api += 1
@@ -489,12 +483,6 @@ class ProtocoloReparoAdmin(admin.ModelAdmin):
         except Exception as e:
             # Captura erros "grandes" (ex: falha no initSession, falha na query SQL)
             self.message_user(request, f"Erro inesperado durante a importação: {e}", messages.ERROR)
-        
-        finally:
-            # 11. Encerra a Sessão (SEMPRE)
-            if session_token:
-                self.message_user(request, "Encerrando sessão da API.", messages.INFO)
-                kill_legacy_session(config, session_token)
 
     def get_form(self, request, obj=None, **kwargs):
         # Garante a ordem dos campos no form de edição
@@ -564,3 +552,18 @@ class ConfiguracaoCabecalhoAdmin(admin.ModelAdmin):
             )
         
         return HttpResponseRedirect(url)
+
+
+@admin.register(ReportRenderJob)
+class ReportRenderJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'filename', 'kind', 'status', 'render_ms', 'criado_por', 'created_at', 'finished_at')
+    list_filter = ('status', 'kind')
+    search_fields = ('filename',)
+    date_hierarchy = 'created_at'
+    readonly_fields = [f.name for f in ReportRenderJob._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
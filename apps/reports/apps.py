@@ -7,3 +7,9 @@ class ReportsConfig(AppConfig):
     
     verbose_name = "Relatório"
     verbose_name_plural = "Relatórios"
+
+    def ready(self):
+        # Recuperação dos jobs de geração de PDF órfãos (ver core.workers.JobSweeper)
+        from core.workers import job_sweeper
+        from .models import ReportRenderJob
+        job_sweeper.register('reports', ReportRenderJob, 'apps.reports.jobs.recover_pending_jobs')
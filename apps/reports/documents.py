@@ -0,0 +1,178 @@
+import os
+import json
+import hashlib
+import datetime
+from dataclasses import dataclass
+from django.shortcuts import get_object_or_404
+from django.template.loader import get_template, render_to_string
+from .models import LaudoBaixa, MotivoBaixa, ProtocoloReparo, ConfiguracaoCabecalho
+from .rendering import html_to_pdf
+
+
+class ReportConfigError(Exception):
+    """ Dados de configuração necessários ao relatório não foram cadastrados. """
+
+
+class PdfRendererUnavailable(Exception):
+    """ WeasyPrint (ou suas dependências do GTK3) não está instalado. """
+
+
+def _field_values(obj):
+    """ Valores das colunas de um objeto (para o hash do conteúdo). """
+    if obj is None:
+        return None
+    return {field.attname: getattr(obj, field.attname) for field in obj._meta.concrete_fields}
+
+
+def _template_version(template_name):
+    """ mtime do arquivo do template: editar o layout invalida os PDFs em cache. """
+    try:
+        return os.path.getmtime(get_template(template_name).origin.name)
+    except (OSError, AttributeError, TypeError):
+        return None
+
+
+@dataclass
+class ReportDocument:
+    """
+    Um relatório pronto para ser renderizado: template, contexto, nome do
+    arquivo e os dados que definem o conteúdo ('key_parts'), dos quais sai
+    a chave do cache de PDFs.
+    """
+    kind: str
+    object_id: int
+    template: str
+    contexto: dict
+    filename: str
+    key_parts: tuple
+    size: int = 0  # Quantidade de itens (decide entre geração síncrona ou em segundo plano)
+
+    @property
+    def cache_key(self):
+        raw = json.dumps(
+            [self.kind, self.template, _template_version(self.template), self.key_parts],
+            sort_keys=True, default=str,
+        )
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def render_html(self):
+        return render_to_string(self.template, self.contexto)
+
+    def render_pdf(self, base_url, renderer=None):
+        """
+        Gera o PDF na thread atual (com o contexto do WeasyPrint já aquecido
+        deste processo) ou, com 'renderer' (ex: o pool de processos de
+        rendering.py), fora dela. O HTML é sempre montado aqui, onde há
+        acesso ao ORM.
+        """
+        try:
+            from weasyprint import HTML  # noqa: F401
+        except OSError:
+            raise PdfRendererUnavailable("Erro: WeasyPrint não está instalado corretamente. Dependências do GTK3 estão faltando.")
+        if renderer is not None:
+            return renderer.render(self.render_html(), base_url)
+        return html_to_pdf(self.render_html(), base_url)
+
+
+def _config():
+    config = ConfiguracaoCabecalho.objects.first()
+    if not config:
+        raise ReportConfigError("Erro: Configuração de Cabeçalho não encontrada no Admin.")
+    return config
+
+
+def laudo_baixa_document(laudo_id):
+    """ Laudo de Baixa Patrimonial, com a legenda apenas dos motivos usados. """
+    laudo = get_object_or_404(LaudoBaixa.objects.select_related('tecnico_responsavel'), pk=laudo_id)
+    itens = list(laudo.itens.all().select_related('motivo_baixa').order_by('nome_equipamento'))
+
+    motivos_usados_ids = {item.motivo_baixa_id for item in itens if item.motivo_baixa_id}
+    motivos_legenda = list(MotivoBaixa.objects.filter(id__in=motivos_usados_ids).order_by('codigo'))
+
+    config = _config()
+    data_hoje = datetime.date.today()
+
+    return ReportDocument(
+        kind='laudo',
+        object_id=laudo.pk,
+        template='reports/relatorio_laudo_baixa.html',
+        contexto={
+            'laudo': laudo,
+            'itens': itens,
+            'motivos_legenda': motivos_legenda,
+            'config': config,
+            'data_hoje': data_hoje,
+        },
+        filename=f"laudo_{laudo.numero_documento}.pdf",
+        size=len(itens),
+        key_parts=(
+            _field_values(laudo),
+            laudo.tecnico_nome_completo,
+            [_field_values(item) for item in itens],
+            [_field_values(motivo) for motivo in motivos_legenda],
+            _field_values(config),
+            # data_hoje fica fora: o template não a exibe, e incluí-la
+            # invalidaria o cache de todos os laudos a cada dia
+        ),
+    )
+
+
+def conferencia_laudo_document(laudo_id):
+    """ Folha de conferência de um Laudo de Baixa, com todos os motivos na legenda. """
+    laudo = get_object_or_404(LaudoBaixa.objects.select_related('tecnico_responsavel'), pk=laudo_id)
+    itens = list(laudo.itens.all().order_by('nome_equipamento'))
+    todos_motivos = list(MotivoBaixa.objects.all().order_by('codigo'))
+
+    return ReportDocument(
+        kind='conferencia',
+        object_id=laudo.pk,
+        template='reports/relatorio_conferencia_laudo.html',
+        contexto={
+            'laudo': laudo,
+            'itens': itens,
+            'todos_motivos': todos_motivos,
+        },
+        filename=f"conferencia_laudo_{laudo.numero_documento}.pdf",
+        size=len(itens),
+        key_parts=(
+            _field_values(laudo),
+            laudo.tecnico_nome_completo,
+            [_field_values(item) for item in itens],
+            [_field_values(motivo) for motivo in todos_motivos],
+        ),
+    )
+
+
+def protocolo_reparo_document(protocolo_id):
+    """ Protocolo de Envio para Reparo. """
+    protocolo = get_object_or_404(ProtocoloReparo.objects.select_related('tecnico_responsavel'), pk=protocolo_id)
+    itens = list(protocolo.itens.all().order_by('glpi_ticket_id'))
+    config = _config()
+
+    return ReportDocument(
+        kind='protocolo',
+        object_id=protocolo.pk,
+        template='reports/relatorio_protocolo_reparo.html',
+        contexto={
+            'protocolo': protocolo,
+            'itens': itens,
+            'config': config,
+            'total_itens': len(itens),
+        },
+        filename=f"protocolo_{protocolo.numero_documento}.pdf",
+        size=len(itens),
+        key_parts=(
+            _field_values(protocolo),
+            protocolo.tecnico_nome_completo,
+            [_field_values(item) for item in itens],
+            _field_values(config),
+        ),
+    )
+
+
+# Tipo do documento -> função que o monta a partir do pk (usado pelos jobs)
+DOCUMENT_BUILDERS = {
+    'laudo': laudo_baixa_document,
+    'conferencia': conferencia_laudo_document,
+    'protocolo': protocolo_reparo_document,
+}
@@ -0,0 +1,133 @@
+import time
+import logging
+from datetime import timedelta
+from django.http import Http404
+from django.utils import timezone
+from core.workers import WorkerPool, BOOT_ID, owner_alive_q, orphaned, adopt
+from .models import ReportRenderJob
+from .documents import DOCUMENT_BUILDERS, ReportConfigError, PdfRendererUnavailable
+from .pdf_cache import report_pdf_cache
+from .rendering import get_render_settings, report_render_pool
+
+
+logger = logging.getLogger(__name__)
+
+
+report_pool = WorkerPool('reports', max_workers=get_render_settings()['WORKERS'])
+
+
+def _submit(job):
+    report_pool.submit(run_report_job, job.pk)
+
+
+def enqueue_report_job(document, base_url, user=None):
+    """
+    Cria (ou reaproveita, se o mesmo conteúdo já está sendo gerado) um job
+    para gerar o PDF do documento em segundo plano. Retorna o job.
+    Jobs cujo processo morreu não são reaproveitados.
+    """
+    job = ReportRenderJob.objects.filter(
+        owner_alive_q(), cache_key=document.cache_key, status__in=ReportRenderJob.ACTIVE_STATUSES
+    ).order_by('-pk').first()
+    if job is not None:
+        return job
+
+    job = ReportRenderJob.objects.create(
+        kind=document.kind,
+        object_id=document.object_id,
+        cache_key=document.cache_key,
+        filename=document.filename,
+        base_url=base_url,
+        criado_por=user if user is not None and user.is_authenticated else None,
+        boot_id=BOOT_ID,
+        heartbeat_at=timezone.now(),
+    )
+    _submit(job)
+    return job
+
+
+def _finish(job, status, error='', render_ms=None):
+    job.status = status
+    job.last_error = error
+    job.render_ms = render_ms
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'last_error', 'render_ms', 'finished_at'])
+
+
+def run_report_job(job_id):
+    """
+    Executa um job (chamado pelo pool): monta o HTML nesta thread (ORM) e
+    converte em PDF no pool de processos do WeasyPrint. O PDF vai para o
+    cache, de onde a view o serve quando o navegador voltar.
+    """
+    claimed = ReportRenderJob.objects.filter(
+        pk=job_id, status=ReportRenderJob.STATUS_QUEUED
+    ).update(
+        status=ReportRenderJob.STATUS_RUNNING, started_at=timezone.now(),
+        boot_id=BOOT_ID, heartbeat_at=timezone.now(),
+    )
+    if not claimed:
+        return
+
+    job = ReportRenderJob.objects.get(pk=job_id)
+    started = time.perf_counter()
+    try:
+        document = DOCUMENT_BUILDERS[job.kind](job.object_id)
+        pdf_bytes = document.render_pdf(base_url=job.base_url, renderer=report_render_pool)
+    except (Http404, KeyError):
+        _finish(job, ReportRenderJob.STATUS_FAILED, "Documento não encontrado.")
+        return
+    except (ReportConfigError, PdfRendererUnavailable) as e:
+        _finish(job, ReportRenderJob.STATUS_FAILED, str(e))
+        return
+    except Exception as e:
+        logger.exception("Erro ao gerar o PDF do job %s (%s #%s): %s", job.pk, job.kind, job.object_id, e)
+        _finish(job, ReportRenderJob.STATUS_FAILED, f"Erro inesperado: {e}")
+        return
+
+    render_ms = int((time.perf_counter() - started) * 1000)
+    if document.cache_key != job.cache_key:
+        # O documento mudou enquanto estava na fila: o PDF gerado é o atual
+        job.cache_key = document.cache_key
+        job.save(update_fields=['cache_key'])
+    if report_pdf_cache.put(document.cache_key, pdf_bytes) is None:
+        _finish(job, ReportRenderJob.STATUS_FAILED, "Não foi possível gravar o PDF no cache (verifique REPORT_PDF_CACHE).", render_ms)
+        return
+
+    logger.info("PDF '%s' gerado em segundo plano em %sms.", job.filename, render_ms)
+    _finish(job, ReportRenderJob.STATUS_SUCCESS, render_ms=render_ms)
+
+
+def recover_pending_jobs():
+    """
+    Assume e reenvia ao pool os jobs órfãos: pendentes de um processo que
+    morreu ou reiniciou (sem heartbeat recente) e os presos em 'running'
+    há mais de STALE_RUNNING. Executada periodicamente pelo
+    core.workers.job_sweeper, inclusive ao iniciar o processo.
+    """
+    stale_before = timezone.now() - timedelta(seconds=get_render_settings()['STALE_RUNNING'])
+    ReportRenderJob.objects.filter(
+        status=ReportRenderJob.STATUS_RUNNING, started_at__lt=stale_before
+    ).update(status=ReportRenderJob.STATUS_QUEUED, boot_id='', heartbeat_at=None)
+
+    count = 0
+    pending = orphaned(ReportRenderJob.objects.filter(status__in=ReportRenderJob.ACTIVE_STATUSES))
+    for job in pending.only('pk', 'status'):
+        if adopt(ReportRenderJob.objects.filter(status=job.status), job.pk, status=ReportRenderJob.STATUS_QUEUED):
+            _submit(job)
+            count += 1
+    return count
+
+
+def serialize_job(job):
+    """ Estado do job no formato da API de status. """
+    return {
+        'id': job.pk,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'filename': job.filename,
+        'last_error': job.last_error,
+        'render_ms': job.render_ms,
+        'created_at': job.created_at,
+        'finished_at': job.finished_at,
+    }
@@ -378,3 +378,53 @@ class ConfiguracaoCabecalho(models.Model):
         return super(ConfiguracaoCabecalho, self).save(*args, **kwargs)
 
 
+class ReportRenderJob(models.Model):
+    """
+    Geração de um PDF de relatório grande em segundo plano
+    (apps.reports.jobs). O PDF pronto fica no cache de PDFs
+    (apps.reports.pdf_cache), na chave 'cache_key'.
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCESS = 'success'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Na fila'),
+        (STATUS_RUNNING, 'Gerando'),
+        (STATUS_SUCCESS, 'Pronto'),
+        (STATUS_FAILED, 'Falhou'),
+    ]
+    ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_RUNNING)
+
+    kind = models.CharField("Tipo", max_length=20)
+    object_id = models.PositiveIntegerField("ID do Documento")
+    cache_key = models.CharField("Chave do PDF", max_length=64, db_index=True)
+    filename = models.CharField("Arquivo", max_length=255)
+    base_url = models.CharField(max_length=500)
+    criado_por = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="report_render_jobs",
+    )
+
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES, default=STATUS_QUEUED, db_index=True)
+    last_error = models.TextField("Erro", blank=True)
+    render_ms = models.PositiveIntegerField("Tempo de geração (ms)", null=True, blank=True)
+
+    created_at = models.DateTimeField("Criado em", auto_now_add=True)
+    started_at = models.DateTimeField("Iniciado em", null=True, blank=True)
+    finished_at = models.DateTimeField("Finalizado em", null=True, blank=True)
+
+    # Processo que executa o job (core.workers.BOOT_ID) e seu último sinal de vida
+    boot_id = models.CharField(max_length=32, blank=True, editable=False)
+    heartbeat_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    def __str__(self):
+        return f"{self.filename} - {self.get_status_display()}"
+
+    class Meta:
+        verbose_name = "Geração de Relatório"
+        verbose_name_plural = "Gerações de Relatórios"
+        ordering = ['-created_at']
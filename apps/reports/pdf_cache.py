@@ -0,0 +1,162 @@
+import os
+import time
+import logging
+import threading
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+# Configuração padrão (pode ser sobrescrita em settings.REPORT_PDF_CACHE)
+PDF_CACHE_DEFAULTS = {
+    'ENABLED': True,
+    'DIR': os.path.join(settings.BASE_DIR, 'var', 'report_pdfs'),
+    'MAX_BYTES': 500 * 1024 * 1024,  # Acima disso, os PDFs usados há mais tempo são removidos
+    'MAX_AGE_DAYS': 30,              # PDFs não abertos há mais tempo são removidos
+    'EVICT_EVERY': 20,               # Verifica os limites a cada N gravações
+}
+
+
+def get_pdf_cache_settings():
+    cache_settings = dict(PDF_CACHE_DEFAULTS)
+    cache_settings.update(getattr(settings, 'REPORT_PDF_CACHE', {}) or {})
+    return cache_settings
+
+
+class ReportPdfCache:
+    """
+    Cache em disco dos PDFs de relatórios, indexado pelo hash do conteúdo
+    do documento (ver documents.ReportDocument.cache_key): se nada mudou,
+    o mesmo arquivo é servido sem rodar o WeasyPrint de novo. Um documento
+    alterado gera outro hash; o arquivo antigo sai pela remoção (LRU por
+    mtime, limites de tamanho total e de idade).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.counters = {'hits': 0, 'misses': 0, 'writes': 0, 'evicted': 0, 'errors': 0}
+
+    @property
+    def enabled(self):
+        return get_pdf_cache_settings()['ENABLED']
+
+    @property
+    def directory(self):
+        return get_pdf_cache_settings()['DIR']
+
+    def _count(self, counter, amount=1):
+        with self._lock:
+            self.counters[counter] += amount
+
+    def path_for(self, key):
+        # Subpasta pelos 2 primeiros caracteres para não acumular tudo em um diretório
+        return os.path.join(self.directory, key[:2], f"{key}.pdf")
+
+    def open(self, key):
+        """
+        Retorna o arquivo (aberto em modo binário) do PDF em cache, ou None.
+        O mtime é atualizado: ele é a referência de "último uso" da remoção.
+        """
+        if not self.enabled:
+            return None
+        path = self.path_for(key)
+        try:
+            handle = open(path, 'rb')
+        except FileNotFoundError:
+            self._count('misses')
+            return None
+        except OSError as e:
+            logger.error("Erro ao ler o PDF em cache '%s': %s", path, e)
+            self._count('errors')
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self._count('hits')
+        return handle
+
+    def put(self, key, pdf_bytes):
+        """
+        Grava o PDF (escrita atômica: arquivo temporário + rename).
+        Retorna o caminho, ou None se o cache estiver desativado ou falhar.
+        """
+        if not self.enabled:
+            return None
+        path = self.path_for(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(pdf_bytes)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error("Erro ao gravar o PDF em cache '%s': %s", path, e)
+            self._count('errors')
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return None
+
+        self._count('writes')
+        with self._lock:
+            self._writes += 1
+            evict_now = self._writes % max(get_pdf_cache_settings()['EVICT_EVERY'], 1) == 0
+        if evict_now:
+            self.evict()
+        return path
+
+    def _entries(self):
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.pdf'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self):
+        """
+        Remove os PDFs mais velhos que MAX_AGE_DAYS e, se o total passar de
+        MAX_BYTES, os usados há mais tempo. Retorna quantos foram removidos.
+        """
+        cache_settings = get_pdf_cache_settings()
+        oldest_allowed = time.time() - cache_settings['MAX_AGE_DAYS'] * 86400
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+
+        removed = 0
+        for mtime, size, path in entries:
+            if mtime >= oldest_allowed and total <= cache_settings['MAX_BYTES']:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue  # Em uso (Windows) ou já removido por outro processo
+            total -= size
+            removed += 1
+
+        if removed:
+            self._count('evicted', removed)
+            logger.info("%s PDF(s) de relatório removidos do cache.", removed)
+        return removed
+
+    def stats(self):
+        with self._lock:
+            data = dict(self.counters)
+        entries = self._entries() if self.enabled else []
+        data['files'] = len(entries)
+        data['bytes'] = sum(size for _, size, _ in entries)
+        data['enabled'] = self.enabled
+        return data
+
+
+# Instância única por processo
+report_pdf_cache = ReportPdfCache()
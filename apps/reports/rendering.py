@@ -0,0 +1,279 @@
+import os
+import atexit
+import logging
+import mimetypes
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from urllib.parse import urlsplit, unquote
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+# Configuração padrão (pode ser sobrescrita em settings.REPORT_RENDERING)
+RENDER_DEFAULTS = {
+    'PROCESSES': 2,         # Processos com o WeasyPrint carregado (0 = renderiza na thread do job)
+    'WORKERS': 2,           # Jobs de renderização ao mesmo tempo
+    'SYNC_MAX_ITEMS': 60,   # Documentos com até N itens são gerados na própria requisição
+    'STALE_RUNNING': 900,   # Job 'running' há mais tempo que isso é considerado perdido
+    'STYLESHEETS': (),      # Arquivos CSS comuns a todos os relatórios (parseados uma vez)
+    'ASSET_CACHE_MB': 16,   # Memória para logos/imagens/CSS lidos do disco
+}
+
+
+# Pools quebrados recriados no máximo N vezes: processos que morrem ao
+# iniciar (ex: executável sem freeze_support) não devem ser recriados a cada job
+MAX_POOL_RESTARTS = 3
+
+
+def get_render_settings():
+    render_settings = dict(RENDER_DEFAULTS)
+    render_settings.update(getattr(settings, 'REPORT_RENDERING', {}) or {})
+    return render_settings
+
+
+def _url_prefix(url):
+    """ Caminho de MEDIA_URL/STATIC_URL normalizado ('static/' -> '/static/'). """
+    path = urlsplit(url or '').path
+    if not path.startswith('/'):
+        path = '/' + path
+    if not path.endswith('/'):
+        path += '/'
+    return path
+
+
+@dataclass(frozen=True)
+class RenderAssets:
+    """
+    Onde ficam, no disco, os arquivos referenciados pelos relatórios. Só
+    dados simples: é enviado aos processos do pool, que não dependem do
+    Django configurado.
+    """
+    mounts: tuple           # ((prefixo da URL, (diretório, ...)), ...)
+    stylesheets: tuple      # Caminhos dos CSS comuns
+    cache_max_bytes: int
+
+    @classmethod
+    def from_settings(cls):
+        base_dir = str(getattr(settings, 'BASE_DIR', ''))
+        render_settings = get_render_settings()
+
+        static_dirs = []
+        if settings.STATIC_ROOT:
+            static_dirs.append(os.path.join(base_dir, settings.STATIC_ROOT))
+        for entry in getattr(settings, 'STATICFILES_DIRS', ()):
+            # Entradas com prefixo ('prefixo', 'caminho') ficam de fora
+            if isinstance(entry, (str, os.PathLike)):
+                static_dirs.append(os.path.join(base_dir, entry))
+
+        mounts = []
+        if settings.MEDIA_URL and settings.MEDIA_ROOT:
+            mounts.append((_url_prefix(settings.MEDIA_URL), (os.path.join(base_dir, settings.MEDIA_ROOT),)))
+        if settings.STATIC_URL and static_dirs:
+            mounts.append((_url_prefix(settings.STATIC_URL), tuple(static_dirs)))
+
+        return cls(
+            mounts=tuple(mounts),
+            stylesheets=tuple(os.path.join(base_dir, path) for path in render_settings['STYLESHEETS']),
+            cache_max_bytes=int(render_settings['ASSET_CACHE_MB']) * 1024 * 1024,
+        )
+
+
+class WeasyContext:
+    """
+    Estado do WeasyPrint reaproveitado entre os relatórios de um processo:
+
+    - FontConfiguration e os CSS comuns (já parseados), um par por thread,
+      já que o WeasyPrint não garante uso concorrente desses objetos;
+    - url_fetcher que lê de /media/ e /static/ direto do disco (com cache
+      em memória), em vez de o WeasyPrint buscar o logo do cabeçalho por
+      HTTP no próprio servidor.
+    """
+    def __init__(self, assets):
+        self.assets = assets
+        self._local = threading.local()
+        self._files = OrderedDict()  # caminho -> (mtime, bytes)
+        self._files_size = 0
+        self._lock = threading.Lock()
+
+    def _resolve(self, url, host):
+        """ Arquivo local de uma URL do próprio servidor (ou None). """
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or parts.netloc != host:
+            return None
+        path = unquote(parts.path)
+        for prefix, directories in self.assets.mounts:
+            if not path.startswith(prefix):
+                continue
+            relative = path[len(prefix):]
+            for directory in directories:
+                root = os.path.realpath(directory)
+                candidate = os.path.realpath(os.path.join(root, relative))
+                # Não deixa '../' sair do diretório publicado
+                if candidate.startswith(root + os.sep) and os.path.isfile(candidate):
+                    return candidate
+        return None
+
+    def read_file(self, path):
+        """ Conteúdo do arquivo, do cache em memória enquanto o mtime não mudar. """
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            cached = self._files.get(path)
+            if cached is not None and cached[0] == mtime:
+                self._files.move_to_end(path)
+                return cached[1]
+
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        max_bytes = self.assets.cache_max_bytes
+        if len(data) <= max_bytes // 4:
+            with self._lock:
+                previous = self._files.pop(path, None)
+                if previous is not None:
+                    self._files_size -= len(previous[1])
+                self._files[path] = (mtime, data)
+                self._files_size += len(data)
+                while self._files_size > max_bytes:
+                    _, (_, evicted) = self._files.popitem(last=False)
+                    self._files_size -= len(evicted)
+        return data
+
+    def url_fetcher(self, base_url):
+        """ url_fetcher do WeasyPrint para um relatório gerado em 'base_url'. """
+        from weasyprint import default_url_fetcher
+        host = urlsplit(base_url or '').netloc
+
+        def fetch(url, *args, **kwargs):
+            path = self._resolve(url, host) if host else None
+            if path is None:
+                return default_url_fetcher(url, *args, **kwargs)
+            mime_type, _ = mimetypes.guess_type(path)
+            return {
+                'string': self.read_file(path),
+                'mime_type': mime_type or 'application/octet-stream',
+                'redirected_url': url,
+                'filename': os.path.basename(path),
+            }
+        return fetch
+
+    def _thread_state(self):
+        mtimes = tuple(os.path.getmtime(path) for path in self.assets.stylesheets)
+        state = getattr(self._local, 'state', None)
+        if state is None:
+            try:
+                from weasyprint.text.fonts import FontConfiguration
+            except ImportError:  # WeasyPrint < 53
+                from weasyprint.fonts import FontConfiguration
+            state = self._local.state = {'font_config': FontConfiguration(), 'mtimes': None, 'stylesheets': []}
+        if state['mtimes'] != mtimes:
+            # Parseados de novo só quando algum arquivo muda
+            from weasyprint import CSS
+            state['stylesheets'] = [
+                CSS(string=self.read_file(path).decode('utf-8'), base_url=path, font_config=state['font_config'])
+                for path in self.assets.stylesheets
+            ]
+            state['mtimes'] = mtimes
+        return state
+
+    def warm_up(self):
+        self._thread_state()
+
+    def render(self, html_string, base_url):
+        from weasyprint import HTML
+        state = self._thread_state()
+        document = HTML(string=html_string, base_url=base_url, url_fetcher=self.url_fetcher(base_url))
+        return document.write_pdf(stylesheets=state['stylesheets'], font_config=state['font_config'])
+
+
+_context = None
+_context_lock = threading.Lock()
+
+
+def get_weasy_context():
+    """ Contexto do processo atual (nos processos do pool, criado por _warm_up). """
+    global _context
+    if _context is None:
+        with _context_lock:
+            if _context is None:
+                _context = WeasyContext(RenderAssets.from_settings())
+    return _context
+
+
+def _warm_up(assets):
+    # Importar o WeasyPrint (e carregar Pango/fontconfig), criar o
+    # FontConfiguration e parsear os CSS comuns custa mais que muitos PDFs
+    # pequenos: feito uma vez, ao iniciar cada processo.
+    global _context
+    _context = WeasyContext(assets)
+    try:
+        _context.warm_up()
+    except (OSError, ImportError) as e:
+        logger.error("WeasyPrint indisponível no processo de renderização: %s", e)
+
+
+def html_to_pdf(html_string, base_url):
+    """
+    Converte o HTML já renderizado em PDF (bytes). Executada nos processos
+    do pool: recebe apenas strings, sem depender do ORM.
+    """
+    return get_weasy_context().render(html_string, base_url)
+
+
+class ReportRenderPool:
+    """
+    Pool de processos (criado sob demanda) para o WeasyPrint, que é
+    CPU-bound e seguraria o GIL dos workers do waitress.
+    """
+    def __init__(self):
+        self._executor = None
+        self._lock = threading.Lock()
+        self._restarts = 0
+        atexit.register(self.shutdown)
+
+    def get_executor(self):
+        processes = get_render_settings()['PROCESSES']
+        if processes <= 0 or self._restarts >= MAX_POOL_RESTARTS:
+            return None
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=processes, initializer=_warm_up, initargs=(RenderAssets.from_settings(),)
+                )
+            return self._executor
+
+    def render(self, html_string, base_url):
+        """ Renderiza no pool (ou na thread atual, se desativado ou quebrado). """
+        executor = self.get_executor()
+        if executor is None:
+            return html_to_pdf(html_string, base_url)
+        try:
+            return executor.submit(html_to_pdf, html_string, base_url).result()
+        except BrokenProcessPool:
+            logger.error("Pool de renderização de relatórios quebrado; renderizando nesta thread.")
+            self.reset()
+            return html_to_pdf(html_string, base_url)
+
+    def reset(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._restarts += 1
+            if self._restarts == MAX_POOL_RESTARTS:
+                logger.error("Pool de renderização de relatórios quebrou %s vezes; desativado até reiniciar o servidor.",
+                             self._restarts)
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+# Instância única por processo
+report_render_pool = ReportRenderPool()
@@ -19,4 +19,9 @@ urlpatterns = [
         views.gerar_pdf_protocolo_reparo, 
         name='gerar_pdf_protocolo_reparo'
     ),
+    path(
+        'pdf/jobs/<int:job_id>/',
+        views.status_geracao_pdf,
+        name='status_geracao_pdf'
+    ),
 ]
\ No newline at end of file
@@ -1,27 +1,19 @@
 import requests
 from bs4 import BeautifulSoup, NavigableString
+from apps.dbcom.glpi_session import glpi_sessions
 
 
-def get_glpi_item_details_api(config, session_token, ticket_id):
+def get_glpi_item_details_api(config, ticket_id):
     """
     Busca os detalhes de um item associado a um ticket (fluxo de 2 API calls).
-    AGORA REQUER um session_token ativo.
+    Usa a sessão compartilhada da API legada (apps.dbcom.glpi_session).
     """
-    
-    # --- NOVO: Headers de Sessão ---
-    # Baseado na sua função kill_legacy_session
-    headers = {
-        'Content-Type': 'application/json',
-        'App-Token': config.glpi_app_token,
-        'Session-Token': session_token 
-    }
-    
     try:
         base_url = config.glpi_api_url # URL base vinda do DB
         
         # 1. API Call 1: Buscar o link do item
         url_link = f"{base_url}/Ticket/{ticket_id}/Item_Ticket/"
-        response_link = requests.get(url_link, headers=headers, timeout=10)
+        response_link = glpi_sessions.request(config, 'GET', url_link, timeout=10)
         response_link.raise_for_status() 
         
         data_link = response_link.json()
@@ -33,7 +25,7 @@ def get_glpi_item_details_api(config, session_token, ticket_id):
         item_href = item_link_info['links'][0]['href']
         
         # 2. API Call 2: Buscar os detalhes do item usando o href
-        response_item = requests.get(item_href, headers=headers, timeout=10)
+        response_item = glpi_sessions.request(config, 'GET', item_href, timeout=10)
         response_item.raise_for_status()
         
         item_data = response_item.json()
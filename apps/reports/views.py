@@ -1,61 +1,71 @@
-from django.http import HttpResponse
-from django.shortcuts import get_object_or_404
-from django.template.loader import render_to_string
-# REMOVA A LINHA ABAIXO DO TOPO DO ARQUIVO:
-# from weasyprint import HTML 
-from .models import LaudoBaixa, MotivoBaixa, ProtocoloReparo, ConfiguracaoCabecalho
-import datetime
+from django.http import HttpResponse, FileResponse, JsonResponse
+from django.shortcuts import get_object_or_404, render
+from django.urls import reverse
+from .documents import (
+    ReportConfigError,
+    PdfRendererUnavailable,
+    laudo_baixa_document,
+    conferencia_laudo_document,
+    protocolo_reparo_document,
+)
+from .pdf_cache import report_pdf_cache
+from .rendering import get_render_settings
+from .jobs import enqueue_report_job, serialize_job
+from .models import ReportRenderJob
+
+
+def _pdf_response(request, document):
+    """
+    Responde com o PDF do documento. Se o conteúdo (documento, itens e
+    cabeçalho) não mudou desde a última geração, o arquivo em cache é
+    servido direto, sem rodar o WeasyPrint.
+
+    Documentos pequenos são gerados na própria requisição; os grandes
+    (mais de SYNC_MAX_ITEMS itens) vão para um job em segundo plano e o
+    navegador recebe uma página que acompanha o job e recarrega o PDF.
+    O job entrega o PDF pelo cache: com o cache desativado, todos os
+    documentos são gerados na requisição.
+    """
+    key = document.cache_key
+    cached = report_pdf_cache.open(key)
+    if cached is not None:
+        response = FileResponse(cached, content_type='application/pdf')
+    elif report_pdf_cache.enabled and document.size > get_render_settings()['SYNC_MAX_ITEMS']:
+        return _pending_response(request, document)
+    else:
+        try:
+            pdf_file = document.render_pdf(base_url=request.build_absolute_uri())
+        except PdfRendererUnavailable as e:
+            return HttpResponse(str(e), status=500)
+        report_pdf_cache.put(key, pdf_file)
+        response = HttpResponse(pdf_file, content_type='application/pdf')
+
+    response['Content-Disposition'] = f'inline; filename="{document.filename}"'
+    response['ETag'] = f'"{key}"'
+    return response
+
+
+def _pending_response(request, document):
+    job = enqueue_report_job(document, base_url=request.build_absolute_uri(), user=request.user)
+    status_url = reverse('reports:status_geracao_pdf', args=[job.pk])
+    if 'application/json' in request.headers.get('Accept', ''):
+        return JsonResponse(dict(serialize_job(job), status_url=status_url, pdf_url=request.get_full_path()), status=202)
+    return render(request, 'reports/gerando_pdf.html', {
+        'job': job,
+        'status_url': status_url,
+        'pdf_url': request.get_full_path(),
+    }, status=202)
 
 
 def gerar_pdf_laudo_baixa(request, laudo_id):
     """
     Gera um PDF para um Laudo de Baixa Patrimonial específico.
     """
-    
-    # ADICIONE A LINHA DE IMPORTAÇÃO AQUI DENTRO:
     try:
-        from weasyprint import HTML
-    except OSError:
-        return HttpResponse("Erro: WeasyPrint não está instalado corretamente. Dependências do GTK3 estão faltando.", status=500)
-
-    # 1. Buscar os dados principais
-    laudo = get_object_or_404(LaudoBaixa, pk=laudo_id)
-    
-    # 2. Buscar os itens relacionados
-    # (O resto da sua view continua exatamente igual...)
-    itens = laudo.itens.all().prefetch_related('motivo_baixa').order_by('nome_equipamento')
-    
-    # 3. Buscar a legenda
-    motivos_usados_ids = itens.values_list('motivo_baixa_id', flat=True).distinct()
-    motivos_legenda = MotivoBaixa.objects.filter(id__in=motivos_usados_ids).order_by('codigo')
-
-
-    config = ConfiguracaoCabecalho.objects.first()
-    if not config:
-        return HttpResponse("Erro: Configuração de Cabeçalho não encontrada no Admin.", status=500)
-
-    contexto = {
-        'laudo': laudo,
-        'itens': itens,
-        'motivos_legenda': motivos_legenda,
-        'config': config,
-        'data_hoje': datetime.date.today(),
-    }
-
-    # 5. Renderizar o HTML
-    html_string = render_to_string(
-        'reports/relatorio_laudo_baixa.html', 
-        contexto
-    )
-
-    # 6. Gerar o PDF
-    pdf_file = HTML(string=html_string, base_url=request.build_absolute_uri()).write_pdf()
-
-    # 7. Retornar a resposta
-    response = HttpResponse(pdf_file, content_type='application/pdf')
-    response['Content-Disposition'] = f'inline; filename="laudo_{laudo.numero_documento}.pdf"'
-    
-    return response
+        document = laudo_baixa_document(laudo_id)
+    except ReportConfigError as e:
+        return HttpResponse(str(e), status=500)
+    return _pdf_response(request, document)
 
 
 def gerar_pdf_conferencia_laudo(request, laudo_id):
@@ -63,82 +73,23 @@ def gerar_pdf_conferencia_laudo(request, laudo_id):
     Gera uma folha de conferência para um Laudo de Baixa,
     listando todos os itens e uma legenda de motivos.
     """
-    try:
-        from weasyprint import HTML
-    except OSError:
-        return HttpResponse("Erro: WeasyPrint não está instalado corretamente. Dependências do GTK3 estão faltando.", status=500)
-
-    # 1. Buscar o laudo
-    laudo = get_object_or_404(LaudoBaixa, pk=laudo_id)
-    
-    # 2. Buscar os itens do laudo
-    itens = laudo.itens.all().order_by('nome_equipamento')
-    
-    # 3. Buscar TODOS os motivos de baixa para a legenda
-    todos_motivos = MotivoBaixa.objects.all().order_by('codigo')
-
-    # 4. Contexto para o template
-    contexto = {
-        'laudo': laudo,
-        'itens': itens,
-        'todos_motivos': todos_motivos,
-    }
-
-    # 5. Renderizar o HTML com o novo template
-    html_string = render_to_string(
-        'reports/relatorio_conferencia_laudo.html', 
-        contexto
-    )
-
-    # 6. Gerar o PDF
-    pdf_file = HTML(string=html_string, base_url=request.build_absolute_uri()).write_pdf()
-
-    # 7. Retornar a resposta
-    response = HttpResponse(pdf_file, content_type='application/pdf')
-    response['Content-Disposition'] = f'inline; filename="conferencia_laudo_{laudo.numero_documento}.pdf"'
-    
-    return response
+    return _pdf_response(request, conferencia_laudo_document(laudo_id))
 
 
 def gerar_pdf_protocolo_reparo(request, protocolo_id):
     """
     Gera um PDF para um Protocolo de Envio para Reparo.
     """
-    # 1. Buscar os dados
-    protocolo = get_object_or_404(ProtocoloReparo, pk=protocolo_id)
-    
-    # 2. Buscar os itens relacionados
-    #    Usamos 'select_related' para otimizar, mas 'itens' já está pré-buscado
-    itens = protocolo.itens.all().order_by('glpi_ticket_id')
-
-    config = ConfiguracaoCabecalho.objects.first()
-    if not config:
-        return HttpResponse("Erro: Configuração de Cabeçalho não encontrada no Admin.", status=500)
-
-    # 4. Contexto para o template
-    contexto = {
-        'protocolo': protocolo,
-        'itens': itens,
-        'config': config,
-        'total_itens': itens.count(),
-    }
-
-    # 5. Renderizar o HTML
-    html_string = render_to_string(
-        'reports/relatorio_protocolo_reparo.html', 
-        contexto
-    )
-
-    # 6. Gerar o PDF (com importação 'lazy')
     try:
-        from weasyprint import HTML
-    except OSError:
-        return HttpResponse("Erro: WeasyPrint (GTK3) não instalado no servidor.", status=500)
+        document = protocolo_reparo_document(protocolo_id)
+    except ReportConfigError as e:
+        return HttpResponse(str(e), status=500)
+    return _pdf_response(request, document)
 
-    pdf_file = HTML(string=html_string, base_url=request.build_absolute_uri()).write_pdf()
 
-    # 7. Retornar a resposta
-    response = HttpResponse(pdf_file, content_type='application/pdf')
-    response['Content-Disposition'] = f'inline; filename="protocolo_{protocolo.numero_documento}.pdf"'
-    
-    return response
+def status_geracao_pdf(request, job_id):
+    """
+    Estado de um job de geração de PDF (consultado pela página de espera).
+    """
+    job = get_object_or_404(ReportRenderJob, pk=job_id)
+    return JsonResponse(serialize_job(job))
@@ -14,6 +14,11 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 django_asgi_app = get_asgi_application()
 
+# Recupera os jobs em segundo plano deixados por um processo anterior e
+# mantém o heartbeat dos jobs deste processo
+from core.workers import job_sweeper  # noqa: E402
+job_sweeper.start()
+
 # Now it's safe to import Channels and other Django-dependent parts
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
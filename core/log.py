@@ -0,0 +1,70 @@
+import json
+import queue
+import atexit
+import logging
+import itertools
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+
+class AsyncStreamHandler(QueueHandler):
+    """
+    Handler que apenas coloca o registro em uma fila; a escrita no stream
+    (stdout/stderr) é feita por uma thread separada (QueueListener).
+    Assim, com vários workers do waitress/daphne, quem loga não fica
+    esperando o stdout.
+
+    Uso no settings.LOGGING:
+        'handlers': {'console': {'()': 'core.log.AsyncStreamHandler', 'formatter': 'text'}}
+    """
+    def __init__(self, stream=None):
+        super().__init__(queue.SimpleQueue())
+        self.target = logging.StreamHandler(stream)
+        self.target.setFormatter(logging.Formatter('%(message)s'))
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+        atexit.register(self.listener.stop)
+        # QueueHandler.prepare() já formata o registro com o formatter deste
+        # handler antes de enfileirar: a thread do listener só escreve o texto.
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Uma linha JSON por evento: horário, nível, logger, mensagem e os
+    campos passados em 'extra'.
+    """
+    RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in self.RESERVED and not key.startswith('_'):
+                data[key] = value
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Deixa passar apenas 1 a cada 'rate' eventos marcados com
+    extra={'sample': True} (eventos por item, ex: cada etiqueta ou cada
+    ativo). Os demais eventos não são afetados.
+    """
+    def __init__(self, rate=100):
+        super().__init__()
+        self.rate = max(int(rate), 1)
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if not getattr(record, 'sample', False):
+            return True
+        with self._lock:
+            counter = self._counters.setdefault(record.name, itertools.count())
+            return next(counter) % self.rate == 0
@@ -82,6 +82,108 @@ CHANNEL_LAYERS = {
 
 ASGI_APPLICATION = 'core.asgi.application'
 
+# Pool de conexões para os bancos externos (apps.dbcom.db_manager.Database(pooled=True))
+EXTERNAL_DB_POOL = {
+    'max_size': int(os.getenv('EXTERNAL_DB_POOL_SIZE', 5)),
+    'checkout_timeout': int(os.getenv('EXTERNAL_DB_POOL_TIMEOUT', 10)),
+    'max_idle_seconds': int(os.getenv('EXTERNAL_DB_POOL_MAX_IDLE', 300)),
+    'max_lifetime_seconds': int(os.getenv('EXTERNAL_DB_POOL_MAX_LIFETIME', 3600)),
+}
+
+# Cache das queries do GLPI (apps.dbcom.query_cache).
+# BACKEND: 'locmem' (LRU por processo) ou 'redis' (compartilhado, usa REDIS_HOST/REDIS_PORT)
+GLPI_QUERY_CACHE = {
+    'BACKEND': os.getenv('GLPI_QUERY_CACHE_BACKEND', 'locmem'),
+    'MAX_ENTRIES': 256,
+    'REDIS_DB': int(os.getenv('GLPI_QUERY_CACHE_REDIS_DB', 1)),
+}
+
+# Intervalo (segundos) entre cargas completas da tabela de chamados do painel.
+# Entre elas, apenas os chamados alterados (glpi_tickets.date_mod) são buscados.
+GLPI_PANEL_RECONCILE_SECONDS = int(os.getenv('GLPI_PANEL_RECONCILE_SECONDS', 300))
+
+# Árvore de categorias ITIL e regras de automação em memória (apps.dbcom.rules).
+# As regras também são recarregadas ao salvar/excluir no admin; o TTL limita
+# o atraso nos demais processos.
+GLPI_CATEGORY_TREE_TTL = int(os.getenv('GLPI_CATEGORY_TREE_TTL', 600))
+AUTOMATION_RULES_TTL = int(os.getenv('AUTOMATION_RULES_TTL', 60))
+
+# Chamadas à API REST legada do GLPI (apps.dbcom.utils e apps.dbcom.glpi_session).
+GLPI_API = {
+    'MAX_CONCURRENCY': int(os.getenv('GLPI_API_MAX_CONCURRENCY', 8)),
+    'CONNECT_TIMEOUT': int(os.getenv('GLPI_API_CONNECT_TIMEOUT', 5)),
+    'READ_TIMEOUT': int(os.getenv('GLPI_API_READ_TIMEOUT', 30)),
+    'SESSION_MAX_IDLE': int(os.getenv('GLPI_API_SESSION_MAX_IDLE', 900)),
+}
+
+# Varredura dos jobs em segundo plano (core.workers.JobSweeper): heartbeat
+# dos jobs de cada processo e recuperação dos órfãos de processos mortos.
+JOB_SWEEPER = {
+    'INTERVAL': int(os.getenv('JOB_SWEEPER_INTERVAL', 60)),
+    'HEARTBEAT_TIMEOUT': int(os.getenv('JOB_SWEEPER_HEARTBEAT_TIMEOUT', 180)),
+}
+
+# Fila de jobs dos webhooks do GLPI (apps.dbcom.jobs).
+WEBHOOK_JOBS = {
+    'WORKERS': int(os.getenv('WEBHOOK_JOB_WORKERS', 4)),
+    'MAX_ATTEMPTS': int(os.getenv('WEBHOOK_JOB_MAX_ATTEMPTS', 5)),
+    'BACKOFF_BASE': int(os.getenv('WEBHOOK_JOB_BACKOFF_BASE', 10)),
+    'BACKOFF_MAX': 600,
+    'DEDUP_SECONDS': int(os.getenv('WEBHOOK_JOB_DEDUP_SECONDS', 60)),
+}
+
+# Renderização das etiquetas (apps.printer.rendering). Jobs com pelo menos
+# PARALLEL_THRESHOLD etiquetas são divididos em lotes de CHUNK_SIZE,
+# renderizados em PROCESSES processos (0 = no próprio processo web).
+LABEL_RENDERING = {
+    'CHUNK_SIZE': int(os.getenv('LABEL_RENDER_CHUNK_SIZE', 100)),
+    'PARALLEL_THRESHOLD': int(os.getenv('LABEL_RENDER_PARALLEL_THRESHOLD', 200)),
+    'PROCESSES': int(os.getenv('LABEL_RENDER_PROCESSES', 2)),
+    'MAX_IN_FLIGHT': int(os.getenv('LABEL_RENDER_MAX_IN_FLIGHT', 4)),
+}
+
+# Fila de impressão de etiquetas (apps.printer.jobs).
+PRINT_JOBS = {
+    'WORKERS': int(os.getenv('PRINT_JOB_WORKERS', 2)),
+    'MAX_ATTEMPTS': int(os.getenv('PRINT_JOB_MAX_ATTEMPTS', 5)),
+    'BACKOFF_BASE': int(os.getenv('PRINT_JOB_BACKOFF_BASE', 15)),
+    'BACKOFF_MAX': 600,
+}
+
+# Comunicação com os serviços de impressão (apps.printer.client).
+PRINT_SERVERS = {
+    'CONNECT_TIMEOUT': int(os.getenv('PRINT_SERVER_CONNECT_TIMEOUT', 3)),
+    'READ_TIMEOUT': int(os.getenv('PRINT_SERVER_READ_TIMEOUT', 10)),
+    'PRINT_TIMEOUT': int(os.getenv('PRINT_SERVER_PRINT_TIMEOUT', 30)),
+    'PRINTERS_TTL': int(os.getenv('PRINT_SERVER_PRINTERS_TTL', 300)),
+    'HEALTH_INTERVAL': int(os.getenv('PRINT_SERVER_HEALTH_INTERVAL', 60)),
+}
+
+# Distribuição dos jobs de impressão (apps.printer.dispatch):
+# 'single' = tudo no servidor ativo; 'pool' = ativo + servidores 'em_pool',
+# pelo de menor fila, com failover quando um servidor não responde.
+PRINT_DISPATCH_MODE = os.getenv('PRINT_DISPATCH_MODE', 'single')
+
+# Cache em disco dos PDFs de relatórios (apps.reports.pdf_cache).
+REPORT_PDF_CACHE = {
+    'ENABLED': os.getenv('REPORT_PDF_CACHE_ENABLED', 'True') == 'True',
+    'DIR': os.getenv('REPORT_PDF_CACHE_DIR') or os.path.join(BASE_DIR, 'var', 'report_pdfs'),
+    'MAX_BYTES': int(os.getenv('REPORT_PDF_CACHE_MAX_MB', 500)) * 1024 * 1024,
+    'MAX_AGE_DAYS': int(os.getenv('REPORT_PDF_CACHE_MAX_AGE_DAYS', 30)),
+}
+
+# Geração dos PDFs de relatórios (apps.reports.rendering). Documentos com
+# mais de SYNC_MAX_ITEMS itens são gerados em segundo plano, em PROCESSES
+# processos com o WeasyPrint já carregado. STYLESHEETS são CSS comuns a
+# todos os relatórios (caminhos separados por vírgula), parseados uma vez.
+REPORT_RENDERING = {
+    'PROCESSES': int(os.getenv('REPORT_RENDER_PROCESSES', 2)),
+    'WORKERS': int(os.getenv('REPORT_RENDER_WORKERS', 2)),
+    'SYNC_MAX_ITEMS': int(os.getenv('REPORT_RENDER_SYNC_MAX_ITEMS', 60)),
+    'STYLESHEETS': [path.strip() for path in os.getenv('REPORT_RENDER_STYLESHEETS', '').split(',') if path.strip()],
+    'ASSET_CACHE_MB': int(os.getenv('REPORT_RENDER_ASSET_CACHE_MB', 16)),
+}
+
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -245,3 +347,41 @@ CORS_ALLOWED_ORIGINS = [
 CORS_ALLOW_ALL_ORIGINS = False
 
 X_FRAME_OPTIONS = 'SAMEORIGIN'
+
+
+# Logging (core.log): a escrita no stdout é feita por uma thread separada
+# (AsyncStreamHandler). LOG_FORMAT='json' gera uma linha JSON por evento.
+# Eventos por item (cada etiqueta, cada ativo) são amostrados: apenas
+# 1 a cada LOG_SAMPLE_RATE aparece, e só com LOG_LEVEL=DEBUG.
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'text': {
+            'format': '%(asctime)s %(levelname)s [%(name)s] %(message)s',
+        },
+        'json': {
+            '()': 'core.log.JsonFormatter',
+        },
+    },
+    'filters': {
+        'sampling': {
+            '()': 'core.log.SamplingFilter',
+            'rate': int(os.getenv('LOG_SAMPLE_RATE', 100)),
+        },
+    },
+    'handlers': {
+        'console': {
+            '()': 'core.log.AsyncStreamHandler',
+            'formatter': os.getenv('LOG_FORMAT', 'text'),
+            'filters': ['sampling'],
+        },
+    },
+    'loggers': {
+        'apps': {'handlers': ['console'], 'level': LOG_LEVEL, 'propagate': False},
+        'core': {'handlers': ['console'], 'level': LOG_LEVEL, 'propagate': False},
+    },
+    'root': {'handlers': ['console'], 'level': 'WARNING'},
+}
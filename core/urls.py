@@ -12,6 +12,10 @@ from rest_framework_simplejwt.views import (
 urlpatterns = [
     path('admin/impressao-etiquetas/', dbcom_views.impressao_etiquetas_view, name='admin_impressao_etiquetas'),
     path('api/get-assets/', dbcom_views.get_assets_data_api, name='api_get_assets'),
+    path('api/dbcom/pool-stats/', dbcom_views.db_pool_stats_api, name='api_db_pool_stats'),
+    path('api/dbcom/cache-stats/', dbcom_views.query_cache_stats_api, name='api_query_cache_stats'),
+    path('api/dbcom/rule-cache/', dbcom_views.rule_cache_api, name='api_rule_cache'),
+    path('api/dbcom/webhook-jobs/stats/', dbcom_views.webhook_job_stats_api, name='api_webhook_job_stats'),
     path('admin/', admin.site.urls),
     path('glpi/', include('apps.panel.urls')),
     path('api/', include('apps.printer.urls')),
@@ -0,0 +1,192 @@
+import time
+import uuid
+import logging
+import threading
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPool:
+    """
+    Pool de threads para tarefas em segundo plano dentro do próprio
+    processo (webhooks, impressão, relatórios...).
+
+    O estado das tarefas fica no banco (cada app tem seu modelo de job);
+    o pool apenas executa. Tarefas agendadas com 'delay' (retentativas)
+    esperam em um timer e só então entram na fila.
+    """
+    def __init__(self, name, max_workers=4):
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._timers = set()
+        self.counters = {'submitted': 0, 'completed': 0, 'failed': 0, 'scheduled': 0}
+
+    @property
+    def executor(self):
+        # Criado sob demanda: processos que nunca usam o pool não abrem threads
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix=f"worker-{self.name}",
+                    )
+        return self._executor
+
+    def _count(self, counter):
+        with self._lock:
+            self.counters[counter] += 1
+
+    def _run(self, func, args, kwargs):
+        # Cada thread usa sua própria conexão do Django; fecha as que
+        # expiraram antes e depois da tarefa (como faz o ciclo de request).
+        close_old_connections()
+        try:
+            func(*args, **kwargs)
+            self._count('completed')
+        except Exception as e:
+            logger.exception("Erro em tarefa do pool '%s' (%s): %s", self.name, getattr(func, '__name__', func), e)
+            self._count('failed')
+        finally:
+            close_old_connections()
+
+    def submit(self, func, *args, delay=0, **kwargs):
+        """
+        Executa func(*args, **kwargs) em uma thread do pool,
+        opcionalmente após 'delay' segundos.
+        """
+        if delay and delay > 0:
+            timer = threading.Timer(delay, self._submit_now, args=(func, args, kwargs))
+            timer.daemon = True
+            with self._lock:
+                self._timers.add(timer)
+                self.counters['scheduled'] += 1
+            timer.start()
+            return None
+        return self._submit_now(func, args, kwargs)
+
+    def _submit_now(self, func, args, kwargs):
+        with self._lock:
+            self._timers = {t for t in self._timers if t.is_alive()}
+        self._count('submitted')
+        return self.executor.submit(self._run, func, args, kwargs)
+
+    def stats(self):
+        with self._lock:
+            data = dict(self.counters)
+            data['waiting_timers'] = sum(1 for t in self._timers if t.is_alive())
+        data['max_workers'] = self.max_workers
+        data['queued'] = self._executor._work_queue.qsize() if self._executor else 0
+        return data
+
+
+# Identifica este processo nos jobs que ele assumiu (campo 'boot_id' dos
+# modelos de job). Um processo novo (reinício) tem outro BOOT_ID.
+BOOT_ID = uuid.uuid4().hex
+
+
+# Configuração padrão (pode ser sobrescrita em settings.JOB_SWEEPER)
+SWEEPER_DEFAULTS = {
+    'INTERVAL': 60,            # Segundos entre as varreduras (heartbeat + recuperação)
+    'HEARTBEAT_TIMEOUT': 180,  # Processo sem heartbeat há mais tempo que isso é considerado morto
+}
+
+
+def get_sweeper_settings():
+    sweeper_settings = dict(SWEEPER_DEFAULTS)
+    sweeper_settings.update(getattr(settings, 'JOB_SWEEPER', {}) or {})
+    return sweeper_settings
+
+
+def owner_alive_q():
+    """ Jobs cujo processo dono está vivo: este ou um com heartbeat recente. """
+    limit = timezone.now() - timedelta(seconds=get_sweeper_settings()['HEARTBEAT_TIMEOUT'])
+    return Q(boot_id=BOOT_ID) | Q(heartbeat_at__gte=limit)
+
+
+def orphaned(queryset):
+    """ Filtra os jobs cujo processo dono morreu (ou que nunca tiveram dono). """
+    return queryset.exclude(owner_alive_q())
+
+
+def adopt(queryset, pk, **changes):
+    """
+    Assume um job órfão para este processo (com as alterações informadas).
+    A atualização é condicional: com vários processos varrendo ao mesmo
+    tempo, só um consegue. Retorna True se este processo assumiu o job.
+    """
+    return orphaned(queryset.filter(pk=pk)).update(
+        boot_id=BOOT_ID, heartbeat_at=timezone.now(), **changes
+    ) == 1
+
+
+class JobSweeper:
+    """
+    Thread única por processo servidor (iniciada em core.wsgi/core.asgi)
+    que, logo ao subir e depois a cada INTERVAL segundos:
+
+    - renova o heartbeat dos jobs ativos deste processo, para que os outros
+      processos saibam que eles têm dono;
+    - executa a recuperação de cada app, que assume (adopt) e reenvia ao
+      pool os jobs órfãos: os de um processo que morreu ou reiniciou.
+    """
+    def __init__(self):
+        self._jobs = {}  # nome -> (modelo, função de recuperação)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def register(self, name, model, recover):
+        """
+        'recover()' reenvia os jobs órfãos de 'model' e retorna quantos. Pode
+        ser o caminho da função ('app.jobs.func'), importada só na varredura:
+        registrar no AppConfig.ready() não carrega o módulo de jobs (e suas
+        conexões) em todo comando de manage.py.
+        """
+        with self._lock:
+            self._jobs[name] = (model, recover)
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name='job-sweeper', daemon=True)
+        self._thread.start()
+
+    def sweep(self):
+        with self._lock:
+            jobs = list(self._jobs.items())
+        close_old_connections()
+        try:
+            for name, (model, recover) in jobs:
+                try:
+                    model.objects.filter(
+                        boot_id=BOOT_ID, status__in=model.ACTIVE_STATUSES
+                    ).update(heartbeat_at=timezone.now())
+                    if isinstance(recover, str):
+                        recover = import_string(recover)
+                    recovered = recover()
+                    if recovered:
+                        logger.info("%s job(s) '%s' órfãos foram reenfileirados.", recovered, name)
+                except Exception as e:
+                    logger.error("Erro ao varrer os jobs '%s': %s", name, e)
+        finally:
+            close_old_connections()
+
+    def _loop(self):
+        while True:
+            self.sweep()
+            time.sleep(get_sweeper_settings()['INTERVAL'])
+
+
+# Instância única por processo
+job_sweeper = JobSweeper()
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_wsgi_application()
+
+# Recupera os jobs em segundo plano deixados por um processo anterior e
+# mantém o heartbeat dos jobs deste processo
+from core.workers import job_sweeper  # noqa: E402
+job_sweeper.start()
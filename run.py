@@ -2,6 +2,7 @@ import os
 import sys
 import subprocess
 import secrets
+import multiprocessing
 from pathlib import Path
 
 # Adiciona o diretório atual ao path para que o Django seja encontrado pelo PyInstaller
@@ -81,6 +82,12 @@ def run_server():
 
 
 if __name__ == "__main__":
+    # No executável do PyInstaller (Windows), os processos de renderização
+    # (etiquetas e relatórios) são iniciados com 'spawn' e executam este
+    # arquivo de novo: freeze_support() faz esses processos rodarem apenas o
+    # worker, em vez de subir outro servidor na porta 8000.
+    multiprocessing.freeze_support()
+
     # Verifica se um argumento especial foi passado na linha de comando
     if len(sys.argv) > 1 and sys.argv[1] == 'postinstall':
         run_postinstall_logic()